@@ -1,8 +1,10 @@
 import os
+import time
 
 from flask import Flask
 from flask_cors import CORS
 
+from .cli import register_cli
 from .config import Config
 from .db import init_db
 from .routes.admin import admin_bp
@@ -16,6 +18,7 @@ from .routes.ops_domains import ops_domains_bp
 
 
 def create_app(config_class=Config) -> Flask:
+    started = time.perf_counter()
     app = Flask(__name__)
     app.config.from_object(config_class)
 
@@ -29,10 +32,6 @@ def create_app(config_class=Config) -> Flask:
 
     init_db(app)
 
-    from .services.ops_domain_store import seed_ops_domains
-    with app.app_context():
-        seed_ops_domains()
-
     CORS(
         app,
         resources={
@@ -57,4 +56,30 @@ def create_app(config_class=Config) -> Flask:
     app.register_blueprint(billing_bp, url_prefix="/api/v1")
     app.register_blueprint(kits_bp, url_prefix="/api/v1")
 
+    register_cli(app)
+
+    interval = app.config.get("PUBLISH_SCHEDULER_INTERVAL", 0)
+    if interval > 0:
+        from .services import scheduler
+        scheduler.start(app, interval)
+
+    from .services import billing_store
+    replication_interval = app.config.get("BILLING_REPLICATION_INTERVAL", 0)
+    if billing_store.mirroring() and replication_interval > 0:
+        from .services import billing_replication
+        billing_replication.start(app, replication_interval)
+
+    from .services import email_outbox
+    outbox_interval = app.config.get("EMAIL_OUTBOX_INTERVAL", 0)
+    if email_outbox.configured() and outbox_interval > 0:
+        email_outbox.start(app, outbox_interval)
+
+    schema = app.extensions["schema"]
+    if schema["version"] == schema["latest"]:
+        from .services import article_render
+        with app.app_context():
+            if article_render.is_stale():  # renderer changed since the last boot
+                article_render.start_sweep(app)
+
+    app.extensions["schema"]["boot_ms"] = round((time.perf_counter() - started) * 1000, 1)
     return app
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import json
+
+import click
+from flask import Flask
+
+
+def register_cli(app: Flask) -> None:
+    """Attach maintenance commands, run as `flask --app run <command>`."""
+
+    @app.cli.command("migrate")
+    @click.option("--target", type=int, default=None, help="Stop at this schema version.")
+    def migrate(target: int | None) -> None:
+        """Apply pending schema migrations and report cold-start timings."""
+        from . import migrations
+        from .db import db
+
+        report = migrations.migrate(db.engine, target)
+        report["boot"] = app.extensions["schema"]
+        click.echo(json.dumps(report))
+
+    @app.cli.command("db-profile")
+    def db_profile() -> None:
+        """Print the effective SQLite pragmas and pool settings."""
+        click.echo(json.dumps(app.extensions.get("sqlite")))
+
+    @app.cli.command("db-bench")
+    @click.option("--profile", "profiles", multiple=True, default=("default", "production"),
+                  help="Profile to measure; repeat to compare (default: default and production).")
+    @click.option("--readers", type=int, default=8)
+    @click.option("--writers", type=int, default=2)
+    @click.option("--seconds", type=float, default=5.0)
+    def db_bench(profiles: tuple[str, ...], readers: int, writers: int, seconds: float) -> None:
+        """Concurrent read/write throughput per profile, each on a copy of the app database."""
+        from . import sqlite_profile
+        from .db import db
+
+        source = db.engine.url.database
+        if not source or source == ":memory:":
+            raise click.UsageError("db-bench needs a file-backed DATABASE_URL")
+        for result in sqlite_profile.bench(source, profiles, readers, writers, seconds):
+            click.echo(json.dumps(result))
+
+    @app.cli.command("row-bench")
+    @click.option("--view", "views", multiple=True, type=click.Choice(["full", "summary"]),
+                  default=("full", "summary"), help="Field set to measure; repeat to compare (default: both).")
+    @click.option("--limit", type=int, default=100, help="Rows per page.")
+    @click.option("--rounds", type=int, default=200)
+    def row_bench_cmd(views: tuple[str, ...], limit: int, rounds: int) -> None:
+        """Article page rows/s through the ORM versus the row_json column path."""
+        from . import row_bench
+        from .models import Article
+
+        if not Article.query.first():
+            raise click.UsageError("row-bench needs articles in the database")
+        for result in row_bench.bench(limit, rounds, views):
+            click.echo(json.dumps(result))
+
+    @app.cli.command("seed")
+    def seed() -> None:
+        """Insert the demo articles and ops domains that are missing."""
+        from . import migrations
+
+        click.echo(json.dumps(migrations.seed()))
+
+    @app.cli.command("build-sites")
+    @click.option("--brand", default=None, help="Rebuild a single brand (default: all enabled).")
+    def build_sites(brand: str | None) -> None:
+        """Render static brand sites, feeds and sitemaps under SITES_ROOT."""
+        from .services import site_generator
+
+        reports = [site_generator.build_brand(brand)] if brand else site_generator.build_all()
+        for report in reports:
+            click.echo(json.dumps(report))
+
+    @app.cli.command("publish-scheduled")
+    @click.option("--loop", "interval", type=int, default=0,
+                  help="Keep running, sweeping every N seconds.")
+    def publish_scheduled(interval: int) -> None:
+        """Publish scheduled articles whose scheduled_at has passed."""
+        import time
+
+        from .services import scheduler
+
+        while True:
+            click.echo(json.dumps(scheduler.publish_due()))
+            if interval <= 0:
+                break
+            time.sleep(interval)
+
+    @app.cli.command("brand-counts")
+    @click.option("--rebuild", is_flag=True, help="Recompute every counter from the articles table.")
+    def brand_counts_cmd(rebuild: bool) -> None:
+        """Verify the per-brand article counters against the articles table, or rebuild them."""
+        from .services import brand_counts
+
+        report = brand_counts.rebuild() if rebuild else brand_counts.verify()
+        click.echo(json.dumps(report))
+        if not rebuild and not report["ok"]:
+            raise SystemExit(1)
+
+    @app.cli.command("invoice-rollups")
+    @click.option("--rebuild", is_flag=True, help="Recompute every rollup row from the invoices table.")
+    def invoice_rollups(rebuild: bool) -> None:
+        """Verify the daily invoice rollups against the invoices table, or rebuild them."""
+        from .services import invoice_reports
+
+        report = invoice_reports.rebuild() if rebuild else invoice_reports.verify()
+        click.echo(json.dumps(report))
+        if not rebuild and not report["ok"]:
+            raise SystemExit(1)
+
+    @app.cli.command("render-cache")
+    @click.option("--sweep", is_flag=True, help="Re-render every body and drop stale renders.")
+    def render_cache(sweep: bool) -> None:
+        """Report article render cache stats, or sweep the renders table."""
+        from .services import article_render
+
+        click.echo(json.dumps(article_render.sweep() if sweep else article_render.stats()))
+
+    @app.cli.command("billing-sync")
+    @click.option("--import", "import_", is_flag=True, help="Copy sheet-only invoices into the database first.")
+    @click.option("--reconcile", is_flag=True, help="Report drift between the database and the sheet.")
+    @click.option("--fix", is_flag=True, help="With --reconcile: queue repairs and import sheet-only rows.")
+    def billing_sync(import_: bool, reconcile: bool, fix: bool) -> None:
+        """Mirror invoices to the billing sheet: import, reconcile, then push the queue."""
+        from .services import billing_replication, billing_store
+
+        if not billing_store.mirroring():
+            raise click.UsageError("set BILLING_SHEETS_MODE=mirror and the Sheets credentials first")
+        if import_:
+            click.echo(json.dumps({"import": billing_replication.import_sheet()}))
+        if reconcile or fix:
+            click.echo(json.dumps({"reconcile": billing_replication.reconcile(fix=fix)}))
+        click.echo(json.dumps({"push": billing_replication.drain()}))
+
+    @app.cli.command("import-invoices")
+    @click.argument("path", type=click.Path(exists=True, dir_okay=False))
+    @click.option("--format", "fmt", type=click.Choice(["csv", "ndjson"]), default=None,
+                  help="Defaults from the file extension (.csv, else NDJSON).")
+    @click.option("--dry-run", is_flag=True, help="Validate and price every row without writing.")
+    def import_invoices(path: str, fmt: str | None, dry_run: bool) -> None:
+        """Create draft invoices from a CSV or NDJSON file and print the per-row report."""
+        from .services import invoice_import
+
+        fmt = fmt or ("csv" if path.lower().endswith(".csv") else "ndjson")
+        with open(path, "rb") as stream:
+            click.echo(json.dumps(invoice_import.import_invoices(stream, fmt, dry_run=dry_run)))
+
+    @app.cli.command("email-outbox")
+    @click.option("--retry-failed", is_flag=True, help="Queue failed messages again before sending.")
+    def email_outbox_cmd(retry_failed: bool) -> None:
+        """Send every due invoice email in the outbox and print the batch reports."""
+        from .services import email_outbox
+
+        if not email_outbox.configured():
+            raise click.UsageError("set SMTP_USER (and SMTP_HOST / SMTP_PORT / SMTP_PASS) first")
+        if retry_failed:
+            click.echo(json.dumps({"requeued": email_outbox.requeue_failed()}))
+        click.echo(json.dumps({"batches": email_outbox.drain(), "stats": email_outbox.stats()}))
+
+    @app.cli.command("search-index")
+    @click.option("--rebuild", is_flag=True, help="Re-index every article and invoice from scratch.")
+    def search_index(rebuild: bool) -> None:
+        """Create the article and invoice FTS5 indexes if missing, or rebuild them."""
+        from .db import db
+        from .services import invoice_search, search
+
+        if rebuild:
+            click.echo(json.dumps({"articles": search.rebuild(), "invoices": invoice_search.rebuild()}))
+        else:
+            with db.engine.begin() as conn:
+                click.echo(json.dumps({"built": search.install(conn), "invoices_built": invoice_search.install(conn)}))
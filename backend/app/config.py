@@ -11,3 +11,13 @@ class Config:
     DEBUG = os.getenv("DEBUG", "false").lower() == "true"
     SQLALCHEMY_DATABASE_URI = os.getenv("DATABASE_URL", _default_db)
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Pragma set applied to every SQLite connection (see app.sqlite_profile); "default" applies none
+    SQLITE_PROFILE = os.getenv("SQLITE_PROFILE", "production")
+    # Apply pending schema migrations at boot; off means `flask --app run migrate` first
+    AUTO_MIGRATE = os.getenv("AUTO_MIGRATE", "true").lower() == "true"
+    # Seconds between scheduled-publish sweeps; 0 disables the background loop
+    PUBLISH_SCHEDULER_INTERVAL = int(os.getenv("PUBLISH_SCHEDULER_INTERVAL", "0"))
+    # Seconds between billing replication pushes when BILLING_SHEETS_MODE=mirror; 0 disables the loop
+    BILLING_REPLICATION_INTERVAL = float(os.getenv("BILLING_REPLICATION_INTERVAL", "5"))
+    # Seconds between email outbox deliveries (enqueues also wake the sender); 0 disables the loop
+    EMAIL_OUTBOX_INTERVAL = float(os.getenv("EMAIL_OUTBOX_INTERVAL", "10"))
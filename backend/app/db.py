@@ -4,6 +4,35 @@ db = SQLAlchemy()
 
 
 def init_db(app):
+    """Bind the app, apply the SQLite engine profile and bring the schema up to date."""
+    from . import migrations, sqlite_profile
+
+    profile = app.config.get("SQLITE_PROFILE", "production")
+    pragmas = sqlite_profile.resolve(profile)
+    options = app.config.setdefault("SQLALCHEMY_ENGINE_OPTIONS", {})
+    for key, value in sqlite_profile.engine_options(app.config).items():
+        options.setdefault(key, value)
+
     db.init_app(app)
     with app.app_context():
-        db.create_all()
+        if db.engine.dialect.name == "sqlite":
+            sqlite_profile.install(db.engine, pragmas)
+            app.extensions["sqlite"] = sqlite_profile.report(db.engine, profile)
+            sqlite_profile.log.info("sqlite engine profile: %s", app.extensions["sqlite"])
+        with db.engine.connect() as conn:
+            version = migrations.current_version(conn)
+        status = {"version": version, "latest": migrations.LATEST, "applied": [], "seeded": None}
+        if version < migrations.LATEST:
+            if not app.config.get("AUTO_MIGRATE", True):
+                # Keep booting so the migrate command itself can run
+                migrations.log.warning(
+                    "database schema is at version %d, code expects %d; run `flask --app run migrate`",
+                    version, migrations.LATEST,
+                )
+                app.extensions["schema"] = status
+                return
+            report = migrations.migrate(db.engine)
+            status.update(version=report["to"], applied=report["applied"])
+            if version == 0:  # new database, or one from before versioning: seed as boot used to
+                status["seeded"] = migrations.seed()
+        app.extensions["schema"] = status
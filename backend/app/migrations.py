@@ -0,0 +1,157 @@
+"""Versioned schema migrations and seed data.
+
+`schema_version` records every migration applied to the database. Boot
+reads the current version once and, when AUTO_MIGRATE is on, applies
+whatever is pending; `flask --app run migrate` does the same explicitly and
+reports timings, and `flask --app run seed` inserts the demo rows.
+
+Each migration runs in its own transaction and must be idempotent: a
+database that predates this table replays every step from version 0, and
+the steps have to cope with the schema they find.
+"""
+from __future__ import annotations
+
+import logging
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import inspect
+
+from .db import db
+from .models import Article, ArticleRender, BillingReplication, EmailOutbox, Invoice
+from .services import brand_counts, invoice_reports, invoice_search, search  # register DDL hooks on their tables
+
+log = logging.getLogger(__name__)
+
+_DDL = """CREATE TABLE IF NOT EXISTS schema_version (
+    version    INTEGER PRIMARY KEY,
+    name       VARCHAR(100) NOT NULL,
+    applied_at VARCHAR(40)  NOT NULL,
+    ms         INTEGER      NOT NULL
+)"""
+
+
+def _create_tables(conn) -> None:
+    db.metadata.create_all(bind=conn)
+    # create_all() skips indexes on tables that already exist. Unique ones are
+    # left to the later step that makes existing rows satisfy them first.
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            if not index.unique:
+                index.create(bind=conn, checkfirst=True)
+
+
+def _ops_domains_brand_slug(conn) -> None:
+    columns = {c["name"] for c in inspect(conn).get_columns("ops_domains")}
+    if "brand_slug" not in columns:
+        conn.exec_driver_sql("ALTER TABLE ops_domains ADD COLUMN brand_slug VARCHAR(100)")
+
+
+def _articles_fts(conn) -> None:
+    search.install(conn)
+
+
+def _brand_article_counts(conn) -> None:
+    brand_counts.install(conn)
+
+
+def _article_renders(conn) -> None:
+    ArticleRender.__table__.create(bind=conn, checkfirst=True)
+
+
+def _articles_brand_slug_unique(conn) -> None:
+    # Keep the oldest article of each duplicate (brand, slug) and suffix the rest
+    duplicates = conn.exec_driver_sql(
+        "SELECT brand, slug FROM articles GROUP BY brand, slug HAVING count(*) > 1"
+    ).all()
+    for brand, slug in duplicates:
+        taken = set(conn.exec_driver_sql(
+            "SELECT slug FROM articles WHERE brand = ? AND slug >= ? AND slug < ?", (brand, slug + "-", slug + ".")
+        ).scalars())
+        ids = conn.exec_driver_sql(
+            "SELECT id FROM articles WHERE brand = ? AND slug = ? ORDER BY created_at, id", (brand, slug)
+        ).scalars().all()
+        n = 2
+        for article_id in ids[1:]:
+            while f"{slug}-{n}" in taken:
+                n += 1
+            conn.exec_driver_sql("UPDATE articles SET slug = ? WHERE id = ?", (f"{slug}-{n}", article_id))
+            taken.add(f"{slug}-{n}")
+        log.info("suffixed %d duplicate slugs of %s/%s", len(ids) - 1, brand, slug)
+    for index in Article.__table__.indexes:
+        if index.unique:
+            index.create(bind=conn, checkfirst=True)
+
+
+def _billing_replication_log(conn) -> None:
+    BillingReplication.__table__.create(bind=conn, checkfirst=True)
+
+
+def _invoices_search(conn) -> None:
+    for index in Invoice.__table__.indexes:
+        index.create(bind=conn, checkfirst=True)
+    invoice_search.install(conn)
+
+
+def _email_outbox(conn) -> None:
+    EmailOutbox.__table__.create(bind=conn, checkfirst=True)
+
+
+def _invoice_rollups(conn) -> None:
+    invoice_reports.install(conn)
+
+
+# (version, name, step) in apply order; append only
+MIGRATIONS = [
+    (1, "create_tables", _create_tables),
+    (2, "ops_domains_brand_slug", _ops_domains_brand_slug),
+    (3, "articles_fts", _articles_fts),
+    (4, "brand_article_counts", _brand_article_counts),
+    (5, "article_renders", _article_renders),
+    (6, "articles_brand_slug_unique", _articles_brand_slug_unique),
+    (7, "billing_replication_log", _billing_replication_log),
+    (8, "invoices_search", _invoices_search),
+    (9, "email_outbox", _email_outbox),
+    (10, "invoice_rollups", _invoice_rollups),
+]
+LATEST = MIGRATIONS[-1][0]
+
+
+def current_version(conn) -> int:
+    if not inspect(conn).has_table("schema_version"):
+        return 0
+    return conn.exec_driver_sql("SELECT max(version) FROM schema_version").scalar() or 0
+
+
+def migrate(engine, target: int | None = None) -> dict:
+    """Apply pending migrations up to `target` (default: latest)."""
+    target = LATEST if target is None else target
+    with engine.begin() as conn:
+        conn.exec_driver_sql(_DDL)
+        start_version = current_version(conn)
+
+    applied = []
+    for version, name, step in MIGRATIONS:
+        if version <= start_version or version > target:
+            continue
+        started = time.perf_counter()
+        with engine.begin() as conn:
+            step(conn)
+            ms = int((time.perf_counter() - started) * 1000)
+            conn.exec_driver_sql(
+                "INSERT INTO schema_version (version, name, applied_at, ms) VALUES (?, ?, ?, ?)",
+                (version, name, datetime.now(timezone.utc).isoformat(), ms),
+            )
+        applied.append({"version": version, "name": name, "ms": ms})
+        log.info("applied migration %d %s in %d ms", version, name, ms)
+
+    return {"from": start_version, "to": max([start_version] + [a["version"] for a in applied]),
+            "applied": applied}
+
+
+def seed() -> dict:
+    """Insert demo articles and ops domains that are missing; safe to rerun."""
+    from .services.articles import seed_articles
+    from .services.ops_domain_store import seed_ops_domains
+
+    return {"articles": seed_articles(), "ops_domains": seed_ops_domains()}
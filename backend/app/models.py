@@ -3,6 +3,8 @@ from __future__ import annotations
 import uuid
 from datetime import datetime, timezone
 
+from sqlalchemy.orm import query_expression
+
 from .db import db
 
 
@@ -12,6 +14,16 @@ def _utcnow():
 
 class Article(db.Model):
     __tablename__ = "articles"
+    __table_args__ = (
+        # Keyset pagination seeks on (created_at, id) behind the list filters
+        db.Index("ix_articles_status_brand_created", "status", "brand", "created_at", "id"),
+        db.Index("ix_articles_status_created", "status", "created_at", "id"),
+        db.Index("ix_articles_brand_created", "brand", "created_at", "id"),
+        # The scheduled-publish sweep looks up due rows by (status, scheduled_at)
+        db.Index("ix_articles_status_scheduled", "status", "scheduled_at"),
+        # One article per slug within a brand; also serves the /feed/articles/<brand>/<slug> lookup
+        db.Index("ux_articles_brand_slug", "brand", "slug", unique=True),
+    )
 
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     brand = db.Column(db.String(100), nullable=False, index=True)
@@ -22,7 +34,10 @@ class Article(db.Model):
     status = db.Column(db.String(20), nullable=False, default="draft", index=True)
     scheduled_at = db.Column(db.DateTime(timezone=True), nullable=True)
     created_at = db.Column(db.DateTime(timezone=True), nullable=False, default=_utcnow)
-    updated_at = db.Column(db.DateTime(timezone=True), nullable=False, default=_utcnow, onupdate=_utcnow)
+    updated_at = db.Column(db.DateTime(timezone=True), nullable=False, default=_utcnow, onupdate=_utcnow, index=True)
+
+    # Populated only by queries that ask for it (see services.article_fields)
+    excerpt = query_expression()
 
     def to_dict(self):
         return {
@@ -39,8 +54,29 @@ class Article(db.Model):
         }
 
 
+class ArticleRender(db.Model):
+    """Rendered body HTML keyed by content hash and renderer fingerprint (services.article_render)."""
+    __tablename__ = "article_renders"
+    __table_args__ = (
+        # Boot checks for renders left over from an older renderer
+        db.Index("ix_article_renders_renderer", "renderer"),
+    )
+
+    content_hash = db.Column(db.String(64), primary_key=True)
+    renderer     = db.Column(db.String(16), primary_key=True)
+    html         = db.Column(db.Text, nullable=False)
+    rendered_at  = db.Column(db.DateTime(timezone=True), nullable=False, default=_utcnow)
+
+
 class Invoice(db.Model):
     __tablename__ = "invoices"
+    __table_args__ = (
+        # Keyset pages of /billing/invoices; date ranges seek on the date ones
+        db.Index("ix_invoices_created", "created_at", "id"),
+        db.Index("ix_invoices_status_created", "status", "created_at", "id"),
+        db.Index("ix_invoices_date", "date", "id"),
+        db.Index("ix_invoices_status_date", "status", "date", "id"),
+    )
 
     id                   = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     date                 = db.Column(db.String(10), nullable=False)
@@ -94,6 +130,39 @@ class Invoice(db.Model):
         }
 
 
+class BillingReplication(db.Model):
+    """One row per invoice changed locally but not yet mirrored to Sheets (services.billing_replication)."""
+    __tablename__ = "billing_replication_log"
+    __table_args__ = (db.Index("ix_billing_replication_queued", "queued_at"),)
+
+    invoice_id = db.Column(db.String(36), primary_key=True)
+    version    = db.Column(db.Integer, nullable=False, default=1)  # bumped by every change while queued
+    queued_at  = db.Column(db.DateTime(timezone=True), nullable=False, default=_utcnow)
+    claimed_at = db.Column(db.DateTime(timezone=True), nullable=True)
+    attempts   = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+
+
+class EmailOutbox(db.Model):
+    """An invoice email waiting for, or done with, SMTP delivery (services.email_outbox)."""
+    __tablename__ = "email_outbox"
+    __table_args__ = (db.Index("ix_email_outbox_due", "status", "next_attempt_at", "id"),)
+
+    id              = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    invoice_id      = db.Column(db.String(36), nullable=False, index=True)
+    to_addr         = db.Column(db.String(200), nullable=False)
+    cc_addr         = db.Column(db.String(200), nullable=False, default="")
+    subject         = db.Column(db.String(300), nullable=False)
+    html            = db.Column(db.Text, nullable=False)
+    status          = db.Column(db.String(10), nullable=False, default="queued")  # queued | sending | sent | failed
+    attempts        = db.Column(db.Integer, nullable=False, default=0)
+    next_attempt_at = db.Column(db.DateTime(timezone=True), nullable=False, default=_utcnow)
+    claimed_at      = db.Column(db.DateTime(timezone=True), nullable=True)
+    sent_at         = db.Column(db.DateTime(timezone=True), nullable=True)
+    last_error      = db.Column(db.Text, nullable=True)
+    created_at      = db.Column(db.DateTime(timezone=True), nullable=False, default=_utcnow)
+
+
 class OpsDomain(db.Model):
     __tablename__ = "ops_domains"
 
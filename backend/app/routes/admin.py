@@ -1,14 +1,27 @@
 from __future__ import annotations
 
+from datetime import datetime, timezone
+
 from flask import Blueprint, abort, jsonify, request
 
+from ..services import article_render, billing_store, feed_cache, invoice_render, scheduler
+from ..services.article_ingest import ingest_ndjson
 from ..services.admin_store import (
     VALID_STATUSES,
+    count_articles,
     create_article,
     get_article,
+    iter_articles,
     query_articles,
+    query_articles_after,
     update_article,
+    validate_article,
 )
+from ..services.article_fields import columns, encode_rows, resolve_fields
+from ..services.pagination import cursor_page
+from ..services.search import search_articles
+from .responses import json_response
+from .streaming import export_response
 
 admin_bp = Blueprint("admin", __name__)
 
@@ -33,7 +46,15 @@ def list_articles():
         abort(400, description="limit and offset must not be negative")
     limit = min(limit, MAX_LIMIT)
 
-    articles, total = query_articles(brand=brand, status=status, limit=limit, offset=offset)
+    try:
+        fields = resolve_fields(request.args.get("fields"), request.args.get("view"))
+    except ValueError as exc:
+        abort(400, description=str(exc))
+
+    if "cursor" in request.args:
+        return json_response(_cursor_page(brand, status, limit, fields))
+
+    articles, total = query_articles(brand=brand, status=status, limit=limit, offset=offset, fields=fields)
     has_more = offset + limit < total
 
     result = {
@@ -42,10 +63,77 @@ def list_articles():
         "limit": limit,
         "offset": offset,
         "has_more": has_more,
-        "articles": articles,
+        "articles": encode_rows(articles, fields),
     }
     if has_more:
         result["next_offset"] = offset + limit
+    return json_response(result)
+
+
+def _cursor_page(brand: str | None, status: str | None, limit: int,
+                 fields: tuple[str, ...] | None) -> dict:
+    if "offset" in request.args:
+        abort(400, description="cursor and offset are mutually exclusive")
+    try:
+        return cursor_page(
+            lambda n, cursor: query_articles_after(brand=brand, status=status, limit=n, cursor=cursor, fields=fields),
+            lambda estimate: count_articles(brand, status, estimate=estimate),
+            limit, request.args["cursor"] or None, request.args.get("total", "none"),
+            "articles", lambda rows: encode_rows(rows, fields),
+        )
+    except ValueError as exc:
+        abort(400, description=str(exc))
+
+
+@admin_bp.get("/admin/articles/export")
+def export_articles():
+    brand = request.args.get("brand") or None
+    status = request.args.get("status") or None
+
+    if status and status not in VALID_STATUSES:
+        abort(400, description=f"Invalid status. Must be one of: {', '.join(sorted(VALID_STATUSES))}")
+
+    try:
+        fields = resolve_fields(request.args.get("fields"), request.args.get("view"))
+    except ValueError as exc:
+        abort(400, description=str(exc))
+
+    return export_response(iter_articles(brand, status, fields), columns(fields), "articles")
+
+
+@admin_bp.get("/admin/articles/search")
+def search():
+    q = (request.args.get("q") or "").strip()
+    brand = request.args.get("brand") or None
+    status = request.args.get("status") or None
+
+    if status and status not in VALID_STATUSES:
+        abort(400, description=f"Invalid status. Must be one of: {', '.join(sorted(VALID_STATUSES))}")
+
+    try:
+        limit = int(request.args.get("limit", 20))
+    except ValueError:
+        abort(400, description="limit must be an integer")
+    if limit < 0:
+        abort(400, description="limit must not be negative")
+    limit = min(limit, MAX_LIMIT)
+
+    try:
+        articles, next_cursor = search_articles(
+            q, brand=brand, status=status, limit=limit, cursor=request.args.get("cursor") or None
+        )
+    except ValueError as exc:
+        abort(400, description=str(exc))
+
+    result = {
+        "q": q,
+        "count": len(articles),
+        "limit": limit,
+        "has_more": next_cursor is not None,
+        "articles": articles,
+    }
+    if next_cursor:
+        result["next_cursor"] = next_cursor
     return jsonify(result)
 
 
@@ -53,21 +141,32 @@ def list_articles():
 def create():
     data = request.get_json(silent=True) or {}
 
-    brand = (data.get("brand") or "").strip()
-    title = (data.get("title") or "").strip()
-    body = (data.get("body") or "").strip()
+    try:
+        fields = validate_article(data)
+    except ValueError as exc:
+        abort(400, description=str(exc))
+
+    article = create_article(**fields)
+    return jsonify(article), 201
 
-    if not brand or not title:
-        abort(400, description="brand and title are required")
 
-    status = (data.get("status") or "draft").strip()
-    if status not in VALID_STATUSES:
-        abort(400, description=f"Invalid status. Must be one of: {', '.join(sorted(VALID_STATUSES))}")
+@admin_bp.post("/admin/articles/bulk")
+def bulk_upsert():
+    """Upsert articles by (brand, slug) from an NDJSON body, one object per line."""
+    return jsonify(ingest_ndjson(request.stream))
 
-    author = (data.get("author") or "").strip()
 
-    article = create_article(brand=brand, title=title, body=body, author=author, status=status)
-    return jsonify(article), 201
+@admin_bp.get("/admin/articles/<article_id>")
+def get_one(article_id: str):
+    try:
+        fields = resolve_fields(request.args.get("fields"), request.args.get("view"))
+    except ValueError as exc:
+        abort(400, description=str(exc))
+
+    article = get_article(article_id, fields)
+    if article is None:
+        abort(404, description="Article not found")
+    return jsonify(article)
 
 
 @admin_bp.patch("/admin/articles/<article_id>")
@@ -84,7 +183,7 @@ def patch(article_id: str):
     if "body" in data:
         updates["body"] = (data["body"] or "").strip()
     if "scheduled_at" in data:
-        updates["scheduled_at"] = data["scheduled_at"]
+        updates["scheduled_at"] = _parse_scheduled_at(data["scheduled_at"])
     if "status" in data:
         status = (data["status"] or "").strip()
         if status not in VALID_STATUSES:
@@ -93,3 +192,41 @@ def patch(article_id: str):
 
     article = update_article(article_id, updates)
     return jsonify(article)
+
+
+def _parse_scheduled_at(value):
+    """ISO-8601 string (naive means UTC) → aware UTC datetime; empty clears it."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value))
+    except ValueError:
+        abort(400, description="scheduled_at must be an ISO-8601 datetime")
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+@admin_bp.get("/admin/cache/feed")
+def feed_cache_stats():
+    return jsonify(feed_cache.stats())
+
+
+@admin_bp.get("/admin/cache/render")
+def render_cache_stats():
+    return jsonify(article_render.stats())
+
+
+@admin_bp.get("/admin/cache/invoices")
+def invoice_render_cache_stats():
+    return jsonify(invoice_render.stats())
+
+
+@admin_bp.get("/admin/cache/sheets")
+def sheets_cache_stats():
+    return jsonify(billing_store.sheets_stats() or {"enabled": False})
+
+
+@admin_bp.get("/admin/scheduler")
+def scheduler_stats():
+    return jsonify(scheduler.stats())
@@ -2,28 +2,108 @@ from __future__ import annotations
 
 import json
 import os
-import smtplib
-from datetime import date as _date, datetime, timezone
-from email.mime.multipart import MIMEMultipart
-from email.mime.text import MIMEText
+from datetime import date as _date
 
-from flask import Blueprint, Response, abort, jsonify, request
+from flask import Blueprint, Response, abort, jsonify, redirect, request, stream_with_context, url_for
 
-from app.services import billing_store as store
+from app.routes.responses import json_response
+from app.routes.streaming import export_response
+from app.services import billing_replication, billing_store as store, email_outbox, invoice_import, invoice_render, invoice_reports, pricing
+from app.services.pagination import TOTAL_MODES
 
 billing_bp = Blueprint("billing", __name__)
 
-CC_ADDRESS = "invoices.gizmo@gmail.com"
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+MAX_BATCH_EMAILS = 500
+DOCUMENT_MAX_AGE = 365 * 24 * 3600
 
 
 # ── Invoices ──────────────────────────────────────────────────────────────────
 
 @billing_bp.get("/billing/invoices")
 def list_invoices():
-    status = request.args.get("status") or None
-    q      = request.args.get("q") or None
-    items  = store.list_invoices(status=status, q=q)
-    return jsonify({"invoices": items, "total": len(items)})
+    filters = _invoice_filters()
+    if "cursor" in request.args or "limit" in request.args:
+        return json_response(_invoice_page(filters))
+    items = store.list_invoices_json(**filters)
+    return json_response({"invoices": items, "total": len(items)})
+
+
+def _invoice_filters() -> dict:
+    filters = {
+        "status":    request.args.get("status") or None,
+        "q":         (request.args.get("q") or "").strip() or None,
+        "date_from": _date_arg("from"),
+        "date_to":   _date_arg("to"),
+        "sort":      request.args.get("sort") or None,
+    }
+    try:
+        store.parse_sort(filters["sort"])
+    except ValueError as exc:
+        abort(400, description=str(exc))
+    return filters
+
+
+def _date_arg(name: str) -> str | None:
+    value = request.args.get(name) or None
+    if value:
+        try:
+            _date.fromisoformat(value)
+        except ValueError:
+            abort(400, description=f"{name} must be a YYYY-MM-DD date")
+    return value
+
+
+def _invoice_page(filters: dict) -> dict:
+    try:
+        limit = int(request.args.get("limit", DEFAULT_LIMIT))
+    except ValueError:
+        abort(400, description="limit must be an integer")
+    if limit < 0:
+        abort(400, description="limit must not be negative")
+    limit = min(limit, MAX_LIMIT)
+    total_mode = request.args.get("total", "none")
+    if total_mode not in TOTAL_MODES:
+        abort(400, description=f"Invalid total. Must be one of: {', '.join(sorted(TOTAL_MODES))}")
+
+    try:
+        items, next_cursor = store.page_invoices(**filters, limit=limit, cursor=request.args.get("cursor") or None)
+    except ValueError:
+        abort(400, description="invalid cursor")
+
+    result = {
+        "invoices": items,
+        "count": len(items),
+        "limit": limit,
+        "sort": filters["sort"] or store.DEFAULT_SORT,
+        "has_more": next_cursor is not None,
+    }
+    if next_cursor:
+        result["next_cursor"] = next_cursor
+    counted = {k: v for k, v in filters.items() if k != "sort"}
+    if total_mode == "exact":
+        result["total"] = store.count_invoices(**counted)
+    elif total_mode == "estimate":
+        result["total_estimate"] = store.count_invoices(**counted, estimate=True)
+    return result
+
+
+@billing_bp.get("/billing/invoices/export")
+def export_invoices():
+    return export_response(store.iter_invoices(**_invoice_filters()), store.COLUMNS, "invoices")
+
+
+@billing_bp.get("/billing/invoices/export.zip")
+def export_invoices_zip():
+    """Every matching invoice's printable document, streamed as one ZIP (oldest run date first)."""
+    filters = _invoice_filters()
+    filters["sort"] = filters["sort"] or "date"
+    stem = "-".join(["invoices"] + [filters[k] for k in ("date_from", "date_to") if filters[k]])
+    body = invoice_render.export_zip(store.iter_invoices(**filters))
+    response = Response(stream_with_context(body), mimetype="application/zip")
+    response.headers["Content-Disposition"] = f'attachment; filename="{stem}.zip"'
+    return response
 
 
 @billing_bp.post("/billing/invoices")
@@ -35,6 +115,16 @@ def create_invoice():
     return jsonify(inv), 201
 
 
+@billing_bp.post("/billing/invoices/import")
+def import_invoices():
+    """Create draft invoices from a CSV or NDJSON body; ?dry_run=1 only validates."""
+    fmt = request.args.get("format") or ("csv" if request.mimetype == "text/csv" else "ndjson")
+    if fmt not in invoice_import.FORMATS:
+        abort(400, description=f"Invalid format. Must be one of: {', '.join(invoice_import.FORMATS)}")
+    dry_run = request.args.get("dry_run", "").lower() in ("1", "true", "yes")
+    return jsonify(invoice_import.import_invoices(request.stream, fmt, dry_run=dry_run))
+
+
 @billing_bp.patch("/billing/invoices/<inv_id>")
 def update_invoice(inv_id: str):
     data = request.get_json(silent=True) or {}
@@ -44,6 +134,43 @@ def update_invoice(inv_id: str):
     return jsonify(inv)
 
 
+@billing_bp.get("/billing/replication")
+def replication_status():
+    return jsonify(billing_replication.stats())
+
+
+# ── Reports ───────────────────────────────────────────────────────────────────
+
+@billing_bp.get("/billing/reports")
+def reports():
+    """Revenue rollups and receivables aging for invoices dated ?from= .. ?to=, aged as of ?as_of=."""
+    as_of = _date_arg("as_of")
+    return jsonify(invoice_reports.report(
+        date_from=_date_arg("from"),
+        date_to=_date_arg("to"),
+        as_of=_date.fromisoformat(as_of) if as_of else None,
+    ))
+
+
+# ── Quotes ────────────────────────────────────────────────────────────────────
+
+@billing_bp.post("/billing/quote")
+def quote():
+    """Price a batch of ad specs without creating invoices."""
+    data = request.get_json(silent=True)
+    ads = data.get("ads") if isinstance(data, dict) else data
+    if not isinstance(ads, list):
+        abort(400, description="body must be a list of ads or {\"ads\": [...]}")
+    if len(ads) > pricing.MAX_QUOTES:
+        abort(400, description=f"at most {pricing.MAX_QUOTES} ads per quote")
+    return jsonify(pricing.quote(ads))
+
+
+@billing_bp.get("/billing/rate-cards")
+def rate_cards():
+    return jsonify({"default": pricing.DEFAULT_PUBLICATION, "rate_cards": pricing.RATE_CARDS})
+
+
 # ── Stripe ────────────────────────────────────────────────────────────────────
 
 @billing_bp.post("/billing/stripe/link")
@@ -135,159 +262,87 @@ def send_email():
     if not inv:
         abort(404, description="Invoice not found")
 
-    smtp_host = os.environ.get("SMTP_HOST", "smtp.gmail.com")
-    smtp_port = int(os.environ.get("SMTP_PORT", "587"))
-    smtp_user = os.environ.get("SMTP_USER", "")
-    smtp_pass = os.environ.get("SMTP_PASS", "")
-
-    if not smtp_user:
+    if not email_outbox.configured():
         return jsonify({"sent": False, "reason": "SMTP_USER not configured"}), 200
 
-    to_addr = inv.get("email", "")
-    if not to_addr:
+    if not inv.get("email", ""):
         return jsonify({"sent": False, "reason": "invoice has no client email"}), 200
 
-    subject = (f"Invoice — {inv.get('publication', 'Register-Call')} · "
-               f"{inv.get('client')} · ${inv.get('amount', '0.00')}")
-
-    msg = MIMEMultipart("alternative")
-    msg["Subject"] = subject
-    msg["From"]    = smtp_user
-    msg["To"]      = to_addr
-    msg["Cc"]      = CC_ADDRESS
-    msg.attach(MIMEText(_email_html(inv), "html"))
+    queued = email_outbox.enqueue([_email_message(inv)])
+    return jsonify({"sent": False, "queued": True, "message_id": queued[inv_id]}), 202
 
-    try:
-        with smtplib.SMTP(smtp_host, smtp_port) as srv:
-            srv.starttls()
-            srv.login(smtp_user, smtp_pass)
-            srv.sendmail(smtp_user, [to_addr, CC_ADDRESS], msg.as_string())
 
-        store.update_invoice(inv_id, {
-            "emailSent": datetime.now(timezone.utc).isoformat(),
-            "status": "sent",
-        })
-        return jsonify({"sent": True})
-    except Exception as exc:
-        return jsonify({"sent": False, "error": str(exc)}), 500
+@billing_bp.post("/billing/email/send-batch")
+def send_email_batch():
+    data = request.get_json(silent=True) or {}
+    ids  = data.get("invoice_ids")
+    if not isinstance(ids, list) or not ids or not all(isinstance(i, str) for i in ids):
+        abort(400, description="invoice_ids must be a non-empty list of invoice ids")
+    if len(ids) > MAX_BATCH_EMAILS:
+        abort(400, description=f"at most {MAX_BATCH_EMAILS} invoices per batch")
+    if not email_outbox.configured():
+        return jsonify({"queued": [], "reason": "SMTP_USER not configured"}), 200
+
+    messages, skipped = [], []
+    for inv_id in dict.fromkeys(ids):
+        inv = store.get_invoice(inv_id)
+        if not inv:
+            skipped.append({"invoice_id": inv_id, "reason": "not found"})
+        elif not inv.get("email", ""):
+            skipped.append({"invoice_id": inv_id, "reason": "invoice has no client email"})
+        else:
+            messages.append(_email_message(inv))
+
+    queued = email_outbox.enqueue(messages) if messages else {}
+    return jsonify({
+        "queued": [{"invoice_id": m["invoice_id"], "message_id": queued[m["invoice_id"]]} for m in messages],
+        "skipped": skipped,
+    }), 202
+
+
+@billing_bp.get("/billing/email/outbox")
+def email_outbox_status():
+    return jsonify(email_outbox.stats())
 
 
 # ── PDF (HTML template) ───────────────────────────────────────────────────────
 
 @billing_bp.get("/billing/pdf/<inv_id>")
-def get_pdf(inv_id: str):
+@billing_bp.get("/billing/pdf/<inv_id>/<version>")
+def get_pdf(inv_id: str, version: str | None = None):
+    """The printable invoice. The bare URL revalidates by ETag; the versioned one
+    (see Content-Location) never changes, so it is cached as immutable."""
     inv = store.get_invoice(inv_id)
     if not inv:
         abort(404, description="Invoice not found")
-    return Response(_pdf_html(inv), mimetype="text/html")
+    current = invoice_render.version(inv)
+    if version is not None and version != current:
+        return redirect(url_for(".get_pdf", inv_id=inv_id, version=current))
+
+    if request.if_none_match.contains(current):
+        response = Response(status=304)
+    else:
+        response = Response(invoice_render.render("pdf", inv), mimetype="text/html")
+    response.set_etag(current)
+    if version is None:
+        response.cache_control.no_cache = True
+        response.headers["Content-Location"] = url_for(".get_pdf", inv_id=inv_id, version=current)
+    else:
+        response.cache_control.private = True
+        response.cache_control.max_age = DOCUMENT_MAX_AGE
+        response.cache_control.immutable = True
+    return response
 
 
 # ── Helpers ───────────────────────────────────────────────────────────────────
 
-def _parse_dates(raw) -> list[str]:
-    if isinstance(raw, list):
-        return raw
-    try:
-        return json.loads(raw or "[]")
-    except Exception:
-        return []
-
-
-def _email_html(inv: dict) -> str:
-    dates_str = ", ".join(_parse_dates(inv.get("runDates", "[]"))) or "TBD"
-    stripe_btn = (
-        f'<p style="margin-top:20px;">'
-        f'<a href="{inv["stripeLink"]}" style="background:#b8860b;color:#fff;'
-        f'padding:10px 22px;text-decoration:none;border-radius:4px;font-family:Georgia,serif;">'
-        f'Pay Online →</a></p>'
-    ) if inv.get("stripeLink") else ""
-
-    return f"""<!DOCTYPE html>
-<html><body style="font-family:Georgia,serif;max-width:620px;margin:40px auto;color:#1a1a1a;background:#fff;">
-<div style="border-top:4px solid #b8860b;padding-top:16px;">
-  <h2 style="margin:0 0 4px;font-size:1.4rem;">Weekly Register-Call</h2>
-  <p style="margin:0;color:#666;font-size:0.9rem;">Black Hawk · Idaho Springs · Georgetown · Colorado</p>
-</div>
-<h3 style="margin-top:24px;border-bottom:1px solid #ddd;padding-bottom:8px;">Ad Invoice</h3>
-<table style="width:100%;border-collapse:collapse;font-size:0.95rem;">
-  <tr><td style="padding:7px 4px;color:#555;width:42%;">Client</td>
-      <td style="padding:7px 4px;font-weight:bold;">{inv.get('client','')}</td></tr>
-  <tr style="background:#f9f6f0;"><td style="padding:7px 4px;color:#555;">Email</td>
-      <td style="padding:7px 4px;">{inv.get('email','')}</td></tr>
-  <tr><td style="padding:7px 4px;color:#555;">Publication</td>
-      <td style="padding:7px 4px;">{inv.get('publication','')}</td></tr>
-  <tr style="background:#f9f6f0;"><td style="padding:7px 4px;color:#555;">Ad Type</td>
-      <td style="padding:7px 4px;">{inv.get('type','')}</td></tr>
-  <tr><td style="padding:7px 4px;color:#555;vertical-align:top;">Description</td>
-      <td style="padding:7px 4px;">{inv.get('description','')}</td></tr>
-  <tr style="background:#f9f6f0;"><td style="padding:7px 4px;color:#555;">Run Dates</td>
-      <td style="padding:7px 4px;">{dates_str}</td></tr>
-  <tr><td style="padding:7px 4px;color:#555;">Lines / Runs</td>
-      <td style="padding:7px 4px;">{inv.get('lineCount',1)} lines × {inv.get('runs',1)} runs</td></tr>
-  <tr style="background:#f9f6f0;"><td style="padding:7px 4px;color:#555;">First line rate</td>
-      <td style="padding:7px 4px;">${inv.get('firstLineRate',0.43):.2f}/run</td></tr>
-  <tr><td style="padding:7px 4px;color:#555;">Additional lines rate</td>
-      <td style="padding:7px 4px;">${inv.get('additionalLineRate',0.38):.2f}/run</td></tr>
-  <tr style="background:#f9f6f0;"><td style="padding:7px 4px;color:#555;">Origination fee</td>
-      <td style="padding:7px 4px;">${inv.get('originationFee',25):.2f}</td></tr>
-  <tr style="border-top:2px solid #b8860b;">
-    <td style="padding:10px 4px;font-weight:bold;font-size:1.1rem;">TOTAL DUE</td>
-    <td style="padding:10px 4px;font-weight:bold;font-size:1.1rem;color:#b8860b;">${inv.get('amount','0.00')}</td>
-  </tr>
-</table>
-{stripe_btn}
-<p style="margin-top:32px;font-size:0.8rem;color:#888;">
-  Questions? Reply to this email or contact {CC_ADDRESS}<br>
-  Weekly Register-Call · PO Box · Black Hawk, CO 80422
-</p>
-</body></html>"""
-
-
-def _pdf_html(inv: dict) -> str:
-    dates_str = ", ".join(_parse_dates(inv.get("runDates", "[]"))) or "TBD"
-    inv_num   = inv.get("id", "")[:8].upper()
-    return f"""<!DOCTYPE html>
-<html><head><title>Invoice {inv_num}</title>
-<style>
-  body {{ font-family: Georgia, serif; max-width: 700px; margin: 50px auto; color: #1a1a1a; }}
-  .header {{ border-top: 5px solid #b8860b; padding: 16px 0; margin-bottom: 24px; }}
-  .header h1 {{ margin: 0 0 4px; font-size: 1.6rem; }}
-  .inv-num {{ color: #666; font-size: 0.9rem; }}
-  table {{ width: 100%; border-collapse: collapse; margin-top: 16px; }}
-  td {{ padding: 9px 6px; border-bottom: 1px solid #e8e0d0; }}
-  .label {{ color: #555; width: 42%; }}
-  .total-row td {{ border-top: 2px solid #b8860b; font-weight: bold; font-size: 1.1rem; border-bottom: none; }}
-  .total-val {{ color: #b8860b; }}
-  @media print {{ body {{ margin: 20px; }} }}
-</style>
-</head><body>
-<div class="header">
-  <h1>Weekly Register-Call</h1>
-  <p style="margin:0;color:#666;">Black Hawk · Idaho Springs · Georgetown · Colorado</p>
-</div>
-<h2 style="margin:0 0 4px;">Ad Invoice</h2>
-<p class="inv-num">#{inv_num} &nbsp;·&nbsp; {inv.get('date','')}</p>
-<table>
-  <tr><td class="label">Client</td><td><strong>{inv.get('client','')}</strong></td></tr>
-  <tr><td class="label">Email</td><td>{inv.get('email','')}</td></tr>
-  <tr><td class="label">Publication</td><td>{inv.get('publication','')}</td></tr>
-  <tr><td class="label">Ad Type</td><td>{inv.get('type','')}</td></tr>
-  <tr><td class="label">Description</td><td>{inv.get('description','')}</td></tr>
-  <tr><td class="label">Run Dates</td><td>{dates_str}</td></tr>
-  <tr><td class="label">Lines</td><td>{inv.get('lineCount',1)}</td></tr>
-  <tr><td class="label">Runs</td><td>{inv.get('runs',1)}</td></tr>
-  <tr><td class="label">First line rate</td><td>${inv.get('firstLineRate',0.43):.2f}/run</td></tr>
-  <tr><td class="label">Additional lines rate</td><td>${inv.get('additionalLineRate',0.38):.2f}/run</td></tr>
-  <tr><td class="label">Origination fee</td><td>${inv.get('originationFee',25):.2f} (one-time)</td></tr>
-  <tr class="total-row">
-    <td class="label">TOTAL DUE</td>
-    <td class="total-val">${inv.get('amount','0.00')}</td>
-  </tr>
-</table>
-<p style="margin-top:40px;font-size:0.82rem;color:#888;">
-  Thank you for advertising with the Weekly Register-Call.<br>
-  Please remit payment to: Weekly Register-Call · PO Box · Black Hawk, CO 80422<br>
-  Questions: {CC_ADDRESS}
-</p>
-<script>window.onload = () => window.print();</script>
-</body></html>"""
+def _email_message(inv: dict) -> dict:
+    subject = (f"Invoice — {inv.get('publication', 'Register-Call')} · "
+               f"{inv.get('client')} · ${inv.get('amount', '0.00')}")
+    return {
+        "invoice_id": inv["id"],
+        "to_addr":    inv["email"],
+        "cc_addr":    invoice_render.CC_ADDRESS,
+        "subject":    subject,
+        "html":       invoice_render.render("email", inv),
+    }
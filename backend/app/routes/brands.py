@@ -4,11 +4,13 @@ from flask import Blueprint, abort, jsonify
 
 from ..services.articles import get_brand_counts
 from ..services.brand_registry import get_brand, list_brands
+from .conditional import conditional
 
 brands_bp = Blueprint("brands", __name__)
 
 
 @brands_bp.get("/brands")
+@conditional("brands")
 def brand_list():
     brands = list_brands()
     counts = get_brand_counts()
@@ -21,6 +23,7 @@ def brand_list():
 
 
 @brands_bp.get("/brands/<slug>")
+@conditional("brands")
 def brand_detail(slug: str):
     brand = get_brand(slug)
     if brand is None or not brand.get("enabled"):
@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import functools
+import hashlib
+from datetime import datetime
+
+from flask import Response, make_response, request
+
+from ..services import data_version
+
+
+def _tag(response: Response, etag: str, last_modified: datetime | None) -> None:
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.no_cache = True
+
+
+def _not_modified(etag: str, last_modified: datetime | None) -> bool:
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    since = request.if_modified_since
+    if since is not None and last_modified is not None:
+        return last_modified.replace(microsecond=0) <= since
+    return False
+
+
+def conditional(family: str):
+    """Answer If-None-Match / If-Modified-Since with 304 before running the view.
+
+    The strong ETag is the family's data-version stamp hashed with the full
+    request path, so every query-string variant validates independently.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            token, last_modified = data_version.stamp(family)
+            etag = hashlib.sha1(f"{token}|{request.full_path}".encode()).hexdigest()[:32]
+            if _not_modified(etag, last_modified):
+                response = Response(status=304)
+                _tag(response, etag, last_modified)
+                return response
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                _tag(response, etag, last_modified)
+            return response
+        return wrapper
+    return decorator
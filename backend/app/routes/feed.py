@@ -1,13 +1,29 @@
 from flask import Blueprint, abort, jsonify, request
 
-from ..services.articles import MAX_LIMIT, query_articles
+from ..services import feed_cache
+from ..services.article_fields import encode_rows, resolve_fields, row_dict
+from ..services.articles import (
+    MAX_LIMIT,
+    count_articles,
+    get_brand_counts,
+    get_published,
+    latest_by_brand,
+    query_articles,
+    query_articles_after,
+)
+from ..services.brand_registry import list_brands
+from ..services.pagination import cursor_page
+from ..services.search import search_articles
+from .conditional import conditional
+from .responses import json_response
 
 feed_bp = Blueprint("feed", __name__)
 
 
 @feed_bp.get("/feed/articles")
+@conditional("articles")
 def article_feed():
-    brand = request.args.get("brand")
+    brand = request.args.get("brand") or None
 
     try:
         limit = int(request.args.get("limit", 20))
@@ -19,7 +35,45 @@ def article_feed():
         abort(400, description="limit and offset must not be negative")
     limit = min(limit, MAX_LIMIT)
 
-    articles, total = query_articles(brand=brand, limit=limit, offset=offset)
+    try:
+        fields = resolve_fields(request.args.get("fields"), request.args.get("view"))
+    except ValueError as exc:
+        abort(400, description=str(exc))
+
+    if "cursor" in request.args:
+        if "offset" in request.args:
+            abort(400, description="cursor and offset are mutually exclusive")
+        cache_key = (brand, limit, fields, "cursor", request.args["cursor"], request.args.get("total", "none"))
+    else:
+        cache_key = (brand, limit, fields, "offset", offset)
+
+    result = feed_cache.get(cache_key)
+    if result is None:
+        if "cursor" in request.args:
+            result = _cursor_page(brand, limit, fields)
+        else:
+            result = _offset_page(brand, limit, offset, fields)
+        feed_cache.put(cache_key, result)
+    return json_response(result)
+
+
+@feed_bp.get("/feed/articles/<brand>/<slug>")
+@conditional("articles")
+def article_detail(brand: str, slug: str):
+    """One published article by brand and slug: a single indexed lookup."""
+    try:
+        fields = resolve_fields(request.args.get("fields"), request.args.get("view"))
+    except ValueError as exc:
+        abort(400, description=str(exc))
+
+    row = get_published(brand, slug, fields)
+    if row is None:
+        abort(404, description="Article not found")
+    return jsonify(row_dict(row, fields))
+
+
+def _offset_page(brand: str | None, limit: int, offset: int, fields: tuple[str, ...] | None) -> dict:
+    articles, total = query_articles(brand=brand, limit=limit, offset=offset, fields=fields)
     has_more = offset + limit < total
 
     result = {
@@ -28,10 +82,103 @@ def article_feed():
         "limit": limit,
         "offset": offset,
         "has_more": has_more,
-        "articles": articles,
+        "articles": encode_rows(articles, fields),
     }
     if has_more:
         result["next_offset"] = offset + limit
     if brand:
         result["brand"] = brand
+    return result
+
+
+def _cursor_page(brand: str | None, limit: int, fields: tuple[str, ...] | None) -> dict:
+    """Keyset mode: `?cursor=` (empty for the first page) plus optional `?total=`."""
+    try:
+        result = cursor_page(
+            lambda n, cursor: query_articles_after(brand=brand, limit=n, cursor=cursor, fields=fields),
+            lambda estimate: count_articles(brand, estimate=estimate),
+            limit, request.args["cursor"] or None, request.args.get("total", "none"),
+            "articles", lambda rows: encode_rows(rows, fields),
+        )
+    except ValueError as exc:
+        abort(400, description=str(exc))
+    if brand:
+        result["brand"] = brand
+    return result
+
+
+@feed_bp.get("/feed/home")
+@conditional("brands")
+def home():
+    """First paint in one request: enabled brands with counts and their newest articles."""
+    try:
+        limit = int(request.args.get("limit", 20))
+    except ValueError:
+        abort(400, description="limit must be an integer")
+    if limit < 0:
+        abort(400, description="limit must not be negative")
+    limit = min(limit, MAX_LIMIT)
+
+    try:
+        fields = resolve_fields(request.args.get("fields"), request.args.get("view"))
+    except ValueError as exc:
+        abort(400, description=str(exc))
+
+    cache_key = (None, limit, fields, "home")
+    cached = feed_cache.get(cache_key)
+    if cached is None:
+        brands = list_brands()
+        latest = latest_by_brand([b["slug"] for b in brands], limit, fields)
+        cached = {"brands": brands, "articles": {b["slug"]: encode_rows(latest[b["slug"]], fields) for b in brands}}
+        feed_cache.put(cache_key, cached)
+
+    # Counts cover drafts and scheduled rows, whose writes don't invalidate the feed
+    # cache, so they are read fresh: the counter table is one row per brand and status
+    counts = get_brand_counts()
+    items = []
+    for b in cached["brands"]:
+        entry = dict(b)
+        entry["counts"] = counts.get(b["slug"], {"published": 0, "draft": 0, "scheduled": 0, "total": 0})
+        entry["articles"] = cached["articles"][b["slug"]]
+        items.append(entry)
+    return json_response({
+        "items": items,
+        "count": len(items),
+        "limit": limit,
+        "total": sum(entry["counts"]["published"] for entry in items),
+    })
+
+
+@feed_bp.get("/feed/search")
+@conditional("articles")
+def search():
+    q = (request.args.get("q") or "").strip()
+    brand = request.args.get("brand") or None
+
+    try:
+        limit = int(request.args.get("limit", 20))
+    except ValueError:
+        abort(400, description="limit must be an integer")
+    if limit < 0:
+        abort(400, description="limit must not be negative")
+    limit = min(limit, MAX_LIMIT)
+
+    try:
+        articles, next_cursor = search_articles(
+            q, brand=brand, status="published", limit=limit, cursor=request.args.get("cursor") or None
+        )
+    except ValueError as exc:
+        abort(400, description=str(exc))
+
+    result = {
+        "q": q,
+        "count": len(articles),
+        "limit": limit,
+        "has_more": next_cursor is not None,
+        "articles": articles,
+    }
+    if next_cursor:
+        result["next_cursor"] = next_cursor
+    if brand:
+        result["brand"] = brand
     return jsonify(result)
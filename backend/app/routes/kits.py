@@ -5,6 +5,7 @@ import os
 from flask import Blueprint, abort, jsonify, request
 
 from app.services import kit_store as store
+from .conditional import conditional
 
 kits_bp = Blueprint("kits", __name__)
 
@@ -18,6 +19,7 @@ def _require_admin() -> None:
 
 
 @kits_bp.get("/kits")
+@conditional("kits")
 def list_kits():
     kits = store.list_kits()
     return jsonify({"kits": kits, "total": len(kits)})
@@ -3,6 +3,7 @@ from __future__ import annotations
 from flask import Blueprint, abort, jsonify, request
 
 from app.services import ops_domain_store as store
+from .conditional import conditional
 
 ops_domains_bp = Blueprint("ops_domains", __name__)
 
@@ -18,6 +19,7 @@ def _valid_domain(value: str) -> bool:
 
 
 @ops_domains_bp.get("/admin/ops/domains")
+@conditional("ops_domains")
 def list_domains():
     try:
         limit  = int(request.args.get("limit", 20))
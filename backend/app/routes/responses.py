@@ -0,0 +1,16 @@
+from __future__ import annotations
+
+import json
+
+from flask import Response, current_app, jsonify
+
+from ..services import row_json
+
+
+def json_response(obj: dict) -> Response:
+    """jsonify(obj) for payloads holding row_json.Encoded lists, without re-encoding them."""
+    provider = current_app.json
+    if provider.compact is False or (provider.compact is None and current_app.debug):
+        # Indented debug output: take the slow path so it still matches jsonify()
+        return jsonify(json.loads(row_json.dumps(obj)))
+    return current_app.response_class(row_json.dumps(obj) + "\n", mimetype=provider.mimetype)
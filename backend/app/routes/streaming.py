@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+from typing import Iterable
+
+from flask import Response, abort, request, stream_with_context
+
+from ..services.export import FORMATS, encode
+
+
+def export_response(rows: Iterable[dict], columns: Iterable[str], stem: str) -> Response:
+    """Stream `rows` in the `?format=` the client asked for (ndjson by default).
+
+    stream_with_context keeps the app context, and with it the DB session,
+    open until the last row is written.
+    """
+    fmt = request.args.get("format", "ndjson")
+    if fmt not in FORMATS:
+        abort(400, description=f"Invalid format. Must be one of: {', '.join(sorted(FORMATS))}")
+    response = Response(stream_with_context(encode(rows, fmt, columns)), mimetype=FORMATS[fmt])
+    response.headers["Content-Disposition"] = f'attachment; filename="{stem}.{fmt}"'
+    return response
@@ -0,0 +1,65 @@
+"""Serialization throughput of the article list path, ORM versus row_json.
+
+List endpoints read column tuples and encode them with a cached
+row_json.RowEncoder instead of hydrating Article instances and dumping
+their dicts. `flask --app run row-bench` times one page read both ways
+against the app database, per field set, and reports rows per second for
+each path. Both paths must produce the same JSON text before either is
+timed, so the comparison can't drift from what the endpoints serve.
+"""
+from __future__ import annotations
+
+import json
+import time
+
+from .db import db
+from .models import Article
+from .services import row_json
+from .services.article_fields import SUMMARY_FIELDS, encode_rows, query_options, row_columns, serialize
+
+CASES = {"full": None, "summary": SUMMARY_FIELDS}
+
+
+def _newest(query, limit: int):
+    return query.order_by(Article.created_at.desc(), Article.id.desc()).limit(limit)
+
+
+def _orm_page(fields, limit: int) -> str:
+    db.session.expunge_all()  # fresh instances every round, as in a new request
+    articles = _newest(Article.query.options(*query_options(fields)), limit).all()
+    return json.dumps({"articles": [serialize(a, fields) for a in articles]},
+                      sort_keys=True, separators=(",", ":"))
+
+
+def _row_page(fields, limit: int) -> str:
+    rows = _newest(db.session.query(Article).with_entities(*row_columns(fields)), limit).all()
+    return row_json.dumps({"articles": encode_rows(rows, fields)})
+
+
+def _rows_per_s(fn, fields, limit: int, rows: int, rounds: int) -> float:
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fn(fields, limit)
+    return round(rows * rounds / (time.perf_counter() - start), 1)
+
+
+def bench(limit: int = 100, rounds: int = 200, views=tuple(CASES)) -> list[dict]:
+    """Query-plus-encode rows/s for the newest `limit` articles, once per view."""
+    results = []
+    for view in views:
+        fields = CASES[view]
+        expected = _orm_page(fields, limit)
+        if _row_page(fields, limit) != expected:
+            raise AssertionError(f"row_json output differs from the ORM path for view={view}")
+        rows = len(json.loads(expected)["articles"])
+        orm = _rows_per_s(_orm_page, fields, limit, rows, rounds)
+        encoded = _rows_per_s(_row_page, fields, limit, rows, rounds)
+        results.append({
+            "view": view,
+            "rows": rows,
+            "rounds": rounds,
+            "orm_rows_per_s": orm,
+            "row_json_rows_per_s": encoded,
+            "speedup": round(encoded / orm, 2) if orm else None,
+        })
+    return results
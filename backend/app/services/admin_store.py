@@ -1,11 +1,20 @@
 from __future__ import annotations
 
 import re
+from typing import Callable, Iterator
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 
 from ..db import db
 from ..models import Article
+from . import article_render, feed_cache, site_generator
+from .article_fields import query_options, row_columns, serialize
+from .export import YIELD_PER
+from .pagination import estimate_count, keyset_page
 
 VALID_STATUSES = {"draft", "scheduled", "published"}
+SLUG_ATTEMPTS = 3  # a concurrent writer can claim the slug between lookup and commit
 
 
 def _slugify(title: str) -> str:
@@ -15,48 +24,159 @@ def _slugify(title: str) -> str:
     return slug.strip("-")
 
 
+def unique_slug(brand: str, base: str, exclude_id: str | None = None) -> str:
+    """`base`, or the first free `base-2`, `base-3`, ... within `brand`.
+
+    One range seek on ux_articles_brand_slug: every suffixed form sorts
+    between "base-" and "base." ('.' follows '-').
+    """
+    q = select(Article.slug).where(
+        Article.brand == brand,
+        (Article.slug == base) | ((Article.slug >= base + "-") & (Article.slug < base + ".")),
+    )
+    if exclude_id is not None:
+        q = q.where(Article.id != exclude_id)
+    taken = set(db.session.execute(q).scalars())
+    if base not in taken:
+        return base
+    n = 2
+    while f"{base}-{n}" in taken:
+        n += 1
+    return f"{base}-{n}"
+
+
+def _commit_with_slug(article: Article, base: str, apply: Callable[[], None] = lambda: None) -> None:
+    """Commit `article` under unique_slug(base); `apply` re-sets any edits a retry's rollback discarded."""
+    for attempt in range(SLUG_ATTEMPTS):
+        apply()
+        article.slug = unique_slug(article.brand, base, article.id)
+        db.session.add(article)
+        try:
+            db.session.commit()
+            return
+        except IntegrityError:
+            db.session.rollback()
+            if attempt == SLUG_ATTEMPTS - 1:
+                raise
+
+
+def validate_article(data: dict) -> dict:
+    """Normalize a create payload; raises ValueError with the message admin.create returns."""
+    brand = str(data.get("brand") or "").strip()
+    title = str(data.get("title") or "").strip()
+    if not brand or not title:
+        raise ValueError("brand and title are required")
+
+    status = str(data.get("status") or "draft").strip()
+    if status not in VALID_STATUSES:
+        raise ValueError(f"Invalid status. Must be one of: {', '.join(sorted(VALID_STATUSES))}")
+
+    return {
+        "brand": brand,
+        "title": title,
+        "body": str(data.get("body") or "").strip(),
+        "author": str(data.get("author") or "").strip(),
+        "status": status,
+    }
+
+
 def create_article(brand: str, title: str, body: str, author: str = "",
                    status: str = "draft") -> dict:
     article = Article(
         brand=brand,
         title=title,
-        slug=_slugify(title),
         body=body,
         author=author,
         status=status,
     )
-    db.session.add(article)
-    db.session.commit()
-    return article.to_dict()
+    _commit_with_slug(article, _slugify(title))
+    if status == "published":
+        feed_cache.invalidate_brand(brand)
+    article_render.warm(body)  # store the render here so reads are lookups and never write
+    result = article.to_dict()
+    site_generator.article_changed(result, was_published=False)
+    return result
 
 
-def get_article(article_id: str) -> dict | None:
+def get_article(article_id: str, fields: tuple[str, ...] | None = None) -> dict | None:
     article = db.session.get(Article, article_id)
     if article is None:
         return None
-    return article.to_dict()
+    return serialize(article, fields)
 
 
 def update_article(article_id: str, updates: dict) -> dict | None:
     article = db.session.get(Article, article_id)
     if article is None:
         return None
-    for key in ("title", "body", "status", "scheduled_at"):
-        if key in updates:
-            setattr(article, key, updates[key])
+    was_published = article.status == "published"
+    old_slug = article.slug
+
+    def apply():
+        for key in ("title", "body", "status", "scheduled_at"):
+            if key in updates:
+                setattr(article, key, updates[key])
+
     if "title" in updates:
-        article.slug = _slugify(updates["title"])
-    db.session.commit()
-    return article.to_dict()
+        _commit_with_slug(article, _slugify(updates["title"]), apply)
+    else:
+        apply()
+        db.session.commit()
+    if "body" in updates:
+        article_render.warm(article.body)
+    if was_published or article.status == "published":
+        feed_cache.invalidate_brand(article.brand)
+    result = article.to_dict()
+    site_generator.article_changed(result, was_published, old_slug)
+    return result
 
 
-def query_articles(brand: str | None = None, status: str | None = None,
-                   limit: int = 20, offset: int = 0) -> tuple[list[dict], int]:
+def _filtered(brand: str | None = None, status: str | None = None):
     q = Article.query
     if brand:
         q = q.filter_by(brand=brand)
     if status:
         q = q.filter_by(status=status)
+    return q
+
+
+def query_articles(brand: str | None = None, status: str | None = None,
+                   limit: int = 20, offset: int = 0,
+                   fields: tuple[str, ...] | None = None) -> tuple[list, int]:
+    """Returns (rows, total); rows are row_columns(fields) tuples for encode_rows()."""
+    q = _filtered(brand, status)
     total = q.count()
-    articles = q.order_by(Article.created_at.desc()).offset(offset).limit(limit).all()
-    return [a.to_dict() for a in articles], total
+    rows = (
+        q.with_entities(*row_columns(fields))
+        .order_by(Article.created_at.desc(), Article.id.desc())
+        .offset(offset).limit(limit).all()
+    )
+    return rows, total
+
+
+def query_articles_after(brand: str | None = None, status: str | None = None,
+                         limit: int = 20, cursor: str | None = None,
+                         fields: tuple[str, ...] | None = None) -> tuple[list, str | None]:
+    q = _filtered(brand, status).with_entities(*row_columns(fields))
+    return keyset_page(q, Article, limit, cursor)
+
+
+def iter_articles(brand: str | None = None, status: str | None = None,
+                  fields: tuple[str, ...] | None = None) -> Iterator[dict]:
+    """Every matching article newest-first, read through a server-side cursor."""
+    q = (
+        _filtered(brand, status)
+        .options(*query_options(fields))
+        .order_by(Article.created_at.desc(), Article.id.desc())
+        .yield_per(YIELD_PER)
+    )
+    for article in q:
+        yield serialize(article, fields)
+
+
+def count_articles(brand: str | None = None, status: str | None = None,
+                   estimate: bool = False) -> int:
+    q = _filtered(brand, status)
+    if estimate:
+        return estimate_count(q, ("admin", brand, status))
+    return q.count()
@@ -0,0 +1,164 @@
+"""Sparse fieldsets for article list endpoints.
+
+`?fields=title,excerpt` or `?view=summary` narrow the response; the matching
+loader options keep unrequested columns (notably `body`) out of the SELECT,
+and `excerpt` is cut from the body by SQLite's substr() rather than in Python.
+`body_html` is opt-in only (never part of the full shape) and comes from the
+article_render cache.
+
+List endpoints read plain column tuples (row_columns) and encode them with a
+cached RowEncoder; serialize() remains for callers holding ORM instances.
+"""
+from __future__ import annotations
+
+from functools import lru_cache
+
+from sqlalchemy import func
+from sqlalchemy.orm import load_only, with_expression
+
+from ..models import Article
+from . import article_render, row_json
+
+FIELDS = (
+    "id", "brand", "title", "slug", "body", "body_html", "excerpt", "author", "status",
+    "scheduled_at", "created_at", "updated_at",
+)
+_OPT_IN = {"excerpt", "body_html"}
+SUMMARY_FIELDS = (
+    "id", "brand", "title", "slug", "excerpt", "author", "status",
+    "scheduled_at", "created_at", "updated_at",
+)
+VIEWS = {"full", "summary"}
+EXCERPT_CHARS = 280
+
+
+def excerpt(text: str | None, length: int = EXCERPT_CHARS) -> str:
+    text = " ".join((text or "").split())
+    return text if len(text) <= length else text[:length].rsplit(" ", 1)[0] + "…"
+
+
+def _iso(value):
+    return value.isoformat() if value else None
+
+
+_GETTERS = {
+    "id":           lambda a: a.id,
+    "brand":        lambda a: a.brand,
+    "title":        lambda a: a.title,
+    "slug":         lambda a: a.slug,
+    "body":         lambda a: a.body,
+    "body_html":    lambda a: article_render.render(a.body),
+    "excerpt":      lambda a: excerpt(a.excerpt),
+    "author":       lambda a: a.author,
+    "status":       lambda a: a.status,
+    "scheduled_at": lambda a: _iso(a.scheduled_at),
+    "created_at":   lambda a: a.created_at.isoformat(),
+    "updated_at":   lambda a: a.updated_at.isoformat(),
+}
+
+
+# Column-tuple read path: select expression and JSON encoder per field
+_COLUMNS = {
+    "id":           Article.id,
+    "brand":        Article.brand,
+    "title":        Article.title,
+    "slug":         Article.slug,
+    "body":         Article.body,
+    "body_html":    Article.body.label("body_html"),
+    # One spare character tells excerpt() whether the body was truncated
+    "excerpt":      func.substr(Article.body, 1, EXCERPT_CHARS + 1).label("excerpt"),
+    "author":       Article.author,
+    "status":       Article.status,
+    "scheduled_at": Article.scheduled_at,
+    "created_at":   Article.created_at,
+    "updated_at":   Article.updated_at,
+}
+
+_VALUES = {
+    "body_html":    article_render.render,
+    "excerpt":      excerpt,
+    "scheduled_at": _iso,
+    "created_at":   lambda v: v.isoformat(),
+    "updated_at":   lambda v: v.isoformat(),
+}
+
+_ENCODERS = {
+    "body_html":    lambda v: row_json.string(article_render.render(v)),
+    "excerpt":      lambda v: row_json.string(excerpt(v)),
+    "scheduled_at": row_json.nullable_iso,
+    "created_at":   row_json.iso,
+    "updated_at":   row_json.iso,
+}
+
+
+def resolve_fields(fields: str | None = None, view: str | None = None) -> tuple[str, ...] | None:
+    """Turn the query params into a field tuple; None means the full to_dict() shape."""
+    if view and view not in VIEWS:
+        raise ValueError(f"Invalid view. Must be one of: {', '.join(sorted(VIEWS))}")
+    if fields:
+        names = tuple(dict.fromkeys(f.strip() for f in fields.split(",") if f.strip()))
+        unknown = [n for n in names if n not in _GETTERS]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+        return names or None
+    if view == "summary":
+        return SUMMARY_FIELDS
+    return None
+
+
+def columns(fields: tuple[str, ...] | None) -> tuple[str, ...]:
+    """Key order of serialize() output, used as the CSV export header."""
+    if fields is None:
+        return tuple(f for f in FIELDS if f not in _OPT_IN)
+    return fields
+
+
+@lru_cache(maxsize=64)
+def _row_shape(fields: tuple[str, ...] | None) -> tuple[tuple, row_json.RowEncoder]:
+    names = columns(fields)
+    # id and created_at always come last if unrequested: keyset cursors are built from them
+    extra = tuple(c for c in ("id", "created_at") if c not in names)
+    select = tuple(_COLUMNS[n] for n in names + extra)
+    return select, row_json.RowEncoder([(n, _ENCODERS.get(n, row_json.string)) for n in names])
+
+
+def row_columns(fields: tuple[str, ...] | None) -> tuple:
+    """Column expressions for `fields`, for Query.with_entities()."""
+    return _row_shape(fields)[0]
+
+
+def encode_rows(rows, fields: tuple[str, ...] | None) -> row_json.Encoded:
+    """JSON text for rows read with row_columns(fields), byte-identical to jsonify(serialize(...))."""
+    if fields is not None and "body_html" in fields:
+        rows = list(rows)
+        i = fields.index("body_html")
+        article_render.prime(row[i] for row in rows)  # one lookup for the page, not one per row
+    return _row_shape(fields)[1].encode_all(rows)
+
+
+def row_dict(row, fields: tuple[str, ...] | None) -> dict:
+    return {n: _VALUES.get(n, _same)(row[i]) for i, n in enumerate(columns(fields))}
+
+
+def _same(value):
+    return value
+
+
+def query_options(fields: tuple[str, ...] | None) -> list:
+    if fields is None:
+        return []
+    # id and created_at are always loaded: keyset cursors are built from them
+    columns = {"id", "created_at"} | {f for f in fields if f not in _OPT_IN}
+    if "body_html" in fields:
+        columns.add("body")
+    options = [load_only(*(getattr(Article, c) for c in sorted(columns)))]
+    if "excerpt" in fields:
+        # One spare character tells excerpt() whether the body was truncated
+        options.append(with_expression(Article.excerpt, func.substr(Article.body, 1, EXCERPT_CHARS + 1)))
+    return options
+
+
+def serialize(article: Article, fields: tuple[str, ...] | None) -> dict:
+    if fields is None:
+        return article.to_dict()
+    return {f: _GETTERS[f](article) for f in fields}
@@ -0,0 +1,140 @@
+"""Bulk NDJSON article ingest.
+
+Lines are parsed one at a time and validated with admin_store.validate_article.
+Valid rows are buffered per (brand, slug) and flushed every CHUNK_SIZE rows as
+one executemany INSERT plus one executemany UPDATE in a single transaction, so
+memory stays at one chunk no matter how large the upload is.
+
+New rows get the create defaults (draft, empty body and author); an update
+writes only the keys its lines supplied. Later lines for a (brand, slug)
+already in the chunk merge into it and are reported as `superseded`, so
+created + updated + superseded + failed always equals `lines`.
+"""
+from __future__ import annotations
+
+import json
+import time
+from datetime import datetime, timezone
+from typing import Iterable
+
+from sqlalchemy import insert, select, tuple_, update
+from sqlalchemy.exc import SQLAlchemyError
+
+from ..db import db
+from ..models import Article
+from . import article_render, feed_cache, site_generator
+from .admin_store import _slugify, validate_article
+
+CHUNK_SIZE = 500
+MAX_ERRORS = 1000  # per-line errors reported back; counts stay exact beyond this
+
+
+def _parse_datetime(value, field: str) -> datetime:
+    try:
+        parsed = datetime.fromisoformat(str(value))
+    except ValueError:
+        raise ValueError(f"{field} must be an ISO-8601 datetime") from None
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+_ALWAYS = frozenset({"brand", "title", "slug"})
+
+
+def _prepare(data) -> tuple[dict, frozenset]:
+    """Validated row plus the keys the line supplied (all that an update writes)."""
+    if not isinstance(data, dict):
+        raise ValueError("line must be a JSON object")
+    row = validate_article(data)
+    row["slug"] = _slugify(str(data.get("slug") or row["title"]))
+    if data.get("created_at"):
+        row["created_at"] = _parse_datetime(data["created_at"], "created_at")
+    return row, _ALWAYS | {k for k in ("body", "author", "status", "created_at") if k in data and k in row}
+
+
+def _fail(summary: dict, line_no: int, message: str) -> None:
+    summary["failed"] += 1
+    if len(summary["errors"]) < MAX_ERRORS:
+        summary["errors"].append({"line": line_no, "error": message})
+    else:
+        summary["errors_truncated"] = True
+
+
+def _flush(chunk: dict[tuple, tuple[list[int], dict, frozenset]], summary: dict, brands: set) -> None:
+    existing = dict(
+        ((brand, slug), article_id)
+        for brand, slug, article_id in db.session.execute(
+            select(Article.brand, Article.slug, Article.id)
+            .where(tuple_(Article.brand, Article.slug).in_(list(chunk)))
+        )
+    )
+    inserts, updates = [], []
+    for key, (_, row, supplied) in chunk.items():
+        if key in existing:
+            updates.append({"id": existing[key], **{k: row[k] for k in supplied}})
+        else:
+            inserts.append(row)
+
+    try:
+        if inserts:
+            db.session.execute(insert(Article), inserts)
+        if updates:
+            db.session.execute(update(Article), updates)
+        db.session.commit()
+    except SQLAlchemyError as exc:
+        db.session.rollback()
+        for line_nos, _, _ in chunk.values():
+            for line_no in line_nos:
+                _fail(summary, line_no, f"database error: {exc.__class__.__name__}")
+        return
+
+    summary["created"] += len(inserts)
+    summary["updated"] += len(updates)
+    summary["superseded"] += sum(len(line_nos) - 1 for line_nos, _, _ in chunk.values())
+    brands.update(brand for brand, _ in chunk)
+    article_render.prime((row["body"] for row in inserts + updates if "body" in row), store=True)
+
+
+def ingest_ndjson(lines: Iterable[bytes]) -> dict:
+    """Upsert articles by (brand, slug) from NDJSON lines; returns a per-line report."""
+    start = time.monotonic()
+    summary = {"lines": 0, "created": 0, "updated": 0, "superseded": 0, "failed": 0, "errors": []}
+    brands: set[str] = set()
+    chunk: dict[tuple, tuple[list[int], dict, frozenset]] = {}
+
+    for line_no, raw in enumerate(lines, start=1):
+        raw = raw.strip()
+        if not raw:
+            continue
+        summary["lines"] += 1
+        try:
+            row, supplied = _prepare(json.loads(raw))
+        except ValueError as exc:  # includes JSONDecodeError
+            _fail(summary, line_no, str(exc))
+            continue
+
+        key = (row["brand"], row["slug"])
+        if key in chunk:
+            # A later line in the same chunk applies on top of the earlier ones
+            line_nos, earlier, earlier_supplied = chunk[key]
+            row = {**earlier, **{k: row[k] for k in supplied}}
+            supplied = earlier_supplied | supplied
+            line_nos.append(line_no)
+        else:
+            line_nos = [line_no]
+        chunk[key] = (line_nos, row, supplied)
+        if len(chunk) >= CHUNK_SIZE:
+            _flush(chunk, summary, brands)
+            chunk.clear()
+    if chunk:
+        _flush(chunk, summary, brands)
+
+    if brands:
+        for brand in brands:
+            feed_cache.invalidate_brand(brand)
+            site_generator.brand_changed(brand)
+
+    summary["brands"] = sorted(brands)
+    summary["ms"] = int((time.monotonic() - start) * 1000)
+    return summary
@@ -0,0 +1,265 @@
+"""Markdown -> HTML for article bodies, cached by content hash.
+
+Renders are keyed on (sha256(body), RENDERER). An in-process LRU sits in
+front of the `article_renders` table, so a body is rendered once per edit
+and every later read, in any worker, is a lookup. Writes store the render;
+reads fill anything still missing in one batched SELECT and render the rest
+into the LRU only, so a GET never writes to the database.
+
+RENDERER fingerprints the markdown version, the extension list and
+RENDER_REVISION. Bump the revision whenever render output should change:
+boot notices rows under an older fingerprint and sweep() re-renders live
+bodies in the background, dropping stale and orphaned renders as it goes.
+
+Raw HTML in a body is escaped rather than passed through, and links or
+images with a scheme other than http(s)/mailto are dropped.
+"""
+from __future__ import annotations
+
+import hashlib
+import html
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable
+from urllib.parse import urlsplit
+
+from sqlalchemy import delete, insert, select
+
+from ..db import db
+from ..models import Article, ArticleRender
+
+log = logging.getLogger(__name__)
+
+# ── Markdown (optional) ───────────────────────────────────────────────────────
+_MARKDOWN_OK = False
+try:
+    import markdown
+    from markdown.extensions import Extension
+    from markdown.treeprocessors import Treeprocessor
+    _MARKDOWN_OK = True
+except ImportError:
+    pass
+
+EXTENSIONS = ("tables", "fenced_code")
+RENDER_REVISION = 1
+RENDERER = hashlib.sha1(
+    f"{markdown.__version__ if _MARKDOWN_OK else 'plain'}|{','.join(EXTENSIONS)}|{RENDER_REVISION}".encode()
+).hexdigest()[:16]
+
+CACHE_SIZE = int(os.environ.get("RENDER_CACHE_SIZE", "1024"))
+SWEEP_BATCH = 500
+
+_SAFE_SCHEMES = {"", "http", "https", "mailto"}
+
+_lock = threading.Lock()
+_cache: OrderedDict[str, str] = OrderedDict()
+_stats = {"hits": 0, "stored": 0, "rendered": 0, "evictions": 0}
+_local = threading.local()
+
+
+# ── Rendering ─────────────────────────────────────────────────────────────────
+
+if _MARKDOWN_OK:
+    class _SafeUrls(Treeprocessor):
+        def run(self, root):
+            for el in root.iter():
+                for attr in ("href", "src"):
+                    value = el.get(attr)
+                    if value is not None and urlsplit(value.strip()).scheme.lower() not in _SAFE_SCHEMES:
+                        del el.attrib[attr]
+
+    class _NoRawHtml(Extension):
+        def extendMarkdown(self, md):
+            md.preprocessors.deregister("html_block")
+            md.inlinePatterns.deregister("html")
+            md.treeprocessors.register(_SafeUrls(md), "safe_urls", 0)
+
+
+def _markdown():
+    md = getattr(_local, "md", None)
+    if md is None:
+        md = _local.md = markdown.Markdown(extensions=[*EXTENSIONS, _NoRawHtml()])
+    return md
+
+
+def render_uncached(body: str) -> str:
+    if not _MARKDOWN_OK:
+        # Fallback: escaped paragraphs if markdown is not installed
+        return "".join(f"<p>{html.escape(p.strip())}</p>\n" for p in body.split("\n\n") if p.strip())
+    md = _markdown()
+    try:
+        return md.convert(body)
+    finally:
+        md.reset()
+
+
+def content_hash(body: str | None) -> str:
+    return hashlib.sha256((body or "").encode()).hexdigest()
+
+
+# ── Cache ─────────────────────────────────────────────────────────────────────
+
+def _remember(key: str, value: str) -> None:
+    if CACHE_SIZE <= 0:
+        return
+    with _lock:
+        _cache[key] = value
+        _cache.move_to_end(key)
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+            _stats["evictions"] += 1
+
+
+def _cached(key: str) -> str | None:
+    with _lock:
+        value = _cache.get(key)
+        if value is not None:
+            _cache.move_to_end(key)
+            _stats["hits"] += 1
+        return value
+
+
+def prime(bodies: Iterable[str | None], store: bool = False) -> None:
+    """Make every body an LRU hit: one SELECT for the misses, then render the rest.
+
+    Only write paths pass store=True to save fresh renders to the table; reads
+    keep them in the LRU, so an anonymous GET never takes the SQLite write lock.
+    """
+    wanted = {content_hash(b): b or "" for b in bodies}
+    missing = [k for k in wanted if _cached(k) is None]
+    if not missing:
+        return
+    stored = dict(db.session.execute(
+        select(ArticleRender.content_hash, ArticleRender.html)
+        .where(ArticleRender.renderer == RENDERER, ArticleRender.content_hash.in_(missing))
+    ).all())
+    with _lock:
+        _stats["stored"] += len(stored)
+    fresh = []
+    for key in missing:
+        value = stored.get(key)
+        if value is None:
+            value = render_uncached(wanted[key])
+            fresh.append({"content_hash": key, "renderer": RENDERER, "html": value})
+        _remember(key, value)
+    with _lock:
+        _stats["rendered"] += len(fresh)
+    if fresh and store:
+        _store(fresh)
+
+
+def _store(rows: list[dict]) -> None:
+    # OR IGNORE: another worker may have stored the same render first
+    db.session.execute(insert(ArticleRender).prefix_with("OR IGNORE"), rows)
+    db.session.commit()
+
+
+def warm(body: str | None) -> None:
+    """Render and store `body` from a write path, so later reads are lookups."""
+    prime([body], store=True)
+
+
+def render(body: str | None) -> str:
+    """HTML for `body`, from the LRU, the renders table or a fresh render (never stored)."""
+    key = content_hash(body)
+    value = _cached(key)
+    if value is None:
+        prime([body])
+        with _lock:
+            value = _cache.get(key)
+        if value is None:  # CACHE_SIZE=0
+            value = render_uncached(body or "")
+    return value
+
+
+def clear() -> None:
+    with _lock:
+        _cache.clear()
+        for k in _stats:
+            _stats[k] = 0
+
+
+def stats() -> dict:
+    with _lock:
+        return {**_stats, "entries": len(_cache), "max_entries": CACHE_SIZE, "renderer": RENDERER}
+
+
+# ── Re-render sweep ───────────────────────────────────────────────────────────
+
+def is_stale() -> bool:
+    """True if any stored render predates the current RENDERER."""
+    return db.session.execute(
+        select(ArticleRender.content_hash).where(ArticleRender.renderer != RENDERER).limit(1)
+    ).first() is not None
+
+
+def sweep() -> dict:
+    """Render every live body under RENDERER, then drop stale and orphaned renders."""
+    start = time.monotonic()
+    live: set[str] = set()
+    rendered = 0
+    last_id = ""
+
+    # Keyset batches on id, so each batch's renders commit without holding a cursor open
+    while True:
+        rows = db.session.execute(
+            select(Article.id, Article.body).where(Article.id > last_id).order_by(Article.id).limit(SWEEP_BATCH)
+        ).all()
+        if not rows:
+            break
+        last_id = rows[-1].id
+        batch = {content_hash(body): body or "" for _, body in rows}
+        live.update(batch)
+        done = set(db.session.execute(
+            select(ArticleRender.content_hash)
+            .where(ArticleRender.renderer == RENDERER, ArticleRender.content_hash.in_(list(batch)))
+        ).scalars())
+        fresh = [
+            {"content_hash": k, "renderer": RENDERER, "html": render_uncached(b)}
+            for k, b in batch.items() if k not in done
+        ]
+        if fresh:
+            _store(fresh)
+            rendered += len(fresh)
+            with _lock:
+                _stats["rendered"] += len(fresh)
+
+    stale = db.session.execute(delete(ArticleRender).where(ArticleRender.renderer != RENDERER)).rowcount
+    dead = [
+        k for k in db.session.execute(
+            select(ArticleRender.content_hash).where(ArticleRender.renderer == RENDERER)
+        ).scalars()
+        if k not in live
+    ]
+    orphans = 0
+    for i in range(0, len(dead), SWEEP_BATCH):
+        orphans += db.session.execute(delete(ArticleRender).where(
+            ArticleRender.renderer == RENDERER, ArticleRender.content_hash.in_(dead[i:i + SWEEP_BATCH])
+        )).rowcount
+    db.session.commit()
+    return {
+        "renderer": RENDERER,
+        "bodies": len(live),
+        "rendered": rendered,
+        "dropped_stale": stale,
+        "dropped_orphans": orphans,
+        "ms": int((time.monotonic() - start) * 1000),
+    }
+
+
+def start_sweep(app) -> threading.Thread:
+    """Run sweep() once on a daemon thread (used at boot after a renderer change)."""
+    def run():
+        with app.app_context():
+            try:
+                log.info("re-rendered article bodies: %s", sweep())
+            except Exception:
+                db.session.rollback()
+                log.exception("article render sweep failed")
+
+    thread = threading.Thread(target=run, name="render-sweep", daemon=True)
+    thread.start()
+    return thread
@@ -1,13 +1,18 @@
 from __future__ import annotations
 
+from sqlalchemy import select, union_all
+
 from ..db import db
 from ..models import Article
+from . import brand_counts
+from .article_fields import row_columns
 from .brand_registry import get_brand
+from .pagination import estimate_count, keyset_page
 
 MAX_LIMIT = 100
 DEFAULT_LIMIT = 20
 
-# Seed articles inserted on first request if DB is empty
+# Demo articles, inserted by `flask --app run seed` (and at first boot) into an empty table
 _SEEDS = [
     {"brand": "empire-courier", "title": "Empire Courier Next-Gen Pipeline Is Live",
      "slug": "empire-courier-next-gen-pipeline",
@@ -35,29 +40,25 @@ _SEEDS = [
      "published_at": "2026-02-12", "tags": ["education", "cherry-creek", "bond"]},
 ]
 
-_seeded = False
-
 
-def _ensure_seeds():
-    global _seeded
-    if _seeded:
-        return
-    if Article.query.count() == 0:
-        for s in _SEEDS:
-            article = Article(
-                brand=s["brand"],
-                title=s["title"],
-                slug=s["slug"],
-                body=s.get("summary", ""),
-                status="published",
-            )
-            db.session.add(article)
-        db.session.commit()
-    _seeded = True
+def seed_articles() -> int:
+    """Insert the demo articles if the table is empty; returns rows inserted."""
+    if db.session.query(Article.id).first() is not None:
+        return 0
+    for s in _SEEDS:
+        article = Article(
+            brand=s["brand"],
+            title=s["title"],
+            slug=s["slug"],
+            body=s.get("summary", ""),
+            status="published",
+        )
+        db.session.add(article)
+    db.session.commit()
+    return len(_SEEDS)
 
 
 def get_articles(brand: str | None = None) -> list[dict]:
-    _ensure_seeds()
     q = Article.query.filter_by(status="published")
     if brand:
         q = q.filter_by(brand=brand)
@@ -65,52 +66,99 @@ def get_articles(brand: str | None = None) -> list[dict]:
 
 
 def get_brand_counts() -> dict[str, dict[str, int]]:
-    """Return {brand_slug: {published: N, draft: N, total: N}}."""
-    _ensure_seeds()
-    rows = (
-        db.session.query(Article.brand, Article.status, db.func.count(Article.id))
-        .group_by(Article.brand, Article.status)
-        .all()
-    )
-    counts: dict[str, dict[str, int]] = {}
-    for brand_slug, status, count in rows:
-        if brand_slug not in counts:
-            counts[brand_slug] = {"published": 0, "draft": 0, "scheduled": 0, "total": 0}
-        counts[brand_slug][status] = count
-        counts[brand_slug]["total"] += count
-    return counts
+    """Return {brand_slug: {published: N, draft: N, scheduled: N, total: N}}."""
+    return brand_counts.get_counts()
 
 
 def list_brands() -> list[dict]:
-    _ensure_seeds()
-    counts = get_brand_counts()
     # Legacy shape for backwards compat with feed brand buttons
-    results = (
-        db.session.query(Article.brand, db.func.count(Article.id))
-        .filter_by(status="published")
-        .group_by(Article.brand)
-        .all()
-    )
-    brand_info = get_brand
     return [
         {
             "key": brand_slug,
-            "label": (brand_info(brand_slug) or {}).get("name", brand_slug),
-            "count": count,
+            "label": (get_brand(brand_slug) or {}).get("name", brand_slug),
+            "count": counts["published"],
         }
-        for brand_slug, count in results
+        for brand_slug, counts in brand_counts.get_counts().items()
+        if counts["published"]
     ]
 
 
+def _published(brand: str | None = None):
+    q = Article.query.filter_by(status="published")
+    if brand:
+        q = q.filter_by(brand=brand)
+    return q
+
+
+def get_published(brand: str, slug: str, fields: tuple[str, ...] | None = None):
+    """One published article as a row_columns(fields) tuple, via ux_articles_brand_slug; None if absent."""
+    return _published(brand).filter_by(slug=slug).with_entities(*row_columns(fields)).first()
+
+
 def query_articles(
     brand: str | None = None,
     limit: int = DEFAULT_LIMIT,
     offset: int = 0,
-) -> tuple[list[dict], int]:
-    _ensure_seeds()
-    q = Article.query.filter_by(status="published")
-    if brand:
-        q = q.filter_by(brand=brand)
+    fields: tuple[str, ...] | None = None,
+) -> tuple[list, int]:
+    """Returns (rows, total); rows are row_columns(fields) tuples for encode_rows()/row_dict()."""
+    q = _published(brand)
     total = q.count()
-    articles = q.order_by(Article.created_at.desc()).offset(offset).limit(limit).all()
-    return [a.to_dict() for a in articles], total
+    rows = (
+        q.with_entities(*row_columns(fields))
+        .order_by(Article.created_at.desc(), Article.id.desc())
+        .offset(offset).limit(limit).all()
+    )
+    return rows, total
+
+
+def query_articles_after(
+    brand: str | None = None,
+    limit: int = DEFAULT_LIMIT,
+    cursor: str | None = None,
+    fields: tuple[str, ...] | None = None,
+) -> tuple[list, str | None]:
+    """Keyset variant of query_articles(): returns (rows, next_cursor)."""
+    q = _published(brand).with_entities(*row_columns(fields))
+    return keyset_page(q, Article, limit, cursor)
+
+
+def latest_by_brand(slugs: list[str], limit: int = DEFAULT_LIMIT,
+                    fields: tuple[str, ...] | None = None) -> dict[str, list]:
+    """Newest `limit` published rows of each brand, as {slug: rows}, in one statement.
+
+    The statement is a UNION ALL of one LIMIT-ed seek per brand on
+    ix_articles_status_brand_created, so it reads brands x limit index
+    entries however large the archive is.
+    """
+    result: dict[str, list] = {slug: [] for slug in slugs}
+    if not slugs or limit <= 0:
+        return result
+    parts = [
+        select(
+            select(*row_columns(fields), Article.brand.label("partition_brand"))
+            .where(Article.status == "published", Article.brand == slug)
+            .order_by(Article.created_at.desc(), Article.id.desc())
+            .limit(limit)
+            .subquery()
+        )
+        for slug in slugs
+    ]
+    stmt = parts[0] if len(parts) == 1 else union_all(*parts)
+    for row in db.session.execute(stmt):
+        result[row[-1]].append(row)
+    return result
+
+
+def count_articles(brand: str | None = None, estimate: bool = False) -> int:
+    q = _published(brand)
+    if estimate:
+        return estimate_count(q, ("feed", brand))
+    return q.count()
+
+
+def count_older(brand: str, created_at, article_id: str) -> int:
+    """Published articles of `brand` sorting before (created_at, id): its oldest-first rank."""
+    return _published(brand).filter(
+        db.tuple_(Article.created_at, Article.id) < (created_at, article_id)
+    ).count()
@@ -0,0 +1,332 @@
+"""Mirror the local `invoices` table to the billing spreadsheet.
+
+In BILLING_SHEETS_MODE=mirror the invoices table is the system of record:
+every billing read and write runs against SQLite, and each write also
+upserts the invoice's row in `billing_replication_log` inside the same
+transaction. push() claims queued invoices (an UPDATE ... RETURNING lease,
+so several workers never push the same invoice at once), diffs each one
+against the sheet snapshot and sends only the changed cells, new rows
+going out as appends, in a single flush. A change made while an invoice is
+being pushed bumps its version, which keeps the entry queued for the next
+round.
+
+import_sheet() copies rows that exist only in the sheet into the table (the
+one-off bulk import when switching modes). reconcile() compares the two
+sides; with fix=True it queues every invoice whose sheet row is missing or
+has drifted (the database wins) and imports sheet-only rows.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from ..db import db
+from ..models import BillingReplication, Invoice
+from . import billing_store
+
+log = logging.getLogger(__name__)
+
+PUSH_BATCH = 200
+LEASE_SECONDS = 300  # a claim older than this is assumed dead and can be taken over
+IMPORT_CHUNK = 500
+SAMPLE = 20  # ids listed per category in reconcile reports
+
+_lock = threading.Lock()
+_stats = {
+    "pushes": 0,
+    "invoices_pushed": 0,
+    "cells_written": 0,
+    "rows_appended": 0,
+    "failures": 0,
+    "last_push_at": None,
+    "last_push_ms": 0,
+    "last_error": None,
+}
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _cell(value) -> str:
+    return "" if value is None else str(value)
+
+
+def _sheet_row(invoice: dict) -> dict:
+    """An invoice as sheet cells, in billing_store.COLUMNS order."""
+    return {c: _cell(invoice.get(c)) for c in billing_store.COLUMNS}
+
+
+_TIMESTAMPS = ("created_at", "updated_at")
+
+
+def _changed(record: dict, row: dict) -> dict:
+    """Cells of `row` that differ from the sheet `record`.
+
+    Timestamps compare as instants: SQLite hands them back without an
+    offset, while rows written in primary mode carry +00:00.
+    """
+    changes = {}
+    for column, value in row.items():
+        current = _cell(record.get(column))
+        if current == value:
+            continue
+        if column in _TIMESTAMPS and _instant(current) is not None and _instant(current) == _instant(value):
+            continue
+        changes[column] = value
+    return changes
+
+
+def _instant(value: str) -> datetime | None:
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def enqueue(invoice_id: str) -> None:
+    """Queue `invoice_id` for the next push; joins the caller's transaction."""
+    stmt = sqlite_insert(BillingReplication).values(invoice_id=invoice_id, version=1, queued_at=_now(), attempts=0)
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=[BillingReplication.invoice_id],
+        set_={"version": BillingReplication.version + 1},
+    ))
+
+
+def _claim(limit: int) -> list:
+    now = _now()
+    queued = (
+        select(BillingReplication.invoice_id)
+        .where((BillingReplication.claimed_at.is_(None))
+               | (BillingReplication.claimed_at < now - timedelta(seconds=LEASE_SECONDS)))
+        .order_by(BillingReplication.queued_at)
+        .limit(limit)
+    )
+    rows = db.session.execute(
+        update(BillingReplication)
+        .where(BillingReplication.invoice_id.in_(queued.scalar_subquery()))
+        .values(claimed_at=now)
+        .returning(BillingReplication.invoice_id, BillingReplication.version)
+    ).all()
+    db.session.commit()
+    return rows
+
+
+def push(limit: int = PUSH_BATCH) -> dict:
+    """Send up to `limit` queued invoices to the sheet in one flush."""
+    start = time.monotonic()
+    claimed = _claim(limit)
+    report = {"claimed": len(claimed), "cells": 0, "rows": 0, "ms": 0}
+    if not claimed:
+        return report
+
+    sheet = billing_store._sheet
+    versions = dict(claimed)
+    try:
+        sheet.refresh()  # another worker may have appended some of these since our snapshot
+        with sheet.hold():  # a full batch must not flush early, or this flush would report nothing
+            for invoice in Invoice.query.filter(Invoice.id.in_(list(versions))):
+                row = _sheet_row(invoice.to_dict())
+                found = sheet.find(invoice.id)
+                if found is None:
+                    sheet.stage_append(row)
+                    continue
+                changes = _changed(found[1], row)
+                if changes:
+                    sheet.stage_update(invoice.id, changes)
+        flushed = sheet.flush()
+    except Exception as exc:
+        db.session.rollback()
+        db.session.execute(
+            update(BillingReplication)
+            .where(BillingReplication.invoice_id.in_(list(versions)))
+            .values(claimed_at=None, attempts=BillingReplication.attempts + 1, last_error=str(exc)[:500])
+        )
+        db.session.commit()
+        with _lock:
+            _stats["failures"] += 1
+            _stats["last_error"] = str(exc)[:500]
+        raise
+
+    # Done unless changed again meanwhile; those keep their entry and lose the claim
+    for invoice_id, version in versions.items():
+        db.session.execute(delete(BillingReplication).where(
+            BillingReplication.invoice_id == invoice_id, BillingReplication.version == version
+        ))
+    db.session.execute(
+        update(BillingReplication)
+        .where(BillingReplication.invoice_id.in_(list(versions)))
+        .values(claimed_at=None)
+    )
+    db.session.commit()
+
+    report.update(cells=flushed.get("cells", 0), rows=flushed.get("rows", 0),
+                  ms=int((time.monotonic() - start) * 1000))
+    with _lock:
+        _stats["pushes"] += 1
+        _stats["invoices_pushed"] += len(versions)
+        _stats["cells_written"] += report["cells"]
+        _stats["rows_appended"] += report["rows"]
+        _stats["last_push_at"] = _now().isoformat()
+        _stats["last_push_ms"] = report["ms"]
+    return report
+
+
+def drain(limit: int = PUSH_BATCH) -> list[dict]:
+    """push() until the queue is empty (or nothing more can be claimed)."""
+    reports = []
+    while True:
+        report = push(limit)
+        if not report["claimed"]:
+            return reports
+        reports.append(report)
+
+
+# ── Import and reconciliation ─────────────────────────────────────────────────
+
+def _number(value, cast, default):
+    try:
+        return cast(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _datetime(value) -> datetime:
+    return _instant(_cell(value)) or _now()
+
+
+def _from_sheet(record: dict) -> dict:
+    """Invoice column values for a sheet record."""
+    return {
+        "id": str(record["id"]),
+        "date": _cell(record.get("date")) or datetime.now(timezone.utc).date().isoformat(),
+        "client": _cell(record.get("client")),
+        "email": _cell(record.get("email")),
+        "type": _cell(record.get("type")) or "Classified Ad",
+        "description": _cell(record.get("description")),
+        "amount": _number(record.get("amount"), float, 0.0),
+        "status": _cell(record.get("status")) or "draft",
+        "publication": _cell(record.get("publication")) or "Register-Call",
+        "run_dates": _cell(record.get("runDates")) or "[]",
+        "line_count": _number(record.get("lineCount"), int, 1),
+        "runs": _number(record.get("runs"), int, 1),
+        "first_line_rate": _number(record.get("firstLineRate"), float, 0.43),
+        "additional_line_rate": _number(record.get("additionalLineRate"), float, 0.38),
+        "origination_fee": _number(record.get("originationFee"), float, 25.0),
+        "is_arapahoe_county": _cell(record.get("isArapahoeCounty")).lower() == "true",
+        "pdf_url": _cell(record.get("pdfUrl")) or None,
+        "stripe_link": _cell(record.get("stripeLink")) or None,
+        "email_sent": _cell(record.get("emailSent")) or None,
+        "paid_date": _cell(record.get("paidDate")) or None,
+        "notes": _cell(record.get("notes")) or None,
+        "created_at": _datetime(record.get("created_at")),
+        "updated_at": _datetime(record.get("updated_at")),
+    }
+
+
+def _insert(records: list[dict]) -> int:
+    rows = [_from_sheet(r) for r in records]
+    for i in range(0, len(rows), IMPORT_CHUNK):
+        db.session.execute(sqlite_insert(Invoice).on_conflict_do_nothing(), rows[i:i + IMPORT_CHUNK])
+    db.session.commit()
+    return len(rows)
+
+
+def import_sheet() -> dict:
+    """Insert every sheet row whose id the invoices table lacks; existing rows are left alone."""
+    start = time.monotonic()
+    records = billing_store._sheet.records()
+    with_id = [r for r in records if _cell(r.get("id"))]
+    local = set(db.session.execute(select(Invoice.id)).scalars())
+    missing = [r for r in with_id if str(r["id"]) not in local]
+    return {
+        "sheet_rows": len(records),
+        "imported": _insert(missing),
+        "skipped_without_id": len(records) - len(with_id),
+        "ms": int((time.monotonic() - start) * 1000),
+    }
+
+
+def reconcile(fix: bool = False) -> dict:
+    """Diff the invoices table against the sheet; fix=True queues repairs and imports sheet-only rows."""
+    start = time.monotonic()
+    sheet = billing_store._sheet
+    sheet.refresh()
+    remote = {str(r["id"]): r for r in sheet.records() if _cell(r.get("id"))}
+    queued = set(db.session.execute(select(BillingReplication.invoice_id)).scalars())
+
+    missing_in_sheet, drifted, seen = [], [], set()
+    for invoice in Invoice.query.yield_per(IMPORT_CHUNK):
+        seen.add(invoice.id)
+        record = remote.get(invoice.id)
+        if record is None:
+            missing_in_sheet.append(invoice.id)
+        elif _changed(record, _sheet_row(invoice.to_dict())):
+            drifted.append(invoice.id)
+    missing_in_db = [i for i in remote if i not in seen]
+
+    report = {
+        "invoices": len(seen),
+        "sheet_rows": len(remote),
+        "missing_in_sheet": len(missing_in_sheet),
+        "drifted": len(drifted),
+        "missing_in_db": len(missing_in_db),
+        "already_queued": len(queued & set(missing_in_sheet + drifted)),
+        "sample": {
+            "missing_in_sheet": missing_in_sheet[:SAMPLE],
+            "drifted": drifted[:SAMPLE],
+            "missing_in_db": missing_in_db[:SAMPLE],
+        },
+        "fixed": fix,
+    }
+    if fix:
+        for invoice_id in missing_in_sheet + drifted:
+            enqueue(invoice_id)
+        db.session.commit()
+        _insert([remote[i] for i in missing_in_db])
+    report["ms"] = int((time.monotonic() - start) * 1000)
+    return report
+
+
+# ── Status and worker ─────────────────────────────────────────────────────────
+
+def stats() -> dict:
+    queue = db.session.execute(select(
+        db.func.count(BillingReplication.invoice_id),
+        db.func.min(BillingReplication.queued_at),
+        db.func.max(BillingReplication.attempts),
+    )).one()
+    oldest = queue[1]
+    if oldest is not None and oldest.tzinfo is None:
+        oldest = oldest.replace(tzinfo=timezone.utc)
+    with _lock:
+        return {
+            **_stats,
+            "mode": billing_store.MODE,
+            "queued": queue[0],
+            "lag_seconds": round((_now() - oldest).total_seconds(), 1) if oldest else 0,
+            "max_attempts": queue[2] or 0,
+        }
+
+
+def start(app, interval: float) -> threading.Thread:
+    """Run drain() every `interval` seconds on a daemon thread."""
+    def loop():
+        while True:
+            time.sleep(interval)
+            with app.app_context():
+                try:
+                    drain()
+                except Exception:
+                    db.session.rollback()
+                    log.exception("billing replication push failed")
+
+    thread = threading.Thread(target=loop, name="billing-replication", daemon=True)
+    thread.start()
+    return thread
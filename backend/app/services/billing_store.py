@@ -2,16 +2,23 @@ from __future__ import annotations
 
 import json
 import os
+import uuid
 from datetime import date as _date, datetime, timezone
+from typing import Iterator
+
+from sqlalchemy import insert, tuple_
 
 from app.db import db
 from app.models import Invoice
+from app.services import invoice_search, pricing, row_json, sheets_client
+from app.services.export import YIELD_PER
+from app.services.pagination import decode_token, encode_token, estimate_count
 
 # ── Google Sheets (optional) ─────────────────────────────────────────────────
 _SHEETS_OK = False
 try:
     import gspread
-    from google.oauth2.service_account import Credentials as _GCreds
+    from google.oauth2 import service_account  # noqa: F401  (used by sheets_client)
     _SHEETS_OK = True
 except ImportError:
     pass
@@ -23,8 +30,11 @@ _SCOPES = [
 _SHEET_TAB  = os.environ.get("BILLING_SHEET_TAB", "Invoices")
 _SHEET_ID   = os.environ.get("BILLING_SPREADSHEET_ID", "")
 _CREDS_PATH = os.environ.get("GOOGLE_CREDENTIALS_PATH", "")
+# primary: the sheet is the invoice store. mirror: the invoices table is, and
+# services.billing_replication copies every change to the sheet in the background.
+MODE = os.environ.get("BILLING_SHEETS_MODE", "primary")
 
-_COLUMNS = [
+COLUMNS = [
     "id", "date", "client", "email", "type", "description", "amount",
     "status", "publication", "runDates", "lineCount", "runs",
     "firstLineRate", "additionalLineRate", "originationFee",
@@ -33,147 +43,334 @@ _COLUMNS = [
 ]
 
 
-def _use_sheets() -> bool:
+# Invoice.to_dict() as (key, column, encoder) for the column-tuple list path
+_ROW_FIELDS = [
+    ("id",                 Invoice.id,                   row_json.string),
+    ("date",               Invoice.date,                 row_json.string),
+    ("client",             Invoice.client,               row_json.string),
+    ("email",              Invoice.email,                row_json.string),
+    ("type",               Invoice.type,                 row_json.string),
+    ("description",        Invoice.description,          row_json.string),
+    ("amount",             Invoice.amount,               lambda v: row_json.number(round(v, 2))),
+    ("status",             Invoice.status,               row_json.string),
+    ("publication",        Invoice.publication,          row_json.string),
+    ("runDates",           Invoice.run_dates,            row_json.string),
+    ("lineCount",          Invoice.line_count,           row_json.number),
+    ("runs",               Invoice.runs,                 row_json.number),
+    ("firstLineRate",      Invoice.first_line_rate,      row_json.number),
+    ("additionalLineRate", Invoice.additional_line_rate, row_json.number),
+    ("originationFee",     Invoice.origination_fee,      row_json.number),
+    ("isArapahoeCounty",   Invoice.is_arapahoe_county,   row_json.boolean),
+    ("pdfUrl",             Invoice.pdf_url,              row_json.string_or_empty),
+    ("stripeLink",         Invoice.stripe_link,          row_json.string_or_empty),
+    ("emailSent",          Invoice.email_sent,           row_json.string_or_empty),
+    ("paidDate",           Invoice.paid_date,            row_json.string_or_empty),
+    ("notes",              Invoice.notes,                row_json.string_or_empty),
+    ("created_at",         Invoice.created_at,           row_json.iso),
+    ("updated_at",         Invoice.updated_at,           row_json.iso),
+]
+_ROW_COLUMNS = [column for _, column, _ in _ROW_FIELDS]
+_ROW_ENCODER = row_json.RowEncoder([(key, enc) for key, _, enc in _ROW_FIELDS])
+
+
+def _sheets_configured() -> bool:
     return bool(_SHEETS_OK and _SHEET_ID and _CREDS_PATH
                 and os.path.exists(_CREDS_PATH))
 
 
-def _get_ws():
-    creds = _GCreds.from_service_account_file(_CREDS_PATH, scopes=_SCOPES)
-    gc = gspread.authorize(creds)
-    sh = gc.open_by_key(_SHEET_ID)
+def _use_sheets() -> bool:
+    return MODE == "primary" and _sheets_configured()
+
+
+def mirroring() -> bool:
+    return MODE == "mirror" and _sheets_configured()
+
+
+def _open_ws():
+    sh = sheets_client.client(_CREDS_PATH, _SCOPES).open_by_key(_SHEET_ID)
     try:
-        return sh.worksheet(_SHEET_TAB)
+        return sh, sh.worksheet(_SHEET_TAB)
     except gspread.WorksheetNotFound:
-        ws = sh.add_worksheet(_SHEET_TAB, rows=1000, cols=len(_COLUMNS))
-        ws.append_row(_COLUMNS)
-        return ws
+        ws = sh.add_worksheet(_SHEET_TAB, rows=1000, cols=len(COLUMNS))
+        ws.append_row(COLUMNS)
+        return sh, ws
+
+
+# Process-wide snapshot of the invoice tab with an id -> row index; writes are staged and batched.
+# As a mirror, cells are written verbatim and only the replication worker flushes.
+_sheet = sheets_client.SheetCache(_open_ws, key="id", raw=MODE == "mirror", auto_flush=MODE != "mirror")
 
 
-def _dict_to_row(d: dict) -> list:
-    return [str(d.get(c, "")) for c in _COLUMNS]
+def sheets_stats() -> dict | None:
+    return _sheet.stats() if _sheets_configured() else None
+
+
+def _replicate(invoice_id: str) -> None:
+    if mirroring():
+        from app.services import billing_replication  # imports this module
+        billing_replication.enqueue(invoice_id)
 
 
 def _row_to_dict(row: dict) -> dict:
-    return {k: row.get(k, "") for k in _COLUMNS}
+    return {k: row.get(k, "") for k in COLUMNS}
 
 
 # ── Public interface ──────────────────────────────────────────────────────────
 
-def list_invoices(status: str | None = None, q: str | None = None) -> list[dict]:
-    if _use_sheets():
-        ws = _get_ws()
-        rows = ws.get_all_records()
-        results = [_row_to_dict(r) for r in rows]
-    else:
-        query = Invoice.query.order_by(Invoice.created_at.desc())
-        if status:
-            query = query.filter_by(status=status)
-        rows = query.all()
-        results = [r.to_dict() for r in rows]
-        if q:
-            ql = q.lower()
-            results = [r for r in results if
-                       ql in r["client"].lower() or
-                       ql in r["email"].lower() or
-                       ql in r["description"].lower()]
-        return results
+# /billing/invoices sort keys; a leading "-" sorts descending. Ties break on id.
+SORTS = {
+    "created_at": Invoice.created_at,
+    "date":       Invoice.date,
+    "amount":     Invoice.amount,
+    "client":     Invoice.client,
+}
+DEFAULT_SORT = "-created_at"
+
+
+def parse_sort(sort: str | None) -> tuple[str, bool]:
+    """(key, descending) for a sort parameter; raises ValueError for unknown keys."""
+    sort = sort or DEFAULT_SORT
+    key = sort.lstrip("-")
+    if key not in SORTS:
+        raise ValueError(f"Invalid sort. Must be one of: {', '.join(sorted(SORTS))} (prefix - for descending)")
+    return key, sort.startswith("-")
 
+
+def _invoice_query(status: str | None = None, q: str | None = None, date_from: str | None = None,
+                   date_to: str | None = None, sort: str | None = None):
+    key, descending = parse_sort(sort)
+    column = SORTS[key]
+    query = Invoice.query
+    if status:
+        query = query.filter_by(status=status)
+    if date_from:
+        query = query.filter(Invoice.date >= date_from)
+    if date_to:
+        query = query.filter(Invoice.date <= date_to)
+    if q:
+        query = query.filter(invoice_search.matching(q))
+    if descending:
+        return query.order_by(column.desc(), Invoice.id.desc())
+    return query.order_by(column.asc(), Invoice.id.asc())
+
+
+def _sheet_invoices(status: str | None = None, q: str | None = None, date_from: str | None = None,
+                    date_to: str | None = None, sort: str | None = None) -> list[dict]:
+    key, descending = parse_sort(sort)
+    results = [_row_to_dict(r) for r in _sheet.records()]
     if status:
         results = [r for r in results if r.get("status") == status]
+    if date_from:
+        results = [r for r in results if str(r.get("date", "")) >= date_from]
+    if date_to:
+        results = [r for r in results if str(r.get("date", "")) <= date_to]
     if q:
         ql = q.lower()
-        results = [r for r in results if
-                   ql in str(r.get("client", "")).lower() or
-                   ql in str(r.get("email", "")).lower() or
-                   ql in str(r.get("description", "")).lower()]
+        results = [r for r in results if any(
+            ql in str(r.get(c, "")).lower() for c in ("client", "email", "description", "notes")
+        )]
+    results.sort(key=lambda r: (_sheet_sort_value(key, r.get(key)), str(r.get("id", ""))), reverse=descending)
     return results
 
 
+def _sheet_sort_value(key: str, value):
+    if key == "amount":
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            return 0.0
+    return str(value if value is not None else "")
+
+
+def list_invoices(status: str | None = None, q: str | None = None, date_from: str | None = None,
+                  date_to: str | None = None, sort: str | None = None) -> list[dict]:
+    if _use_sheets():
+        return _sheet_invoices(status, q, date_from, date_to, sort)
+    return [r.to_dict() for r in _invoice_query(status, q, date_from, date_to, sort)]
+
+
+def list_invoices_json(status: str | None = None, q: str | None = None, date_from: str | None = None,
+                       date_to: str | None = None, sort: str | None = None) -> list:
+    """list_invoices() for the API; database rows come back as row_json.Encoded text."""
+    if _use_sheets():
+        return _sheet_invoices(status, q, date_from, date_to, sort)
+    query = _invoice_query(status, q, date_from, date_to, sort)
+    return _ROW_ENCODER.encode_all(query.with_entities(*_ROW_COLUMNS))
+
+
+def _encode_invoice_cursor(sort: str, value, inv_id: str) -> str:
+    return encode_token([sort, value.isoformat() if isinstance(value, datetime) else value, inv_id])
+
+
+def _decode_invoice_cursor(token: str, sort: str) -> tuple:
+    try:
+        token_sort, value, inv_id = decode_token(token)
+        if token_sort != sort:
+            raise ValueError("cursor belongs to a different sort")
+        if sort.lstrip("-") == "created_at":
+            value = datetime.fromisoformat(value)
+        return value, str(inv_id)
+    except (TypeError, ValueError) as exc:
+        raise ValueError("invalid cursor") from exc
+
+
+def page_invoices(status: str | None = None, q: str | None = None, date_from: str | None = None,
+                  date_to: str | None = None, sort: str | None = None, limit: int = 50,
+                  cursor: str | None = None) -> tuple[list, str | None]:
+    """One page of matching invoices as (items, next_cursor).
+
+    Database pages seek on (sort column, id), so every page costs the same
+    however deep it is. Raises ValueError for a bad sort or cursor.
+    """
+    sort = sort or DEFAULT_SORT
+    key, descending = parse_sort(sort)
+    after = _decode_invoice_cursor(cursor, sort) if cursor else None
+
+    if _use_sheets():
+        rows = _sheet_invoices(status, q, date_from, date_to, sort)
+        if after:
+            raw = after[0].isoformat() if isinstance(after[0], datetime) else after[0]
+            value, inv_id = _sheet_sort_value(key, raw), after[1]
+            if descending:
+                rows = [r for r in rows if (_sheet_sort_value(key, r.get(key)), str(r.get("id", ""))) < (value, inv_id)]
+            else:
+                rows = [r for r in rows if (_sheet_sort_value(key, r.get(key)), str(r.get("id", ""))) > (value, inv_id)]
+        page = rows[:limit]
+        more = len(rows) > limit
+        last = (page[-1].get(key), page[-1].get("id")) if page else None
+    else:
+        query = _invoice_query(status, q, date_from, date_to, sort)
+        if after:
+            seek = tuple_(SORTS[key], Invoice.id)
+            query = query.filter(seek < after if descending else seek > after)
+        rows = query.with_entities(*_ROW_COLUMNS).limit(limit + 1).all()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        last = (getattr(rows[-1], SORTS[key].key), rows[-1].id) if rows else None
+        page = _ROW_ENCODER.encode_all(rows)
+
+    next_cursor = _encode_invoice_cursor(sort, *last) if more and last else None
+    return page, next_cursor
+
+
+def count_invoices(status: str | None = None, q: str | None = None, date_from: str | None = None,
+                   date_to: str | None = None, estimate: bool = False) -> int:
+    if _use_sheets():
+        return len(_sheet_invoices(status, q, date_from, date_to))
+    query = _invoice_query(status, q, date_from, date_to)
+    if estimate:
+        return estimate_count(query, ("invoices", status, q, date_from, date_to))
+    return query.order_by(None).count()
+
+
+def iter_invoices(status: str | None = None, q: str | None = None, date_from: str | None = None,
+                  date_to: str | None = None, sort: str | None = None) -> Iterator[dict]:
+    """Same filters as list_invoices(), streamed through a server-side cursor."""
+    if _use_sheets():
+        # The Sheets API only returns whole worksheets
+        yield from _sheet_invoices(status, q, date_from, date_to, sort)
+        return
+    for row in _invoice_query(status, q, date_from, date_to, sort).yield_per(YIELD_PER):
+        yield row.to_dict()
+
+
 def get_invoice(inv_id: str) -> dict | None:
     if _use_sheets():
-        ws = _get_ws()
-        for row in ws.get_all_records():
-            if row.get("id") == inv_id:
-                return _row_to_dict(row)
-        return None
+        found = _sheet.find(inv_id)
+        return _row_to_dict(found[1]) if found else None
     row = Invoice.query.get(inv_id)
     return row.to_dict() if row else None
 
 
-def create_invoice(data: dict) -> dict:
-    run_dates = data.get("runDates", [])
-    if isinstance(run_dates, str):
+def _run_dates(raw) -> list:
+    if isinstance(raw, str):
         try:
-            run_dates = json.loads(run_dates)
+            return json.loads(raw)
         except Exception:
-            run_dates = []
+            return []
+    return raw or []
+
+
+def new_record(data: dict, now: datetime | None = None) -> dict:
+    """A new draft invoice as a sheet record (COLUMNS keys), priced by services.pricing.
 
+    Rates left out come from the publication's rate card. Raises ValueError
+    when a count or rate is not a number.
+    """
+    arapahoe = bool(data.get("isArapahoeCounty", False))
+    try:
+        card = pricing.rate_card(data.get("publication"), arapahoe)
+    except KeyError:  # a publication without a card of its own
+        card = pricing.rate_card(None, arapahoe)
+    run_dates = _run_dates(data.get("runDates", []))
     runs = len(run_dates) or int(data.get("runs", 1))
     line_count = int(data.get("lineCount", 1))
-    first_rate = float(data.get("firstLineRate", 0.43))
-    add_rate   = float(data.get("additionalLineRate", 0.38))
-    orig_fee   = float(data.get("originationFee", 25.0))
-    amount = round(orig_fee + runs * first_rate + runs * max(0, line_count - 1) * add_rate, 2)
+    first_rate = float(data.get("firstLineRate", card["firstLineRate"]))
+    add_rate   = float(data.get("additionalLineRate", card["additionalLineRate"]))
+    orig_fee   = float(data.get("originationFee", card["originationFee"]))
+    stamp = (now or datetime.now(timezone.utc)).isoformat()
+    return {
+        "id": str(uuid.uuid4()),
+        "date": data.get("date", _date.today().isoformat()),
+        "client": data.get("client", ""),
+        "email": data.get("email", ""),
+        "type": data.get("type", "Classified Ad"),
+        "description": data.get("description", ""),
+        "amount": pricing.amount(runs, line_count, first_rate, add_rate, orig_fee),
+        "status": "draft",
+        "publication": data.get("publication", "Register-Call"),
+        "runDates": json.dumps(run_dates),
+        "lineCount": line_count,
+        "runs": runs,
+        "firstLineRate": first_rate,
+        "additionalLineRate": add_rate,
+        "originationFee": orig_fee,
+        "isArapahoeCounty": str(arapahoe),
+        "pdfUrl": "",
+        "stripeLink": "",
+        "emailSent": "",
+        "paidDate": "",
+        "notes": data.get("notes", ""),
+        "created_at": stamp,
+        "updated_at": stamp,
+    }
+
+
+def _invoice_values(record: dict) -> dict:
+    """Invoice column values for a new_record() record."""
+    values = {_COL_MAP.get(k, k): v for k, v in record.items() if k not in ("pdfUrl", "stripeLink", "emailSent", "paidDate")}
+    values["is_arapahoe_county"] = record["isArapahoeCounty"] == "True"
+    values["created_at"] = values["updated_at"] = datetime.fromisoformat(record["created_at"])
+    return values
 
-    now = datetime.now(timezone.utc).isoformat()
-    today = _date.today().isoformat()
+
+def create_invoice(data: dict) -> dict:
+    record = new_record(data)
 
     if _use_sheets():
-        import uuid
-        inv_id = str(uuid.uuid4())
-        row_data = {
-            "id": inv_id,
-            "date": data.get("date", today),
-            "client": data.get("client", ""),
-            "email": data.get("email", ""),
-            "type": data.get("type", "Classified Ad"),
-            "description": data.get("description", ""),
-            "amount": amount,
-            "status": "draft",
-            "publication": data.get("publication", "Register-Call"),
-            "runDates": json.dumps(run_dates),
-            "lineCount": line_count,
-            "runs": runs,
-            "firstLineRate": first_rate,
-            "additionalLineRate": add_rate,
-            "originationFee": orig_fee,
-            "isArapahoeCounty": str(data.get("isArapahoeCounty", False)),
-            "pdfUrl": "",
-            "stripeLink": "",
-            "emailSent": "",
-            "paidDate": "",
-            "notes": data.get("notes", ""),
-            "created_at": now,
-            "updated_at": now,
-        }
-        ws = _get_ws()
-        ws.append_row(_dict_to_row(row_data))
-        return row_data
-
-    row = Invoice(
-        date=data.get("date", today),
-        client=data.get("client", ""),
-        email=data.get("email", ""),
-        type=data.get("type", "Classified Ad"),
-        description=data.get("description", ""),
-        amount=amount,
-        status="draft",
-        publication=data.get("publication", "Register-Call"),
-        run_dates=json.dumps(run_dates),
-        line_count=line_count,
-        runs=runs,
-        first_line_rate=first_rate,
-        additional_line_rate=add_rate,
-        origination_fee=orig_fee,
-        is_arapahoe_county=bool(data.get("isArapahoeCounty", False)),
-        notes=data.get("notes", ""),
-    )
+        _sheet.stage_append(record)
+        return record
+
+    row = Invoice(**_invoice_values(record))
     db.session.add(row)
+    db.session.flush()
+    _replicate(row.id)
     db.session.commit()
     return row.to_dict()
 
 
+def create_invoices(records: list[dict]) -> None:
+    """Store new_record() records in one transaction, or one append_rows on the Sheets path."""
+    if _use_sheets():
+        _sheet.stage_appends(records)
+        _sheet.flush()
+        return
+    db.session.execute(insert(Invoice), [_invoice_values(r) for r in records])
+    for record in records:
+        _replicate(record["id"])
+    db.session.commit()
+
+
 _PATCHABLE = {
     "date", "client", "email", "type", "description", "amount", "status",
     "publication", "runDates", "lineCount", "runs", "firstLineRate",
@@ -194,19 +391,17 @@ def update_invoice(inv_id: str, data: dict) -> dict | None:
     now = datetime.now(timezone.utc).isoformat()
 
     if _use_sheets():
-        ws = _get_ws()
-        headers = ws.row_values(1)
-        for i, row in enumerate(ws.get_all_records(), start=2):
-            if row.get("id") == inv_id:
-                for key, val in data.items():
-                    if key in _PATCHABLE and key in headers:
-                        ws.update_cell(i, headers.index(key) + 1, val)
-                if "updated_at" in headers:
-                    ws.update_cell(i, headers.index("updated_at") + 1, now)
-                row.update(data)
-                row["updated_at"] = now
-                return row
-        return None
+        found = _sheet.find(inv_id)
+        if found is None:
+            return None
+        _, row = found
+        # Staged and merged per row; the next flush sends it with everything else in one batch_update
+        changes = {key: val for key, val in data.items() if key in _PATCHABLE}
+        changes["updated_at"] = now
+        _sheet.stage_update(inv_id, changes)
+        row.update(data)
+        row["updated_at"] = now
+        return row
 
     row = Invoice.query.get(inv_id)
     if row is None:
@@ -218,5 +413,6 @@ def update_invoice(inv_id: str, data: dict) -> dict | None:
         if attr == "is_arapahoe_county":
             val = bool(val)
         setattr(row, attr, val)
+    _replicate(inv_id)
     db.session.commit()
     return row.to_dict()
@@ -0,0 +1,125 @@
+"""Per-brand article counts kept in step with `articles` by SQLite triggers.
+
+`brand_article_counts` holds one row per (brand, status). Triggers on insert,
+delete and brand/status changes adjust it inside the writing transaction, so
+admin writes, bulk ingest and the scheduler's UPDATE ... RETURNING all stay
+counted without any of them knowing about it. Reads are O(brands) however
+large the archive grows.
+
+`flask --app run brand-counts` compares the table with a live GROUP BY;
+`--rebuild` recomputes it.
+"""
+from __future__ import annotations
+
+import time
+
+from sqlalchemy import event
+
+from ..db import db
+from ..models import Article
+
+STATUSES = ("published", "draft", "scheduled")
+
+_DDL = [
+    """CREATE TABLE IF NOT EXISTS brand_article_counts (
+        brand  VARCHAR(100) NOT NULL,
+        status VARCHAR(20)  NOT NULL,
+        n      INTEGER      NOT NULL DEFAULT 0,
+        PRIMARY KEY (brand, status)
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS brand_counts_ai AFTER INSERT ON articles BEGIN
+        INSERT INTO brand_article_counts(brand, status, n) VALUES (new.brand, new.status, 1)
+        ON CONFLICT(brand, status) DO UPDATE SET n = n + 1;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS brand_counts_ad AFTER DELETE ON articles BEGIN
+        UPDATE brand_article_counts SET n = n - 1
+        WHERE brand = old.brand AND status = old.status;
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS brand_counts_au AFTER UPDATE OF brand, status ON articles
+    WHEN old.brand IS NOT new.brand OR old.status IS NOT new.status BEGIN
+        UPDATE brand_article_counts SET n = n - 1
+        WHERE brand = old.brand AND status = old.status;
+        INSERT INTO brand_article_counts(brand, status, n) VALUES (new.brand, new.status, 1)
+        ON CONFLICT(brand, status) DO UPDATE SET n = n + 1;
+    END""",
+]
+
+_BACKFILL = """
+INSERT INTO brand_article_counts(brand, status, n)
+SELECT brand, status, count(*) FROM articles GROUP BY brand, status
+"""
+
+_LIVE = "SELECT brand, status, count(*) FROM articles GROUP BY brand, status"
+
+
+def _create(connection) -> None:
+    for statement in _DDL:
+        connection.exec_driver_sql(statement)
+
+
+@event.listens_for(Article.__table__, "after_create")
+def _after_create(target, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        _create(connection)
+
+
+@event.listens_for(Article.__table__, "before_drop")
+def _before_drop(target, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        connection.exec_driver_sql("DROP TABLE IF EXISTS brand_article_counts")
+
+
+def install(connection) -> bool:
+    """Add the table and triggers to a database that predates them; True if backfilled."""
+    if connection.dialect.name != "sqlite":
+        return False
+    exists = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'brand_article_counts'"
+    ).first()
+    if exists:
+        return False
+    _create(connection)
+    connection.exec_driver_sql(_BACKFILL)
+    return True
+
+
+def rebuild() -> dict:
+    """Recompute every counter from `articles` in one transaction."""
+    start = time.monotonic()
+    with db.engine.begin() as conn:
+        _create(conn)
+        conn.exec_driver_sql("DELETE FROM brand_article_counts")
+        conn.exec_driver_sql(_BACKFILL)
+        rows = conn.exec_driver_sql("SELECT count(*) FROM brand_article_counts").scalar()
+    return {"rows": rows, "ms": int((time.monotonic() - start) * 1000)}
+
+
+def verify() -> dict:
+    """Diff the stored counters against a live GROUP BY over `articles`."""
+    start = time.monotonic()
+    with db.engine.connect() as conn:
+        stored = {
+            (brand, status): n
+            for brand, status, n in conn.exec_driver_sql("SELECT brand, status, n FROM brand_article_counts")
+            if n
+        }
+        live = {(brand, status): n for brand, status, n in conn.exec_driver_sql(_LIVE)}
+    mismatches = [
+        {"brand": key[0], "status": key[1], "stored": stored.get(key, 0), "actual": live.get(key, 0)}
+        for key in sorted(stored.keys() | live.keys())
+        if stored.get(key, 0) != live.get(key, 0)
+    ]
+    return {"ok": not mismatches, "mismatches": mismatches, "ms": int((time.monotonic() - start) * 1000)}
+
+
+def get_counts() -> dict[str, dict[str, int]]:
+    """Return {brand_slug: {published: N, draft: N, scheduled: N, total: N}}."""
+    rows = db.session.execute(
+        db.text("SELECT brand, status, n FROM brand_article_counts WHERE n > 0")
+    ).all()
+    counts: dict[str, dict[str, int]] = {}
+    for brand_slug, status, n in rows:
+        entry = counts.setdefault(brand_slug, {s: 0 for s in STATUSES} | {"total": 0})
+        entry[status] = n
+        entry["total"] += n
+    return counts
@@ -0,0 +1,81 @@
+"""Cheap per-family data-version stamps for conditional GET.
+
+A stamp is (token, last_modified). The token folds together the newest
+updated_at with row counts read from the database (or, for kits, the
+manifest count and newest mtime), so it changes whenever the data behind a
+family's read endpoints does, in whichever worker process wrote it, without
+touching the rows themselves. Article counts come from the trigger-kept
+brand_article_counts table, so the stamp stays O(brands).
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from datetime import datetime, timezone
+
+from ..db import db
+from ..models import Article, OpsDomain
+from .brand_registry import BRANDS
+
+FAMILIES = {"articles", "brands", "ops_domains", "kits"}
+
+# Ops domain listings embed live health probes; re-probe at most this often.
+OPS_HEALTH_TTL = int(os.environ.get("OPS_HEALTH_TTL", "60"))
+
+_REGISTRY_HASH = hashlib.sha1(json.dumps(BRANDS, sort_keys=True).encode()).hexdigest()[:12]
+
+
+def _as_utc(value: datetime | None) -> datetime | None:
+    if value is None:
+        return None
+    if value.tzinfo is None:  # SQLite drops tzinfo; we only ever store UTC
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+def _max_updated(model) -> datetime | None:
+    return _as_utc(db.session.query(db.func.max(model.updated_at)).scalar())
+
+
+def _article_counts() -> list[tuple]:
+    # Every insert, delete and brand/status change moves one of these rows
+    return [tuple(row) for row in db.session.execute(
+        db.text("SELECT brand, status, n FROM brand_article_counts WHERE n > 0 ORDER BY brand, status")
+    )]
+
+
+def _kit_manifests() -> tuple[int, float]:
+    from .kit_store import KITS_ROOT as root
+
+    if not root.exists():
+        return 0, 0.0
+    mtimes = [p.stat().st_mtime for p in root.glob("*/*/_codex_manifest.json")]
+    return len(mtimes), max(mtimes, default=0.0)
+
+
+def stamp(family: str) -> tuple[str, datetime | None]:
+    if family not in FAMILIES:
+        raise KeyError(family)
+
+    if family in ("articles", "brands"):
+        last_modified = _max_updated(Article)
+        parts = [last_modified, _article_counts()]
+        if family == "brands":
+            parts.append(_REGISTRY_HASH)
+    elif family == "ops_domains":
+        last_modified = _max_updated(OpsDomain)
+        count = db.session.query(db.func.count(OpsDomain.id)).scalar()
+        bucket_start = int(time.time()) // OPS_HEALTH_TTL * OPS_HEALTH_TTL
+        probed_at = datetime.fromtimestamp(bucket_start, timezone.utc)
+        if last_modified is None or probed_at > last_modified:
+            last_modified = probed_at
+        parts = [last_modified, count]
+    else:
+        count, mtime = _kit_manifests()
+        last_modified = datetime.fromtimestamp(mtime, timezone.utc) if count else None
+        parts = [count, mtime]
+
+    token = hashlib.sha1(repr([family, *parts]).encode()).hexdigest()
+    return token, last_modified
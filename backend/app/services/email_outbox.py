@@ -0,0 +1,375 @@
+"""Durable outbox for invoice email, delivered over pooled SMTP connections.
+
+enqueue() stores rendered messages in `email_outbox` and returns at once, so
+no request waits on the relay. deliver() claims due messages (an UPDATE ...
+RETURNING, so concurrent senders never take the same row) and sends them on
+up to EMAIL_WORKERS threads sharing a pool of authenticated connections: one
+STARTTLS + login per connection instead of per message. A sent message
+stamps its invoice's emailSent (and status "sent" unless already paid);
+temporary failures retry with exponential backoff, and 5xx replies or
+EMAIL_MAX_ATTEMPTS failed tries mark the message failed.
+
+The background sender runs every EMAIL_OUTBOX_INTERVAL seconds and enqueue()
+wakes it early; `flask --app run email-outbox` drains the queue by hand.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import random
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.utils import make_msgid
+
+from sqlalchemy import and_, or_, select, update
+
+from ..db import db
+from ..models import EmailOutbox
+from . import billing_store
+
+log = logging.getLogger(__name__)
+
+SMTP_HOST     = os.environ.get("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT     = int(os.environ.get("SMTP_PORT", "587"))
+SMTP_USER     = os.environ.get("SMTP_USER", "")
+SMTP_PASS     = os.environ.get("SMTP_PASS", "")
+SMTP_STARTTLS = os.environ.get("SMTP_STARTTLS", "true").lower() == "true"
+SMTP_TIMEOUT  = float(os.environ.get("SMTP_TIMEOUT", "30"))
+
+WORKERS = int(os.environ.get("EMAIL_WORKERS", "4"))  # concurrent sends, and pooled connections
+MAX_ATTEMPTS = int(os.environ.get("EMAIL_MAX_ATTEMPTS", "5"))
+BACKOFF_SECONDS = 30             # first retry delay; doubles per attempt
+MESSAGES_PER_CONNECTION = 100    # relays cap messages per session
+IDLE_SECONDS = 60                # pooled connections idle longer are closed, not reused
+LEASE_SECONDS = 300              # a claim older than this is assumed dead and can be taken over
+BATCH = 100
+
+_lock = threading.Lock()
+_stats = {
+    "batches": 0,
+    "sent": 0,
+    "retried": 0,
+    "failed": 0,
+    "connections": 0,
+    "reused": 0,
+    "last_batch_at": None,
+    "last_batch_ms": 0,
+    "last_error": None,
+}
+_wake = threading.Event()
+
+
+def configured() -> bool:
+    return bool(SMTP_USER)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _count(key: str, n: int = 1) -> None:
+    with _lock:
+        _stats[key] += n
+
+
+# ── Connection pool ───────────────────────────────────────────────────────────
+
+class _Connection:
+    def __init__(self, smtp: smtplib.SMTP):
+        self.smtp = smtp
+        self.sent = 0
+        self.last_used = time.monotonic()
+        self.reused = False
+
+
+class SmtpPool:
+    """At most `size` authenticated connections, handed to one sender at a time."""
+
+    def __init__(self, size: int):
+        self._slots = threading.BoundedSemaphore(max(1, size))
+        self._idle: list[_Connection] = []
+        self._lock = threading.Lock()
+
+    def _open(self) -> _Connection:
+        smtp = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT)
+        try:
+            if SMTP_STARTTLS:
+                smtp.starttls()
+            if SMTP_USER:
+                smtp.login(SMTP_USER, SMTP_PASS)
+        except Exception:
+            _close(smtp)
+            raise
+        _count("connections")
+        return _Connection(smtp)
+
+    def _take_idle(self) -> _Connection | None:
+        with self._lock:
+            while self._idle:
+                conn = self._idle.pop()
+                if time.monotonic() - conn.last_used < IDLE_SECONDS:
+                    conn.reused = True
+                    return conn
+                _close(conn.smtp)
+        return None
+
+    @contextmanager
+    def connection(self):
+        with self._slots:
+            conn = self._take_idle() or self._open()
+            try:
+                yield conn
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError):
+                # The server answered and smtplib reset the transaction; the session is still good
+                self._release(conn)
+                raise
+            except Exception:
+                _close(conn.smtp)
+                raise
+            conn.sent += 1
+            self._release(conn)
+
+    def _release(self, conn: _Connection) -> None:
+        if conn.sent >= MESSAGES_PER_CONNECTION:
+            _close(conn.smtp)
+            return
+        conn.last_used = time.monotonic()
+        with self._lock:
+            self._idle.append(conn)
+
+    def idle(self) -> int:
+        with self._lock:
+            return len(self._idle)
+
+    def close_all(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            _close(conn.smtp)
+
+
+def _close(smtp: smtplib.SMTP) -> None:
+    try:
+        smtp.quit()
+    except Exception:
+        smtp.close()
+
+
+_pool = SmtpPool(WORKERS)
+
+
+# ── Queue ─────────────────────────────────────────────────────────────────────
+
+def enqueue(messages: list[dict]) -> dict[str, int]:
+    """Store messages ({invoice_id, to_addr, cc_addr, subject, html}); returns {invoice_id: outbox id}.
+
+    An invoice that already has a message waiting keeps it: the existing id
+    comes back and no second copy is queued.
+    """
+    waiting = dict(db.session.execute(
+        select(EmailOutbox.invoice_id, EmailOutbox.id)
+        .where(EmailOutbox.invoice_id.in_([m["invoice_id"] for m in messages]),
+               EmailOutbox.status.in_(("queued", "sending")))
+    ).all())
+    added = {}
+    for message in messages:
+        if message["invoice_id"] not in waiting and message["invoice_id"] not in added:
+            added[message["invoice_id"]] = EmailOutbox(**message)
+    db.session.add_all(added.values())
+    db.session.commit()
+    _wake.set()
+    return {**waiting, **{inv_id: row.id for inv_id, row in added.items()}}
+
+
+def requeue_failed() -> int:
+    """Give every failed message a fresh set of attempts; returns how many."""
+    count = db.session.execute(
+        update(EmailOutbox).where(EmailOutbox.status == "failed")
+        .values(status="queued", attempts=0, next_attempt_at=_now())
+    ).rowcount
+    db.session.commit()
+    _wake.set()
+    return count
+
+
+def _claim(limit: int) -> list:
+    now = _now()
+    due = (
+        select(EmailOutbox.id)
+        .where(or_(
+            and_(EmailOutbox.status == "queued", EmailOutbox.next_attempt_at <= now),
+            and_(EmailOutbox.status == "sending", EmailOutbox.claimed_at < now - timedelta(seconds=LEASE_SECONDS)),
+        ))
+        .order_by(EmailOutbox.next_attempt_at, EmailOutbox.id)
+        .limit(limit)
+    )
+    rows = db.session.execute(
+        update(EmailOutbox)
+        .where(EmailOutbox.id.in_(due.scalar_subquery()))
+        .values(status="sending", claimed_at=now)
+        .returning(EmailOutbox.id, EmailOutbox.invoice_id, EmailOutbox.to_addr, EmailOutbox.cc_addr,
+                   EmailOutbox.subject, EmailOutbox.html, EmailOutbox.attempts)
+    ).all()
+    db.session.commit()
+    return rows
+
+
+# ── Delivery ──────────────────────────────────────────────────────────────────
+
+def _mime(row) -> MIMEMultipart:
+    msg = MIMEMultipart("alternative")
+    msg["Subject"] = row.subject
+    msg["From"] = SMTP_USER
+    msg["To"] = row.to_addr
+    if row.cc_addr:
+        msg["Cc"] = row.cc_addr
+    msg["Message-ID"] = make_msgid()
+    msg.attach(MIMEText(row.html, "html"))
+    return msg
+
+
+def _send(row) -> Exception | None:
+    """Deliver one claimed message; returns the error instead of raising (runs on a worker thread)."""
+    recipients = [row.to_addr] + ([row.cc_addr] if row.cc_addr else [])
+    text = _mime(row).as_string()
+    for _ in range(2):
+        reused = False
+        try:
+            with _pool.connection() as conn:
+                reused = conn.reused
+                refused = conn.smtp.sendmail(SMTP_USER, recipients, text)
+            if reused:
+                _count("reused")
+            if row.to_addr in refused:
+                raise smtplib.SMTPRecipientsRefused({row.to_addr: refused[row.to_addr]})
+            return None
+        except smtplib.SMTPServerDisconnected as exc:
+            if not reused:
+                return exc
+            # The relay dropped an idle pooled session; try once more on a fresh one
+        except Exception as exc:
+            return exc
+    return smtplib.SMTPServerDisconnected("connection lost twice")
+
+
+def _permanent(exc: Exception) -> bool:
+    if isinstance(exc, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in exc.recipients.values())
+    if isinstance(exc, smtplib.SMTPAuthenticationError):
+        return False  # bad credentials fail every message alike; keep them for after the fix
+    return isinstance(exc, smtplib.SMTPResponseException) and exc.smtp_code >= 500
+
+
+def _backoff(attempts: int) -> timedelta:
+    return timedelta(seconds=BACKOFF_SECONDS * 2 ** (attempts - 1) * (1 + random.random() / 10))
+
+
+def deliver(limit: int = BATCH) -> dict:
+    """Send up to `limit` due messages; returns a batch report."""
+    start = time.monotonic()
+    rows = _claim(limit)
+    report = {"claimed": len(rows), "sent": 0, "retry": 0, "failed": 0, "ms": 0}
+    if not rows:
+        return report
+
+    with ThreadPoolExecutor(max_workers=min(WORKERS, len(rows)), thread_name_prefix="email") as pool:
+        errors = list(pool.map(_send, rows))
+
+    now = _now()
+    delivered: dict[str, datetime] = {}
+    for row, error in zip(rows, errors):
+        attempts = row.attempts + 1
+        if error is None:
+            values = {"status": "sent", "sent_at": now, "last_error": None}
+            delivered[row.invoice_id] = now
+            report["sent"] += 1
+        elif _permanent(error) or attempts >= MAX_ATTEMPTS:
+            values = {"status": "failed", "last_error": str(error)[:500]}
+            report["failed"] += 1
+        else:
+            values = {"status": "queued", "next_attempt_at": now + _backoff(attempts), "last_error": str(error)[:500]}
+            report["retry"] += 1
+        db.session.execute(
+            update(EmailOutbox).where(EmailOutbox.id == row.id)
+            .values(attempts=attempts, claimed_at=None, **values)
+        )
+    db.session.commit()
+
+    for invoice_id, sent_at in delivered.items():
+        invoice = billing_store.get_invoice(invoice_id)
+        if invoice is None:
+            continue
+        changes = {"emailSent": sent_at.isoformat()}
+        if invoice.get("status") != "paid":
+            changes["status"] = "sent"
+        billing_store.update_invoice(invoice_id, changes)
+
+    report["ms"] = int((time.monotonic() - start) * 1000)
+    with _lock:
+        _stats["batches"] += 1
+        _stats["sent"] += report["sent"]
+        _stats["retried"] += report["retry"]
+        _stats["failed"] += report["failed"]
+        _stats["last_batch_at"] = now.isoformat()
+        _stats["last_batch_ms"] = report["ms"]
+        failures = [e for e in errors if e is not None]
+        if failures:
+            _stats["last_error"] = str(failures[-1])[:500]
+    return report
+
+
+def drain(limit: int = BATCH) -> list[dict]:
+    """deliver() until nothing due is left; messages backing off stay queued."""
+    reports = []
+    while True:
+        report = deliver(limit)
+        if not report["claimed"]:
+            return reports
+        reports.append(report)
+
+
+# ── Status and worker ─────────────────────────────────────────────────────────
+
+def stats() -> dict:
+    by_status = dict(db.session.execute(
+        select(EmailOutbox.status, db.func.count(EmailOutbox.id)).group_by(EmailOutbox.status)
+    ).all())
+    oldest = db.session.execute(
+        select(db.func.min(EmailOutbox.created_at)).where(EmailOutbox.status.in_(("queued", "sending")))
+    ).scalar()
+    if oldest is not None and oldest.tzinfo is None:
+        oldest = oldest.replace(tzinfo=timezone.utc)
+    with _lock:
+        return {
+            **_stats,
+            "outbox": {s: by_status.get(s, 0) for s in ("queued", "sending", "sent", "failed")},
+            "lag_seconds": round((_now() - oldest).total_seconds(), 1) if oldest else 0,
+            "idle_connections": _pool.idle(),
+            "workers": WORKERS,
+        }
+
+
+def start(app, interval: float) -> threading.Thread:
+    """Run drain() every `interval` seconds, or as soon as enqueue() wakes it, on a daemon thread."""
+    def loop():
+        while True:
+            _wake.wait(interval)
+            _wake.clear()
+            with app.app_context():
+                try:
+                    drain()
+                except Exception:
+                    db.session.rollback()
+                    log.exception("email outbox delivery failed")
+            if interval >= IDLE_SECONDS:
+                _pool.close_all()  # they would go stale before the next run anyway
+
+    thread = threading.Thread(target=loop, name="email-outbox", daemon=True)
+    thread.start()
+    return thread
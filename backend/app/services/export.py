@@ -0,0 +1,46 @@
+"""Streaming NDJSON / CSV encoders for archive exports.
+
+The row iterators (admin_store.iter_articles, billing_store.iter_invoices)
+read through a server-side cursor with yield_per, and these encoders turn
+each row into one chunk of output as it arrives, so a full dump holds one
+batch in memory at a time and the first bytes go out before the query
+finishes.
+"""
+from __future__ import annotations
+
+import csv
+import json
+from typing import Iterable, Iterator
+
+FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+YIELD_PER = 1000
+
+
+class _Echo:
+    """File-like object whose write() hands the formatted line straight back."""
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def _ndjson(rows: Iterable[dict]) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps(row, separators=(",", ":"), ensure_ascii=False) + "\n"
+
+
+def _csv(rows: Iterable[dict], columns: Iterable[str]) -> Iterator[str]:
+    columns = list(columns)
+    writer = csv.writer(_Echo())
+    yield writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(["" if row.get(c) is None else row.get(c) for c in columns])
+
+
+def encode(rows: Iterable[dict], fmt: str, columns: Iterable[str]) -> Iterator[str]:
+    """Encode `rows` lazily as `fmt`; `columns` fixes the CSV header order."""
+    if fmt == "csv":
+        return _csv(rows, columns)
+    return _ndjson(rows)
@@ -0,0 +1,72 @@
+"""In-process LRU cache for public feed pages.
+
+Keys are tuples whose first element is the brand filter (None for the
+all-brands feed). admin_store invalidates a brand whenever a published row of
+that brand changes; the TTL only bounds staleness across separate workers.
+"""
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+MAX_ENTRIES = int(os.environ.get("FEED_CACHE_SIZE", "256"))
+TTL_SECONDS = float(os.environ.get("FEED_CACHE_TTL", "300"))
+
+_lock = threading.Lock()
+_entries: OrderedDict[tuple, tuple[float, dict]] = OrderedDict()
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+
+
+def get(key: tuple) -> dict | None:
+    with _lock:
+        hit = _entries.get(key)
+        if hit is None or hit[0] <= time.monotonic():
+            if hit is not None:
+                del _entries[key]
+            _stats["misses"] += 1
+            return None
+        _entries.move_to_end(key)
+        _stats["hits"] += 1
+        return hit[1]
+
+
+def put(key: tuple, value: dict) -> None:
+    if MAX_ENTRIES <= 0:
+        return
+    with _lock:
+        _entries[key] = (time.monotonic() + TTL_SECONDS, value)
+        _entries.move_to_end(key)
+        while len(_entries) > MAX_ENTRIES:
+            _entries.popitem(last=False)
+            _stats["evictions"] += 1
+
+
+def invalidate_brand(brand: str) -> int:
+    """Drop every page for `brand` plus the unfiltered feed; returns entries removed."""
+    with _lock:
+        stale = [k for k in _entries if k[0] is None or k[0] == brand]
+        for k in stale:
+            del _entries[k]
+        _stats["invalidations"] += 1
+        return len(stale)
+
+
+def clear() -> None:
+    with _lock:
+        _entries.clear()
+        for k in _stats:
+            _stats[k] = 0
+
+
+def stats() -> dict:
+    with _lock:
+        lookups = _stats["hits"] + _stats["misses"]
+        return {
+            **_stats,
+            "entries": len(_entries),
+            "max_entries": MAX_ENTRIES,
+            "ttl_seconds": TTL_SECONDS,
+            "hit_ratio": round(_stats["hits"] / lookups, 4) if lookups else 0.0,
+        }
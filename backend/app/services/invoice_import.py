@@ -0,0 +1,169 @@
+"""Bulk invoice import from CSV or NDJSON.
+
+Rows are read one at a time from the upload and validated, and valid ones
+become draft invoices through billing_store.new_record(), the same amount
+formula POST /billing/invoices uses. They are written every CHUNK_SIZE rows
+as one executemany INSERT in its own transaction; on the Sheets path the
+whole file goes out as a single append_rows; if that fails the rows stay
+queued for the background flusher and are reported as `queued`, not
+failed, so a retry does not duplicate them. Columns use the API's invoice
+keys (client, email, lineCount, runDates, ...); empty CSV cells take the
+same defaults as a missing key.
+"""
+from __future__ import annotations
+
+import codecs
+import csv
+import json
+import logging
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import IO, Iterator
+
+from sqlalchemy.exc import SQLAlchemyError
+
+from ..db import db
+from . import billing_store
+
+log = logging.getLogger(__name__)
+
+CHUNK_SIZE = 500
+MAX_ERRORS = 1000  # per-row errors reported back; counts stay exact beyond this
+FORMATS = ("csv", "ndjson")
+
+_INTS = ("lineCount", "runs")
+_RATES = ("firstLineRate", "additionalLineRate", "originationFee")
+_TRUE, _FALSE = {"true", "yes", "y", "1"}, {"false", "no", "n", "0", ""}
+
+
+def _rows(stream: IO[bytes], fmt: str) -> Iterator[tuple[int, object]]:
+    """(line number, parsed row) pairs; a row that can't be parsed comes back as its ValueError."""
+    if fmt == "csv":
+        text = codecs.iterdecode(stream, "utf-8-sig")
+        reader = csv.DictReader(text)
+        for row in reader:
+            if None in row:
+                yield reader.line_num, ValueError("row has more cells than the header")
+                continue
+            yield reader.line_num, {k.strip(): v.strip() for k, v in row.items() if k and v and v.strip()}
+        return
+    for line_no, raw in enumerate(stream, start=1):
+        raw = raw.strip()
+        if not raw:
+            continue
+        try:
+            yield line_no, json.loads(raw)
+        except ValueError as exc:
+            yield line_no, exc
+
+
+def _validate(data) -> dict:
+    """The row as create_invoice() input, with types checked; raises ValueError."""
+    if not isinstance(data, dict):
+        raise ValueError("row must be a JSON object")
+    out = dict(data)
+    if not str(out.get("client", "")).strip():
+        raise ValueError("client is required")
+    for key in _INTS:
+        if key in out:
+            try:
+                out[key] = int(out[key])
+            except (TypeError, ValueError):
+                raise ValueError(f"{key} must be an integer") from None
+            if out[key] < 1:
+                raise ValueError(f"{key} must be at least 1")
+    for key in _RATES:
+        if key in out:
+            try:
+                out[key] = float(out[key])
+            except (TypeError, ValueError):
+                raise ValueError(f"{key} must be a number") from None
+            if out[key] < 0:
+                raise ValueError(f"{key} must not be negative")
+    if "date" in out:
+        out["date"] = _iso_date(out["date"], "date")
+    if "runDates" in out:
+        raw = out["runDates"]
+        if isinstance(raw, str):
+            # CSV cells hold a JSON list or ;-separated dates
+            raw = json.loads(raw) if raw.startswith("[") else [d for d in raw.split(";") if d.strip()]
+        if not isinstance(raw, list):
+            raise ValueError("runDates must be a list of dates")
+        out["runDates"] = [_iso_date(d, "runDates") for d in raw]
+    if "isArapahoeCounty" in out and not isinstance(out["isArapahoeCounty"], bool):
+        flag = str(out["isArapahoeCounty"]).strip().lower()
+        if flag not in _TRUE | _FALSE:
+            raise ValueError("isArapahoeCounty must be true or false")
+        out["isArapahoeCounty"] = flag in _TRUE
+    return out
+
+
+def _iso_date(value, field: str) -> str:
+    try:
+        return date.fromisoformat(str(value).strip()).isoformat()
+    except ValueError:
+        raise ValueError(f"{field} must be YYYY-MM-DD dates") from None
+
+
+def _fail(summary: dict, line_no: int, message: str) -> None:
+    summary["failed"] += 1
+    if len(summary["errors"]) < MAX_ERRORS:
+        summary["errors"].append({"line": line_no, "error": message})
+    else:
+        summary["errors_truncated"] = True
+
+
+def _flush(chunk: list[tuple[int, dict]], summary: dict, dry_run: bool) -> None:
+    if not dry_run:
+        try:
+            billing_store.create_invoices([record for _, record in chunk])
+        except SQLAlchemyError as exc:
+            db.session.rollback()
+            for line_no, _ in chunk:
+                _fail(summary, line_no, f"database error: {exc.__class__.__name__}")
+            return
+        except Exception as exc:
+            if not billing_store._use_sheets():
+                raise
+            # The sheet flush failed after staging: the rows stay queued and the
+            # background flusher appends them, so re-importing them would duplicate
+            log.warning("invoice import: %d rows queued after a Sheets error: %s", len(chunk), exc)
+            summary["queued"] += len(chunk)
+        else:
+            summary["created"] += len(chunk)
+    summary["valid"] += len(chunk)
+    summary["amount_total"] = round(summary["amount_total"] + sum(r["amount"] for _, r in chunk), 2)
+
+
+def import_invoices(stream: IO[bytes], fmt: str = "csv", dry_run: bool = False) -> dict:
+    """Create a draft invoice per valid row of `stream`; returns a per-row report.
+
+    With dry_run=True rows are validated and priced but nothing is written.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Invalid format. Must be one of: {', '.join(FORMATS)}")
+    start = time.monotonic()
+    summary = {"rows": 0, "valid": 0, "created": 0, "queued": 0, "failed": 0, "amount_total": 0.0, "errors": [], "dry_run": dry_run}
+    # The Sheets path sends everything in one append_rows, so it buffers the whole file
+    chunk_size = None if billing_store._use_sheets() else CHUNK_SIZE
+    base = datetime.now(timezone.utc)
+    chunk: list[tuple[int, dict]] = []
+
+    for line_no, data in _rows(stream, fmt):
+        summary["rows"] += 1
+        try:
+            if isinstance(data, ValueError):
+                raise data
+            record = billing_store.new_record(_validate(data), now=base + timedelta(microseconds=summary["rows"]))
+        except ValueError as exc:  # includes JSONDecodeError
+            _fail(summary, line_no, str(exc))
+            continue
+        chunk.append((line_no, record))
+        if chunk_size and len(chunk) >= chunk_size:
+            _flush(chunk, summary, dry_run)
+            chunk = []
+    if chunk:
+        _flush(chunk, summary, dry_run)
+
+    summary["ms"] = int((time.monotonic() - start) * 1000)
+    return summary
@@ -0,0 +1,275 @@
+"""Invoice documents (the printable "PDF" page and the email body), cached by version.
+
+A document depends only on its invoice, so renders are keyed on (kind,
+invoice id, version), where version() hashes the whole invoice with
+TEMPLATE_REVISION. Any change, including a cell edited by hand in the sheet,
+gives a new version, so a cached render is never stale; it just stops being
+asked for and ages out of the LRU. The version doubles as the document's ETag and as the
+path segment of its immutable URL. Bump TEMPLATE_REVISION whenever the
+templates below change.
+
+export_zip() streams many documents as one ZIP. A small thread pool renders
+a bounded window ahead of the writer, and each entry is deflated into a
+non-seekable sink and yielded as soon as it is written, so memory is bounded
+by the window rather than the size of the export.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+import zipfile
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Iterable, Iterator
+
+log = logging.getLogger(__name__)
+
+TEMPLATE_REVISION = 1
+KINDS = ("pdf", "email")
+CACHE_SIZE = int(os.environ.get("INVOICE_RENDER_CACHE_SIZE", "2048"))
+
+ZIP_WORKERS = int(os.environ.get("INVOICE_ZIP_WORKERS", "4"))
+ZIP_WINDOW = 32  # documents rendered ahead of the ZIP writer
+
+CC_ADDRESS = "invoices.gizmo@gmail.com"
+
+_lock = threading.Lock()
+_cache: OrderedDict[tuple, str] = OrderedDict()
+_stats = {"hits": 0, "rendered": 0, "evictions": 0, "zips": 0, "zip_entries": 0}
+
+
+# ── Cache ─────────────────────────────────────────────────────────────────────
+
+def version(inv: dict) -> str:
+    """The cache key and ETag of `inv`'s documents; changes whenever any field of the invoice does.
+
+    The whole invoice is hashed, not just updated_at: cells edited by hand in
+    the sheet leave updated_at alone.
+    """
+    content = json.dumps(inv, sort_keys=True, default=str)
+    return hashlib.sha1(f"{content}|{TEMPLATE_REVISION}".encode()).hexdigest()[:16]
+
+
+def render(kind: str, inv: dict) -> str:
+    """`inv`'s `kind` document ("pdf" or "email"), rendered once per version."""
+    template = _TEMPLATES[kind]
+    key = (kind, inv.get("id"), version(inv))
+    with _lock:
+        text = _cache.get(key)
+        if text is not None:
+            _cache.move_to_end(key)
+            _stats["hits"] += 1
+            return text
+    text = template(inv)
+    with _lock:
+        _stats["rendered"] += 1
+        if CACHE_SIZE > 0:
+            _cache[key] = text
+            while len(_cache) > CACHE_SIZE:
+                _cache.popitem(last=False)
+                _stats["evictions"] += 1
+    return text
+
+
+def clear() -> None:
+    with _lock:
+        _cache.clear()
+        for k in _stats:
+            _stats[k] = 0
+
+
+def stats() -> dict:
+    with _lock:
+        return {"entries": len(_cache), "capacity": CACHE_SIZE, **_stats}
+
+
+# ── ZIP export ────────────────────────────────────────────────────────────────
+
+class _Sink:
+    """Write-only file for ZipFile; having no tell() makes it stream with data descriptors."""
+
+    def __init__(self) -> None:
+        self._chunks: list[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def _entry_name(inv: dict) -> str:
+    inv_id = re.sub(r"[^A-Za-z0-9_-]", "_", str(inv.get("id", "")))
+    day = str(inv.get("date") or "undated")
+    return f"{day}/invoice-{inv_id}.html"
+
+
+def _entry_time(inv: dict) -> tuple:
+    try:
+        stamp = datetime.fromisoformat(str(inv.get("updated_at")))
+    except ValueError:
+        stamp = datetime.now(timezone.utc)
+    if stamp.tzinfo is not None:
+        stamp = stamp.astimezone(timezone.utc)
+    return max(stamp.timetuple()[:6], (1980, 1, 1, 0, 0, 0))
+
+
+def _entry(inv: dict) -> tuple[zipfile.ZipInfo, str]:
+    info = zipfile.ZipInfo(_entry_name(inv), date_time=_entry_time(inv))
+    info.compress_type = zipfile.ZIP_DEFLATED
+    return info, render("pdf", inv)
+
+
+def export_zip(invoices: Iterable[dict], workers: int | None = None) -> Iterator[bytes]:
+    """ZIP bytes of the printable document of every invoice, in `invoices` order.
+
+    `invoices` is consumed on the calling thread (it may hold a DB cursor);
+    only rendering runs on the pool.
+    """
+    start = time.monotonic()
+    sink, entries = _Sink(), 0
+    with ThreadPoolExecutor(max_workers=workers or ZIP_WORKERS, thread_name_prefix="invoice-zip") as pool:
+        with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            pending: deque = deque()
+            for inv in invoices:
+                pending.append(pool.submit(_entry, inv))
+                if len(pending) < ZIP_WINDOW:
+                    continue
+                archive.writestr(*pending.popleft().result())
+                entries += 1
+                yield sink.drain()
+            while pending:
+                archive.writestr(*pending.popleft().result())
+                entries += 1
+                yield sink.drain()
+    yield sink.drain()  # the central directory, written on close
+    with _lock:
+        _stats["zips"] += 1
+        _stats["zip_entries"] += entries
+    log.info("invoice zip: %d documents in %d ms", entries, (time.monotonic() - start) * 1000)
+
+
+# ── Templates ─────────────────────────────────────────────────────────────────
+
+def _parse_dates(raw) -> list[str]:
+    if isinstance(raw, list):
+        return raw
+    try:
+        return json.loads(raw or "[]")
+    except Exception:
+        return []
+
+
+def _email_html(inv: dict) -> str:
+    dates_str = ", ".join(_parse_dates(inv.get("runDates", "[]"))) or "TBD"
+    stripe_btn = (
+        f'<p style="margin-top:20px;">'
+        f'<a href="{inv["stripeLink"]}" style="background:#b8860b;color:#fff;'
+        f'padding:10px 22px;text-decoration:none;border-radius:4px;font-family:Georgia,serif;">'
+        f'Pay Online →</a></p>'
+    ) if inv.get("stripeLink") else ""
+
+    return f"""<!DOCTYPE html>
+<html><body style="font-family:Georgia,serif;max-width:620px;margin:40px auto;color:#1a1a1a;background:#fff;">
+<div style="border-top:4px solid #b8860b;padding-top:16px;">
+  <h2 style="margin:0 0 4px;font-size:1.4rem;">Weekly Register-Call</h2>
+  <p style="margin:0;color:#666;font-size:0.9rem;">Black Hawk · Idaho Springs · Georgetown · Colorado</p>
+</div>
+<h3 style="margin-top:24px;border-bottom:1px solid #ddd;padding-bottom:8px;">Ad Invoice</h3>
+<table style="width:100%;border-collapse:collapse;font-size:0.95rem;">
+  <tr><td style="padding:7px 4px;color:#555;width:42%;">Client</td>
+      <td style="padding:7px 4px;font-weight:bold;">{inv.get('client','')}</td></tr>
+  <tr style="background:#f9f6f0;"><td style="padding:7px 4px;color:#555;">Email</td>
+      <td style="padding:7px 4px;">{inv.get('email','')}</td></tr>
+  <tr><td style="padding:7px 4px;color:#555;">Publication</td>
+      <td style="padding:7px 4px;">{inv.get('publication','')}</td></tr>
+  <tr style="background:#f9f6f0;"><td style="padding:7px 4px;color:#555;">Ad Type</td>
+      <td style="padding:7px 4px;">{inv.get('type','')}</td></tr>
+  <tr><td style="padding:7px 4px;color:#555;vertical-align:top;">Description</td>
+      <td style="padding:7px 4px;">{inv.get('description','')}</td></tr>
+  <tr style="background:#f9f6f0;"><td style="padding:7px 4px;color:#555;">Run Dates</td>
+      <td style="padding:7px 4px;">{dates_str}</td></tr>
+  <tr><td style="padding:7px 4px;color:#555;">Lines / Runs</td>
+      <td style="padding:7px 4px;">{inv.get('lineCount',1)} lines × {inv.get('runs',1)} runs</td></tr>
+  <tr style="background:#f9f6f0;"><td style="padding:7px 4px;color:#555;">First line rate</td>
+      <td style="padding:7px 4px;">${inv.get('firstLineRate',0.43):.2f}/run</td></tr>
+  <tr><td style="padding:7px 4px;color:#555;">Additional lines rate</td>
+      <td style="padding:7px 4px;">${inv.get('additionalLineRate',0.38):.2f}/run</td></tr>
+  <tr style="background:#f9f6f0;"><td style="padding:7px 4px;color:#555;">Origination fee</td>
+      <td style="padding:7px 4px;">${inv.get('originationFee',25):.2f}</td></tr>
+  <tr style="border-top:2px solid #b8860b;">
+    <td style="padding:10px 4px;font-weight:bold;font-size:1.1rem;">TOTAL DUE</td>
+    <td style="padding:10px 4px;font-weight:bold;font-size:1.1rem;color:#b8860b;">${inv.get('amount','0.00')}</td>
+  </tr>
+</table>
+{stripe_btn}
+<p style="margin-top:32px;font-size:0.8rem;color:#888;">
+  Questions? Reply to this email or contact {CC_ADDRESS}<br>
+  Weekly Register-Call · PO Box · Black Hawk, CO 80422
+</p>
+</body></html>"""
+
+
+def _pdf_html(inv: dict) -> str:
+    dates_str = ", ".join(_parse_dates(inv.get("runDates", "[]"))) or "TBD"
+    inv_num   = inv.get("id", "")[:8].upper()
+    return f"""<!DOCTYPE html>
+<html><head><title>Invoice {inv_num}</title>
+<style>
+  body {{ font-family: Georgia, serif; max-width: 700px; margin: 50px auto; color: #1a1a1a; }}
+  .header {{ border-top: 5px solid #b8860b; padding: 16px 0; margin-bottom: 24px; }}
+  .header h1 {{ margin: 0 0 4px; font-size: 1.6rem; }}
+  .inv-num {{ color: #666; font-size: 0.9rem; }}
+  table {{ width: 100%; border-collapse: collapse; margin-top: 16px; }}
+  td {{ padding: 9px 6px; border-bottom: 1px solid #e8e0d0; }}
+  .label {{ color: #555; width: 42%; }}
+  .total-row td {{ border-top: 2px solid #b8860b; font-weight: bold; font-size: 1.1rem; border-bottom: none; }}
+  .total-val {{ color: #b8860b; }}
+  @media print {{ body {{ margin: 20px; }} }}
+</style>
+</head><body>
+<div class="header">
+  <h1>Weekly Register-Call</h1>
+  <p style="margin:0;color:#666;">Black Hawk · Idaho Springs · Georgetown · Colorado</p>
+</div>
+<h2 style="margin:0 0 4px;">Ad Invoice</h2>
+<p class="inv-num">#{inv_num} &nbsp;·&nbsp; {inv.get('date','')}</p>
+<table>
+  <tr><td class="label">Client</td><td><strong>{inv.get('client','')}</strong></td></tr>
+  <tr><td class="label">Email</td><td>{inv.get('email','')}</td></tr>
+  <tr><td class="label">Publication</td><td>{inv.get('publication','')}</td></tr>
+  <tr><td class="label">Ad Type</td><td>{inv.get('type','')}</td></tr>
+  <tr><td class="label">Description</td><td>{inv.get('description','')}</td></tr>
+  <tr><td class="label">Run Dates</td><td>{dates_str}</td></tr>
+  <tr><td class="label">Lines</td><td>{inv.get('lineCount',1)}</td></tr>
+  <tr><td class="label">Runs</td><td>{inv.get('runs',1)}</td></tr>
+  <tr><td class="label">First line rate</td><td>${inv.get('firstLineRate',0.43):.2f}/run</td></tr>
+  <tr><td class="label">Additional lines rate</td><td>${inv.get('additionalLineRate',0.38):.2f}/run</td></tr>
+  <tr><td class="label">Origination fee</td><td>${inv.get('originationFee',25):.2f} (one-time)</td></tr>
+  <tr class="total-row">
+    <td class="label">TOTAL DUE</td>
+    <td class="total-val">${inv.get('amount','0.00')}</td>
+  </tr>
+</table>
+<p style="margin-top:40px;font-size:0.82rem;color:#888;">
+  Thank you for advertising with the Weekly Register-Call.<br>
+  Please remit payment to: Weekly Register-Call · PO Box · Black Hawk, CO 80422<br>
+  Questions: {CC_ADDRESS}
+</p>
+<script>window.onload = () => window.print();</script>
+</body></html>"""
+
+
+_TEMPLATES = {"pdf": _pdf_html, "email": _email_html}
@@ -0,0 +1,289 @@
+"""Billing revenue rollups and receivables aging for GET /billing/reports.
+
+`invoice_daily_rollups` holds one row per (day, publication, type, status),
+where day is the invoice `date`. The row stores the invoice count, the amount
+in cents (integers, so repeated adds and subtracts never drift), and, for
+invoices with a paidDate, how many there are and their total days to pay.
+SQLite triggers on insert, delete and changes to those columns adjust it
+inside the writing transaction, the same way brand_counts tracks articles, so
+creates, bulk imports, PATCHes, Stripe webhooks, email delivery and mirror
+replication all stay counted without knowing about it.
+
+report() is a handful of GROUP BYs over the rollups, whose size depends on
+the number of days and publications, not on the number of invoices. On the
+Sheets path there is no table, so the cached snapshot is aggregated in
+Python to the same shape.
+
+`flask --app run invoice-rollups` compares the rollups with a live GROUP BY;
+`--rebuild` recomputes them.
+"""
+from __future__ import annotations
+
+import time
+from collections import defaultdict
+from datetime import date
+
+from sqlalchemy import event
+
+from ..db import db
+from ..models import Invoice
+from . import billing_store
+
+PAID = "paid"
+UNBILLED = "draft"  # drafts are neither revenue due nor receivable
+AGING_BUCKETS = (("0-30", 30), ("31-60", 60), ("61-90", 90), ("90+", None))
+GROUPS = {"month": "substr(day, 1, 7)", "publication": "publication", "type": "type", "status": "status"}
+
+
+def _cents(row: str) -> str:
+    return f"CAST(round(coalesce({row}.amount, 0) * 100) AS INTEGER)"
+
+
+def _paid(row: str) -> str:
+    return f"(julianday({row}.paid_date) IS NOT NULL AND julianday({row}.date) IS NOT NULL)"
+
+
+def _days(row: str) -> str:
+    return f"CAST(coalesce(julianday({row}.paid_date) - julianday({row}.date), 0) AS INTEGER)"
+
+
+_ADD = f"""INSERT INTO invoice_daily_rollups(day, publication, type, status, n, cents, paid_n, paid_days)
+        VALUES (new.date, new.publication, new.type, new.status, 1, {_cents('new')}, {_paid('new')}, {_days('new')})
+        ON CONFLICT(day, publication, type, status) DO UPDATE SET
+            n = n + 1, cents = cents + excluded.cents,
+            paid_n = paid_n + excluded.paid_n, paid_days = paid_days + excluded.paid_days;"""
+
+_SUB = f"""UPDATE invoice_daily_rollups SET
+            n = n - 1, cents = cents - {_cents('old')},
+            paid_n = paid_n - {_paid('old')}, paid_days = paid_days - {_days('old')}
+        WHERE day = old.date AND publication = old.publication AND type = old.type AND status = old.status;"""
+
+_DDL = [
+    """CREATE TABLE IF NOT EXISTS invoice_daily_rollups (
+        day         VARCHAR(10)  NOT NULL,
+        publication VARCHAR(100) NOT NULL,
+        type        VARCHAR(50)  NOT NULL,
+        status      VARCHAR(20)  NOT NULL,
+        n           INTEGER      NOT NULL DEFAULT 0,
+        cents       INTEGER      NOT NULL DEFAULT 0,
+        paid_n      INTEGER      NOT NULL DEFAULT 0,
+        paid_days   INTEGER      NOT NULL DEFAULT 0,
+        PRIMARY KEY (day, publication, type, status)
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS invoice_rollups_ai AFTER INSERT ON invoices BEGIN
+        {_ADD}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS invoice_rollups_ad AFTER DELETE ON invoices BEGIN
+        {_SUB}
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS invoice_rollups_au
+    AFTER UPDATE OF date, publication, type, status, amount, paid_date ON invoices
+    WHEN old.date IS NOT new.date OR old.publication IS NOT new.publication OR old.type IS NOT new.type
+      OR old.status IS NOT new.status OR old.amount IS NOT new.amount OR old.paid_date IS NOT new.paid_date
+    BEGIN
+        {_SUB}
+        {_ADD}
+    END""",
+]
+
+_SELECT = f"""SELECT date, publication, type, status, count(*),
+    sum({_cents('invoices')}), sum({_paid('invoices')}), sum({_days('invoices')})
+FROM invoices GROUP BY date, publication, type, status"""
+
+_BACKFILL = f"INSERT INTO invoice_daily_rollups(day, publication, type, status, n, cents, paid_n, paid_days) {_SELECT}"
+
+
+def _create(connection) -> None:
+    for statement in _DDL:
+        connection.exec_driver_sql(statement)
+
+
+@event.listens_for(Invoice.__table__, "after_create")
+def _after_create(target, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        _create(connection)
+
+
+@event.listens_for(Invoice.__table__, "before_drop")
+def _before_drop(target, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        connection.exec_driver_sql("DROP TABLE IF EXISTS invoice_daily_rollups")
+
+
+def install(connection) -> bool:
+    """Add the rollup table and triggers to a database that predates them; True if backfilled."""
+    if connection.dialect.name != "sqlite":
+        return False
+    exists = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'invoice_daily_rollups'"
+    ).first()
+    if exists:
+        return False
+    _create(connection)
+    connection.exec_driver_sql(_BACKFILL)
+    return True
+
+
+def rebuild() -> dict:
+    """Recompute every rollup row from `invoices` in one transaction."""
+    start = time.monotonic()
+    with db.engine.begin() as conn:
+        _create(conn)
+        conn.exec_driver_sql("DELETE FROM invoice_daily_rollups")
+        conn.exec_driver_sql(_BACKFILL)
+        rows = conn.exec_driver_sql("SELECT count(*) FROM invoice_daily_rollups").scalar()
+    return {"rows": rows, "ms": int((time.monotonic() - start) * 1000)}
+
+
+def verify() -> dict:
+    """Diff the stored rollups against a live GROUP BY over `invoices`."""
+    start = time.monotonic()
+    with db.engine.connect() as conn:
+        stored = {
+            tuple(row[:4]): tuple(row[4:])
+            for row in conn.exec_driver_sql(
+                "SELECT day, publication, type, status, n, cents, paid_n, paid_days FROM invoice_daily_rollups"
+            )
+            if any(row[4:])
+        }
+        live = {tuple(row[:4]): tuple(row[4:]) for row in conn.exec_driver_sql(_SELECT)}
+    zero = (0, 0, 0, 0)
+    mismatches = [
+        {"key": list(key), "stored": list(stored.get(key, zero)), "actual": list(live.get(key, zero))}
+        for key in sorted(stored.keys() | live.keys())
+        if stored.get(key, zero) != live.get(key, zero)
+    ]
+    return {"ok": not mismatches, "mismatches": mismatches, "ms": int((time.monotonic() - start) * 1000)}
+
+
+# ── Report ────────────────────────────────────────────────────────────────────
+
+def _bucket(age: int | None) -> str:
+    if age is None:
+        return "undated"
+    for name, limit in AGING_BUCKETS:
+        if limit is None or age <= limit:
+            return name
+    return AGING_BUCKETS[-1][0]
+
+
+def _money(cents: int | None) -> float:
+    return round((cents or 0) / 100, 2)
+
+
+def _groups(name: str, grouped) -> list[dict]:
+    return [
+        {name: key, "count": n, "amount": _money(cents), "paid": _money(paid), "outstanding": _money(due)}
+        for key, n, cents, paid, due in grouped
+    ]
+
+
+def _sql_report(date_from: str | None, date_to: str | None, as_of: date) -> tuple[dict, list, tuple]:
+    where, params = "n > 0", {"as_of": as_of.isoformat()}
+    if date_from:
+        where += " AND day >= :date_from"
+        params["date_from"] = date_from
+    if date_to:
+        where += " AND day <= :date_to"
+        params["date_to"] = date_to
+
+    def run(sql: str):
+        return db.session.execute(db.text(sql), params).all()
+
+    measures = (f"sum(n), sum(cents), sum(CASE WHEN status = '{PAID}' THEN cents ELSE 0 END), "
+                f"sum(CASE WHEN status NOT IN ('{PAID}', '{UNBILLED}') THEN cents ELSE 0 END)")
+    groups = {
+        name: run(f"SELECT {expr} AS k, {measures} FROM invoice_daily_rollups WHERE {where} GROUP BY k ORDER BY k")
+        for name, expr in GROUPS.items()
+    }
+    age = "CAST(julianday(:as_of) - julianday(day) AS INTEGER)"
+    cases = " ".join(f"WHEN {age} <= {limit} THEN '{name}'" for name, limit in AGING_BUCKETS if limit is not None)
+    aging = run(
+        f"SELECT CASE WHEN julianday(day) IS NULL THEN 'undated' {cases} ELSE '{AGING_BUCKETS[-1][0]}' END AS bucket, "
+        f"sum(n), sum(cents) FROM invoice_daily_rollups "
+        f"WHERE {where} AND status NOT IN ('{PAID}', '{UNBILLED}') GROUP BY bucket"
+    )
+    paid_n, paid_days = run(f"SELECT sum(paid_n), sum(paid_days) FROM invoice_daily_rollups WHERE {where}")[0]
+    return groups, aging, (paid_n or 0, paid_days or 0)
+
+
+def _sheet_report(records, as_of: date) -> tuple[dict, list, tuple]:
+    groups = {name: defaultdict(lambda: [0, 0, 0, 0]) for name in GROUPS}
+    aging: dict = defaultdict(lambda: [0, 0])
+    paid_n = paid_days = 0
+    for r in records:
+        day, status = str(r.get("date", "")), str(r.get("status", ""))
+        try:
+            cents = round(float(r.get("amount") or 0) * 100)
+        except ValueError:
+            cents = 0
+        keys = {"month": day[:7], "publication": str(r.get("publication", "")),
+                "type": str(r.get("type", "")), "status": status}
+        due = status not in (PAID, UNBILLED)
+        for name, key in keys.items():
+            acc = groups[name][key]
+            acc[0] += 1
+            acc[1] += cents
+            acc[2] += cents if status == PAID else 0
+            acc[3] += cents if due else 0
+        try:
+            issued = date.fromisoformat(day)
+        except ValueError:
+            issued = None
+        if due:
+            acc = aging[_bucket((as_of - issued).days if issued else None)]
+            acc[0] += 1
+            acc[1] += cents
+        if issued and r.get("paidDate"):
+            try:
+                paid_days += (date.fromisoformat(str(r["paidDate"])) - issued).days
+                paid_n += 1
+            except ValueError:
+                pass
+    return (
+        {name: [(k, *acc) for k, acc in sorted(g.items())] for name, g in groups.items()},
+        [(bucket, *acc) for bucket, acc in aging.items()],
+        (paid_n, paid_days),
+    )
+
+
+def report(date_from: str | None = None, date_to: str | None = None, as_of: date | None = None) -> dict:
+    """Revenue by month, publication, type and status, plus receivables aging on `as_of`.
+
+    Invoices are selected by their `date`. amount counts every invoice, paid
+    only status "paid", and outstanding everything billed but unpaid (neither
+    draft nor paid); aging buckets the outstanding invoices by days since
+    their date.
+    """
+    start = time.monotonic()
+    as_of = as_of or date.today()
+    if billing_store._use_sheets():
+        records = billing_store.list_invoices(date_from=date_from, date_to=date_to)
+        groups, aging, (paid_n, paid_days) = _sheet_report(records, as_of)
+    else:
+        groups, aging, (paid_n, paid_days) = _sql_report(date_from, date_to, as_of)
+
+    statuses = groups["status"]
+    aged = {bucket: (n, cents) for bucket, n, cents in aging}
+    buckets = [name for name, _ in AGING_BUCKETS] + (["undated"] if "undated" in aged else [])
+    return {
+        "from": date_from,
+        "to": date_to,
+        "as_of": as_of.isoformat(),
+        "totals": {
+            "count": sum(row[1] or 0 for row in statuses),
+            "amount": _money(sum(row[2] or 0 for row in statuses)),
+            "paid": _money(sum(row[3] or 0 for row in statuses)),
+            "outstanding": _money(sum(row[4] or 0 for row in statuses)),
+        },
+        "by_month": _groups("month", groups["month"]),
+        "by_publication": _groups("publication", groups["publication"]),
+        "by_type": _groups("type", groups["type"]),
+        "by_status": _groups("status", statuses),
+        "aging": [
+            {"bucket": name, "count": aged.get(name, (0, 0))[0], "amount": _money(aged.get(name, (0, 0))[1])}
+            for name in buckets
+        ],
+        "days_to_pay": {"paid": paid_n, "average": round(paid_days / paid_n, 1) if paid_n else None},
+        "ms": int((time.monotonic() - start) * 1000),
+    }
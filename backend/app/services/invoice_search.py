@@ -0,0 +1,96 @@
+"""SQLite FTS5 index over invoice client, email, description and notes.
+
+`invoices_fts` is an external-content index keyed on invoices.rowid, kept in
+sync by triggers like articles_fts (see services.search), so creates,
+updates, bulk imports and the replication importer all stay searchable.
+
+Search terms are prefix matches ("acm" finds "Acme"), which suits a search
+box that queries as the user types.
+"""
+from __future__ import annotations
+
+import re
+import time
+
+from sqlalchemy import event, false, text
+
+from ..db import db
+from ..models import Invoice
+
+_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS invoices_fts USING fts5(
+        client, email, description, notes,
+        content='invoices', content_rowid='rowid',
+        tokenize='unicode61 remove_diacritics 2'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS invoices_fts_ai AFTER INSERT ON invoices BEGIN
+        INSERT INTO invoices_fts(rowid, client, email, description, notes)
+        VALUES (new.rowid, new.client, new.email, new.description, new.notes);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS invoices_fts_ad AFTER DELETE ON invoices BEGIN
+        INSERT INTO invoices_fts(invoices_fts, rowid, client, email, description, notes)
+        VALUES ('delete', old.rowid, old.client, old.email, old.description, old.notes);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS invoices_fts_au AFTER UPDATE OF client, email, description, notes
+    ON invoices BEGIN
+        INSERT INTO invoices_fts(invoices_fts, rowid, client, email, description, notes)
+        VALUES ('delete', old.rowid, old.client, old.email, old.description, old.notes);
+        INSERT INTO invoices_fts(rowid, client, email, description, notes)
+        VALUES (new.rowid, new.client, new.email, new.description, new.notes);
+    END""",
+]
+
+
+def _create(connection) -> None:
+    for statement in _DDL:
+        connection.exec_driver_sql(statement)
+
+
+@event.listens_for(Invoice.__table__, "after_create")
+def _after_create(target, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        _create(connection)
+
+
+@event.listens_for(Invoice.__table__, "before_drop")
+def _before_drop(target, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        connection.exec_driver_sql("DROP TABLE IF EXISTS invoices_fts")
+
+
+def install(connection) -> bool:
+    """Add the index to a database that predates it; True if it had to be built."""
+    if connection.dialect.name != "sqlite":
+        return False
+    exists = connection.exec_driver_sql(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'invoices_fts'"
+    ).first()
+    if exists:
+        return False
+    _create(connection)
+    connection.exec_driver_sql("INSERT INTO invoices_fts(invoices_fts) VALUES ('rebuild')")
+    return True
+
+
+def rebuild() -> dict:
+    """Re-index every invoice from the content table (backfill / post-VACUUM repair)."""
+    start = time.monotonic()
+    with db.engine.begin() as conn:
+        _create(conn)
+        conn.exec_driver_sql("INSERT INTO invoices_fts(invoices_fts) VALUES ('rebuild')")
+        indexed = conn.exec_driver_sql("SELECT count(*) FROM invoices").scalar()
+    return {"indexed": indexed, "ms": int((time.monotonic() - start) * 1000)}
+
+
+def match_expr(q: str) -> str:
+    """Every word of `q` quoted (so input can't hit FTS5 syntax) and prefix-matched."""
+    return " ".join(f'"{t}"*' for t in re.findall(r"\w+", q or ""))
+
+
+def matching(q: str):
+    """A WHERE clause limiting a query on invoices to rows matching `q`."""
+    if not match_expr(q):
+        return false()  # no words to match, e.g. q="%"
+    return text(
+        "invoices.rowid IN (SELECT rowid FROM invoices_fts WHERE invoices_fts MATCH :invoice_match)"
+    ).bindparams(invoice_match=match_expr(q))
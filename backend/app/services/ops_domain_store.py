@@ -1,7 +1,5 @@
 from __future__ import annotations
 
-from sqlalchemy import text
-
 from app.db import db
 from app.models import OpsDomain
 from app.services.domain_health import check_domain
@@ -83,30 +81,18 @@ _SEEDS = [
     },
 ]
 
-_seeded = False
-
-
-def _migrate_brand_slug(engine) -> None:
-    """Add brand_slug column to ops_domains if it doesn't exist (SQLite-safe)."""
-    try:
-        with engine.connect() as conn:
-            conn.execute(text("ALTER TABLE ops_domains ADD COLUMN brand_slug VARCHAR(100)"))
-            conn.commit()
-    except Exception:
-        pass  # Column already exists
-
 
-def seed_ops_domains() -> None:
-    global _seeded
-    if _seeded:
-        return
-    _seeded = True
-    _migrate_brand_slug(db.engine)
-    for seed in _SEEDS:
-        if not OpsDomain.query.filter_by(domain=seed["domain"]).first():
-            row = OpsDomain(**{k: v for k, v in seed.items() if v is not None})
-            db.session.add(row)
+def seed_ops_domains() -> int:
+    """Insert any seed domains that are missing; returns rows inserted."""
+    existing = {
+        domain for (domain,) in
+        db.session.query(OpsDomain.domain).filter(OpsDomain.domain.in_([s["domain"] for s in _SEEDS]))
+    }
+    missing = [s for s in _SEEDS if s["domain"] not in existing]
+    for seed in missing:
+        db.session.add(OpsDomain(**{k: v for k, v in seed.items() if v is not None}))
     db.session.commit()
+    return len(missing)
 
 
 def list_domains(limit: int = 20, offset: int = 0) -> tuple[list[dict], int]:
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import base64
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Callable
+
+from sqlalchemy import tuple_
+
+TOTAL_MODES = {"none", "exact", "estimate"}
+
+# Estimated totals are plain counts memoized for a short window, so deep
+# cursor walks don't pay for a full COUNT on every page. Keys carry
+# user-supplied filters (brand, search text, date ranges), so the memo is an
+# LRU capped at MAX_ESTIMATES entries.
+_ESTIMATE_TTL = 30.0
+MAX_ESTIMATES = 512
+_estimates_lock = threading.Lock()
+_estimates: OrderedDict[tuple, tuple[float, int]] = OrderedDict()
+
+
+def encode_token(values: list) -> str:
+    raw = json.dumps(values, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_token(token: str) -> list:
+    """Inverse of encode_token(); raises ValueError on anything malformed."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except Exception as exc:
+        raise ValueError("invalid cursor") from exc
+    if not isinstance(values, list):
+        raise ValueError("invalid cursor")
+    return values
+
+
+def encode_cursor(created_at: datetime, row_id: str) -> str:
+    return encode_token([created_at.isoformat(), row_id])
+
+
+def decode_cursor(token: str) -> tuple[datetime, str]:
+    try:
+        created_at, row_id = decode_token(token)
+        return datetime.fromisoformat(created_at), str(row_id)
+    except (TypeError, ValueError) as exc:
+        raise ValueError("invalid cursor") from exc
+
+
+def keyset_page(query, model, limit: int, cursor: str | None = None) -> tuple[list, str | None]:
+    """Return one page of `query` newest-first, seeking past `cursor`.
+
+    Rows are ordered on (created_at, id) so the seek is a single index range
+    scan no matter how deep the page is. One extra row is fetched to decide
+    whether a next cursor exists.
+    """
+    if cursor:
+        created_at, row_id = decode_cursor(cursor)
+        query = query.filter(tuple_(model.created_at, model.id) < (created_at, row_id))
+    rows = query.order_by(model.created_at.desc(), model.id.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        if rows:
+            next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return rows, next_cursor
+
+
+def estimate_count(query, key: tuple) -> int:
+    now = time.monotonic()
+    with _estimates_lock:
+        hit = _estimates.get(key)
+        if hit and hit[0] > now:
+            _estimates.move_to_end(key)
+            return hit[1]
+    count = query.order_by(None).count()
+    with _estimates_lock:
+        _estimates[key] = (now + _ESTIMATE_TTL, count)
+        _estimates.move_to_end(key)
+        while len(_estimates) > MAX_ESTIMATES:
+            _estimates.popitem(last=False)
+    return count
+
+
+def cursor_page(fetch: Callable[[int, str | None], tuple[list, str | None]], count: Callable[[bool], int],
+                limit: int, cursor: str | None, total_mode: str, key: str,
+                encode: Callable[[list], object] = list) -> dict:
+    """One keyset page as the list endpoints return it.
+
+    fetch(limit, cursor) returns (rows, next_cursor); count(estimate) backs
+    `?total=exact|estimate`; the rows go out under `key` through encode().
+    Raises ValueError for an unknown total mode or a bad cursor.
+    """
+    if total_mode not in TOTAL_MODES:
+        raise ValueError(f"Invalid total. Must be one of: {', '.join(sorted(TOTAL_MODES))}")
+    try:
+        rows, next_cursor = fetch(limit, cursor)
+    except ValueError:
+        raise ValueError("invalid cursor") from None
+
+    result = {
+        "count": len(rows),
+        "limit": limit,
+        "has_more": next_cursor is not None,
+        key: encode(rows),
+    }
+    if next_cursor:
+        result["next_cursor"] = next_cursor
+    if total_mode == "exact":
+        result["total"] = count(False)
+    elif total_mode == "estimate":
+        result["total_estimate"] = count(True)
+    return result
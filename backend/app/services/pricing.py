@@ -0,0 +1,157 @@
+"""Classified and legal ad pricing: per-publication rate cards and batch quotes.
+
+    amount = originationFee + runs * firstLineRate + runs * (lineCount - 1) * additionalLineRate
+
+Each publication has a rate card with those three rates and the column
+width (characters per printed line) used to count the lines of ad text. A
+card may carry an "arapahoe" block of overrides for Arapahoe County legal
+notices. BILLING_RATE_CARDS names a JSON file of cards merged over the
+defaults below, keyed by publication name.
+
+quote() prices a whole batch: rate cards are resolved once per
+(publication, county) pair and nothing touches the database, so the
+counter desk can price hundreds of ads without creating invoices.
+billing_store prices new invoices through the same amount().
+"""
+from __future__ import annotations
+
+import json
+import os
+from datetime import date
+
+DEFAULT_PUBLICATION = "Register-Call"
+RATE_KEYS = ("firstLineRate", "additionalLineRate", "originationFee")
+MAX_QUOTES = 1000
+
+RATE_CARDS: dict[str, dict] = {
+    "Register-Call": {"firstLineRate": 0.43, "additionalLineRate": 0.38, "originationFee": 25.0, "columnWidth": 28},
+    "The Villager":  {"firstLineRate": 0.43, "additionalLineRate": 0.38, "originationFee": 25.0, "columnWidth": 28},
+}
+
+
+def _load_overrides() -> None:
+    path = os.environ.get("BILLING_RATE_CARDS", "")
+    if not path:
+        return
+    with open(path) as fh:
+        for publication, card in json.load(fh).items():
+            RATE_CARDS[publication] = {**RATE_CARDS.get(publication, RATE_CARDS[DEFAULT_PUBLICATION]), **card}
+
+
+_load_overrides()
+
+
+def rate_card(publication: str | None = None, arapahoe: bool = False) -> dict:
+    """Rates and column width for `publication`; raises KeyError for one without a card."""
+    card = RATE_CARDS[publication or DEFAULT_PUBLICATION]
+    if arapahoe and card.get("arapahoe"):
+        card = {**card, **card["arapahoe"]}
+    return {k: v for k, v in card.items() if k != "arapahoe"}
+
+
+def amount(runs: int, line_count: int, first_rate: float, add_rate: float, orig_fee: float) -> float:
+    return round(orig_fee + runs * first_rate + runs * max(0, line_count - 1) * add_rate, 2)
+
+
+def count_lines(text: str, width: int) -> int:
+    """Printed lines of `text` set in a `width`-character column.
+
+    Words wrap greedily; a word wider than the column is broken across
+    lines, and each paragraph (line of input) starts a fresh line.
+    """
+    total = 0
+    for paragraph in text.splitlines():
+        cur = 0
+        for word in paragraph.split():
+            size = len(word)
+            if cur and cur + 1 + size <= width:
+                cur += 1 + size
+                continue
+            full, cur = divmod(size, width)
+            if cur:
+                total += full + 1
+            else:
+                total += full
+                cur = width
+    return max(total, 1)
+
+
+# ── Batch quotes ──────────────────────────────────────────────────────────────
+
+def _int(spec: dict, key: str, default: int) -> int:
+    try:
+        value = int(spec.get(key, default))
+    except (TypeError, ValueError):
+        raise ValueError(f"{key} must be an integer") from None
+    if value < 1:
+        raise ValueError(f"{key} must be at least 1")
+    return value
+
+
+def _rate(spec: dict, key: str, default: float) -> float:
+    try:
+        value = float(spec.get(key, default))
+    except (TypeError, ValueError):
+        raise ValueError(f"{key} must be a number") from None
+    if value < 0:
+        raise ValueError(f"{key} must not be negative")
+    return value
+
+
+def _run_count(spec: dict) -> int:
+    run_dates = spec.get("runDates")
+    if run_dates is None:
+        return _int(spec, "runs", 1)
+    if not isinstance(run_dates, list):
+        raise ValueError("runDates must be a list of dates")
+    try:
+        for d in run_dates:
+            date.fromisoformat(str(d))
+    except ValueError:
+        raise ValueError("runDates must be YYYY-MM-DD dates") from None
+    return len(run_dates) or _int(spec, "runs", 1)
+
+
+def price(spec: dict, card: dict) -> dict:
+    """One ad priced on `card`; explicit rates, lineCount or columnWidth in `spec` win."""
+    width = _int(spec, "columnWidth", card["columnWidth"])
+    if "lineCount" in spec or not spec.get("text"):
+        line_count, derived = _int(spec, "lineCount", 1), False
+    else:
+        line_count, derived = count_lines(str(spec["text"]), width), True
+    runs = _run_count(spec)
+    rates = {k: _rate(spec, k, card[k]) for k in RATE_KEYS}
+    return {
+        "lineCount": line_count,
+        "lineCountDerived": derived,
+        "columnWidth": width,
+        "runs": runs,
+        **rates,
+        "amount": amount(runs, line_count, rates["firstLineRate"], rates["additionalLineRate"],
+                         rates["originationFee"]),
+    }
+
+
+def quote(specs: list) -> dict:
+    """Price every ad spec; a bad spec gets an error entry instead of failing the batch."""
+    cards: dict[tuple, dict] = {}
+    quotes, total, failed = [], 0.0, 0
+    for index, spec in enumerate(specs):
+        try:
+            if not isinstance(spec, dict):
+                raise ValueError("ad must be a JSON object")
+            publication = str(spec.get("publication") or DEFAULT_PUBLICATION)
+            key = (publication, bool(spec.get("isArapahoeCounty")))
+            if key not in cards:
+                try:
+                    cards[key] = rate_card(*key)
+                except KeyError:
+                    raise ValueError(f"no rate card for publication {publication!r}") from None
+            priced = price(spec, cards[key])
+        except ValueError as exc:
+            failed += 1
+            quotes.append({"index": index, "error": str(exc)})
+            continue
+        total += priced["amount"]
+        quotes.append({"index": index, "publication": key[0], "isArapahoeCounty": key[1], **priced})
+    return {"count": len(specs), "failed": failed, "total": round(total, 2), "quotes": quotes}
@@ -0,0 +1,101 @@
+"""Promote `scheduled` articles to `published` once their scheduled_at passes.
+
+publish_due() flips every due row in one UPDATE ... RETURNING. SQLite runs
+that statement under its write lock, so when several API workers run the loop
+at once each due article is claimed by exactly one of them.
+"""
+from __future__ import annotations
+
+import logging
+import threading
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import update
+
+from ..db import db
+from ..models import Article
+from . import feed_cache, site_generator
+
+log = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+_stats = {
+    "runs": 0,
+    "promoted": 0,
+    "last_run_at": None,
+    "last_batch": 0,
+    "max_batch": 0,
+    "last_run_ms": 0,
+    "last_max_latency_ms": 0,
+    "max_latency_ms": 0,
+}
+
+
+def publish_due(now: datetime | None = None) -> dict:
+    """Publish every scheduled article due at `now`; returns a run report."""
+    now = now or datetime.now(timezone.utc)
+    start = time.monotonic()
+
+    stmt = (
+        update(Article)
+        .where(Article.status == "scheduled", Article.scheduled_at <= now)
+        .values(status="published", updated_at=now)
+        .returning(Article.id, Article.brand, Article.scheduled_at)
+        .execution_options(synchronize_session=False)
+    )
+    rows = db.session.execute(stmt).all()
+    db.session.commit()
+
+    latencies = [
+        int((now - scheduled.replace(tzinfo=timezone.utc)).total_seconds() * 1000)
+        for _, _, scheduled in rows
+    ]
+    brands = sorted({brand for _, brand, _ in rows})
+    if rows:
+        for brand in brands:
+            feed_cache.invalidate_brand(brand)
+        if site_generator.SITES_ENABLED:
+            for article in Article.query.filter(Article.id.in_([r[0] for r in rows])):
+                site_generator.article_changed(article.to_dict(), was_published=False)
+
+    report = {
+        "promoted": len(rows),
+        "brands": brands,
+        "max_latency_ms": max(latencies, default=0),
+        "ms": int((time.monotonic() - start) * 1000),
+    }
+    with _lock:
+        _stats["runs"] += 1
+        _stats["promoted"] += len(rows)
+        _stats["last_run_at"] = now.isoformat()
+        _stats["last_batch"] = len(rows)
+        _stats["max_batch"] = max(_stats["max_batch"], len(rows))
+        _stats["last_run_ms"] = report["ms"]
+        _stats["last_max_latency_ms"] = report["max_latency_ms"]
+        _stats["max_latency_ms"] = max(_stats["max_latency_ms"], report["max_latency_ms"])
+    if rows:
+        log.info("published %d scheduled article(s) for %s", len(rows), ", ".join(brands))
+    return report
+
+
+def stats() -> dict:
+    with _lock:
+        return dict(_stats)
+
+
+def start(app, interval: int) -> threading.Thread:
+    """Run publish_due() every `interval` seconds on a daemon thread."""
+    def loop():
+        while True:
+            time.sleep(interval)
+            with app.app_context():
+                try:
+                    publish_due()
+                except Exception:
+                    db.session.rollback()
+                    log.exception("scheduled publish run failed")
+
+    thread = threading.Thread(target=loop, name="publish-scheduler", daemon=True)
+    thread.start()
+    return thread
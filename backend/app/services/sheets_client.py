@@ -0,0 +1,435 @@
+"""Process-wide Google Sheets clients, cached worksheet snapshots and batched writes.
+
+Authorizing and opening a spreadsheet costs several API round trips, and
+gspread's Credentials refresh their own access token, so one client per
+service-account file is kept for the life of the process (rebuilt only if
+the file changes on disk).
+
+A SheetCache holds one worksheet's rows plus a key -> row-number index.
+Reads are served from that snapshot. Once it is older than TTL_SECONDS,
+the next read asks Drive for the spreadsheet's modifiedTime, a single small
+metadata call, and only downloads the sheet again if that changed.
+
+Writes are staged, not sent: the snapshot is patched at once and changes
+are merged per row, then a flush (every FLUSH_INTERVAL seconds on a
+background thread, or as soon as MAX_PENDING rows are waiting) sends every
+staged cell in one batch_update and every new row in one append_rows. Row
+numbers are resolved at flush time, after a revision check, so rows shifted
+by hand in the meantime are still hit correctly. FLUSH_INTERVAL=0 flushes
+inside each write.
+
+Every API call takes a token from a process-wide bucket sized to the Sheets
+per-minute quota, and 429/5xx answers are retried with exponential backoff
+and jitter (or the server's Retry-After).
+"""
+from __future__ import annotations
+
+import atexit
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable
+
+log = logging.getLogger(__name__)
+
+TTL_SECONDS = float(os.environ.get("BILLING_SHEETS_TTL", "30"))
+RATE_PER_MINUTE = float(os.environ.get("BILLING_SHEETS_RATE", "60"))
+BURST = int(os.environ.get("BILLING_SHEETS_BURST", "10"))
+FLUSH_INTERVAL = float(os.environ.get("BILLING_SHEETS_FLUSH_INTERVAL", "2"))
+MAX_PENDING = 200
+MAX_ATTEMPTS = 5
+BACKOFF_BASE = 1.0
+BACKOFF_CAP = 32.0
+_RETRY_CODES = {429, 500, 502, 503, 504}
+
+_sleep = time.sleep  # tests swap this out
+
+_clients_lock = threading.Lock()
+_clients: dict[str, tuple[float, object]] = {}
+
+
+def client(creds_path: str, scopes: list[str]):
+    """A gspread client for `creds_path`, authorized once per process."""
+    import gspread
+    from google.oauth2.service_account import Credentials
+
+    mtime = os.path.getmtime(creds_path)
+    with _clients_lock:
+        cached = _clients.get(creds_path)
+        if cached is None or cached[0] != mtime:
+            creds = Credentials.from_service_account_file(creds_path, scopes=scopes)
+            cached = _clients[creds_path] = (mtime, gspread.authorize(creds))
+        return cached[1]
+
+
+# ── Quota ─────────────────────────────────────────────────────────────────────
+
+class TokenBucket:
+    """`rate_per_minute` tokens a minute, at most `burst` saved up; acquire() blocks."""
+
+    def __init__(self, rate_per_minute: float, burst: int):
+        self.rate = rate_per_minute / 60.0
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take one token; returns the seconds spent waiting for it."""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1 or self.rate <= 0:
+                    self._tokens -= 1
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            _sleep(delay)
+            waited += delay
+
+
+_bucket = TokenBucket(RATE_PER_MINUTE, BURST)
+_call_lock = threading.Lock()
+_call_stats = {"calls": 0, "retries": 0, "throttled_ms": 0, "failures": 0}
+
+
+def _status(exc: Exception) -> int | None:
+    code = getattr(exc, "code", None)
+    if isinstance(code, int):
+        return code
+    return getattr(getattr(exc, "response", None), "status_code", None)
+
+
+def _retry_after(exc: Exception) -> float | None:
+    headers = getattr(getattr(exc, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+def call(fn: Callable, *args, **kwargs):
+    """fn(*args, **kwargs) under the quota bucket, retrying 429/5xx with backoff."""
+    for attempt in range(MAX_ATTEMPTS):
+        waited = _bucket.acquire()
+        with _call_lock:
+            _call_stats["calls"] += 1
+            _call_stats["throttled_ms"] += int(waited * 1000)
+        try:
+            return fn(*args, **kwargs)
+        except Exception as exc:
+            if _status(exc) not in _RETRY_CODES or attempt == MAX_ATTEMPTS - 1:
+                with _call_lock:
+                    _call_stats["failures"] += 1
+                raise
+            delay = _retry_after(exc) or min(BACKOFF_CAP, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.0)
+            log.warning("sheets call %s got %s; retrying in %.1fs", getattr(fn, "__name__", fn), _status(exc), delay)
+            with _call_lock:
+                _call_stats["retries"] += 1
+            _sleep(delay)
+
+
+def call_stats() -> dict:
+    with _call_lock:
+        return dict(_call_stats)
+
+
+# ── Snapshot ──────────────────────────────────────────────────────────────────
+
+def _records(values: list[list]) -> tuple[list, list[dict]]:
+    """(headers, records) from get_all_values(), numericised as get_all_records() does."""
+    from gspread.utils import numericise_all
+
+    if not values:
+        return [], []
+    headers = values[0]
+    width = len(headers)
+    records = [
+        dict(zip(headers, numericise_all((row + [""] * width)[:width])))
+        for row in values[1:]
+    ]
+    return headers, records
+
+
+def _a1(row: int, col: int) -> str:
+    from gspread.utils import rowcol_to_a1
+
+    return rowcol_to_a1(row, col)
+
+
+class SheetCache:
+    """Snapshot of one worksheet, indexed by the `key` column, with staged writes.
+
+    `open_worksheet` returns (spreadsheet, worksheet); it is called once and
+    again only after invalidate(). `raw` writes cells verbatim instead of
+    letting Sheets parse them as typed input. With auto_flush=False there is
+    no background flusher: staged writes wait for flush() (or MAX_PENDING).
+    """
+
+    def __init__(self, open_worksheet: Callable[[], tuple], key: str = "id", ttl: float | None = None,
+                 flush_interval: float | None = None, raw: bool = False, auto_flush: bool = True):
+        self._open = open_worksheet
+        self._key = key
+        self._ttl = TTL_SECONDS if ttl is None else ttl
+        self._flush_interval = FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self._raw = raw
+        self._auto_flush = auto_flush
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self._spreadsheet = self._ws = None
+        self._headers: list = []
+        self._records: list[dict] = []
+        self._index: dict[str, int] = {}
+        self._revision: str | None = None
+        self._checked_at = float("-inf")
+        # Staged writes: key -> changed cells, and key -> record not yet appended
+        self._pending_updates: dict[str, dict] = {}
+        self._pending_appends: dict[str, dict] = {}
+        # Swapped out of pending by a flush that is still sending them
+        self._inflight_updates: dict[str, dict] = {}
+        self._inflight_appends: dict[str, dict] = {}
+        self._staged_at: float | None = None
+        self._holds = 0
+        self._flusher: threading.Thread | None = None
+        self._stats = {
+            "hits": 0, "revision_checks": 0, "reloads": 0, "opens": 0,
+            "flushes": 0, "flush_failures": 0, "cells_written": 0, "rows_appended": 0,
+            "rows_unmatched": 0, "last_flush_ms": 0, "max_flush_ms": 0, "max_write_lag_ms": 0,
+        }
+
+    def worksheet(self):
+        with self._lock:
+            if self._ws is None:
+                self._spreadsheet, self._ws = call(self._open)
+                self._stats["opens"] += 1
+            return self._ws
+
+    def _fresh(self, force: bool = False) -> None:
+        """Make the snapshot current: reuse, revalidate against Drive, or reload."""
+        ws = self.worksheet()
+        now = time.monotonic()
+        if not force and now - self._checked_at < self._ttl:
+            self._stats["hits"] += 1
+            return
+        self._stats["revision_checks"] += 1
+        revision = call(self._spreadsheet.get_lastUpdateTime)
+        if revision != self._revision or self._revision is None:
+            self._headers, self._records = _records(call(ws.get_all_values))
+            self._index = {str(r.get(self._key)): i for i, r in enumerate(self._records)}
+            self._revision = revision
+            self._stats["reloads"] += 1
+            self._reapply_pending()
+        self._checked_at = now
+
+    def _reapply_pending(self) -> None:
+        # A reload only sees what reached the sheet; writes in flight, then staged ones, go back on top
+        for appends in (self._inflight_appends, self._pending_appends):
+            for key, record in appends.items():
+                if key not in self._index:
+                    self._add(record)
+        for updates in (self._inflight_updates, self._pending_updates):
+            for key, changes in updates.items():
+                self._patch(key, changes)
+
+    def _add(self, record: dict) -> None:
+        if not self._headers:
+            self._headers = list(record)
+        self._index[str(record.get(self._key))] = len(self._records)
+        self._records.append({h: record.get(h, "") for h in self._headers})
+
+    def _patch(self, key: str, changes: dict) -> None:
+        i = self._index.get(str(key))
+        if i is not None:
+            self._records[i].update({k: v for k, v in changes.items() if k in self._records[i]})
+
+    def refresh(self) -> None:
+        """Revalidate against Drive now, whatever the TTL says."""
+        with self._lock:
+            self._fresh(force=True)
+
+    def headers(self) -> list:
+        with self._lock:
+            self._fresh()
+            return list(self._headers)
+
+    def records(self) -> list[dict]:
+        """Every row as a dict (copies; callers may mutate them)."""
+        with self._lock:
+            self._fresh()
+            return [dict(r) for r in self._records]
+
+    def find(self, key: str) -> tuple[int, dict] | None:
+        """(sheet row number as of the snapshot, record) for `key`, from the index."""
+        with self._lock:
+            self._fresh()
+            i = self._index.get(str(key))
+            if i is None:
+                return None
+            return i + 2, dict(self._records[i])  # row 1 holds the headers
+
+    # ── Staged writes ────────────────────────────────────────────────────────
+
+    def stage_append(self, record: dict) -> None:
+        """Queue a new row; its cells are the record's values in key order."""
+        key = str(record.get(self._key))
+        with self._lock:
+            if self._revision is not None:
+                self._add(record)
+            self._pending_appends[key] = dict(record)
+            self._staged()
+        self._after_stage()
+
+    def stage_appends(self, records: list[dict]) -> None:
+        """stage_append() for many rows at once; they go out together in the next flush."""
+        with self._lock:
+            for record in records:
+                if self._revision is not None:
+                    self._add(record)
+                self._pending_appends[str(record.get(self._key))] = dict(record)
+            self._staged()
+        self._after_stage()
+
+    def stage_update(self, key: str, changes: dict) -> None:
+        """Queue cell changes for the row whose key is `key`, merged with any already queued."""
+        key = str(key)
+        with self._lock:
+            self._patch(key, changes)
+            if key in self._pending_appends:
+                record = self._pending_appends[key]
+                record.update({k: v for k, v in changes.items() if k in record})
+            else:
+                self._pending_updates.setdefault(key, {}).update(changes)
+            self._staged()
+        self._after_stage()
+
+    def _staged(self) -> None:
+        if self._staged_at is None:
+            self._staged_at = time.monotonic()
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._pending_updates) + len(self._pending_appends)
+
+    @contextmanager
+    def hold(self):
+        """Stage without flushing on MAX_PENDING or FLUSH_INTERVAL=0; the caller flushes after."""
+        with self._lock:
+            self._holds += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._holds -= 1
+
+    def _after_stage(self) -> None:
+        with self._lock:
+            if self._holds:
+                return
+        if self._flush_interval <= 0 or self.pending() >= MAX_PENDING:
+            self.flush()
+            return
+        if not self._auto_flush:
+            return
+        with self._lock:
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_loop, name="sheets-flush", daemon=True)
+                self._flusher.start()
+                atexit.register(self._flush_quietly)
+
+    def _flush_loop(self) -> None:
+        while True:
+            _sleep(self._flush_interval)
+            self._flush_quietly()
+
+    def _flush_quietly(self) -> None:
+        try:
+            self.flush()
+        except Exception:
+            log.exception("sheets flush failed; %d rows stay queued", self.pending())
+
+    def flush(self) -> dict:
+        """Send every staged change: one batch_update for cells, one append_rows for new rows."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending_updates and not self._pending_appends:
+                    return {"cells": 0, "rows": 0}
+                started = time.monotonic()
+                if self._pending_updates:
+                    self._fresh(force=True)  # row numbers must match the sheet as it is now
+                ws = self.worksheet()
+                updates, self._pending_updates = self._pending_updates, {}
+                appends, self._pending_appends = self._pending_appends, {}
+                staged_at, self._staged_at = self._staged_at, None
+                self._inflight_updates, self._inflight_appends = updates, appends
+                reloads = self._stats["reloads"]
+                data, unmatched = [], 0
+                for key, changes in updates.items():
+                    i = self._index.get(key)
+                    if i is None:
+                        unmatched += 1  # the row was deleted from the sheet
+                        continue
+                    data.extend(
+                        {"range": _a1(i + 2, self._headers.index(col) + 1), "values": [[value]]}
+                        for col, value in changes.items() if col in self._headers
+                    )
+                rows = [[str(v) for v in record.values()] for record in appends.values()]
+
+            try:
+                if data:
+                    call(ws.batch_update, data, raw=self._raw)
+                if rows:
+                    call(ws.append_rows, rows)
+            except Exception:
+                with self._lock:
+                    self._inflight_updates, self._inflight_appends = {}, {}
+                    # Requeue under anything staged meanwhile, which is newer
+                    for key, changes in updates.items():
+                        self._pending_updates[key] = {**changes, **self._pending_updates.get(key, {})}
+                    self._pending_appends = {**appends, **self._pending_appends}
+                    self._staged_at = staged_at
+                    self._stats["flush_failures"] += 1
+                raise
+
+            revision = call(self._spreadsheet.get_lastUpdateTime)
+            with self._lock:
+                self._inflight_updates, self._inflight_appends = {}, {}
+                if self._revision is not None and self._stats["reloads"] == reloads:
+                    # Adopt the revision our own write produced so it does not force a reload
+                    # (an outside edit landing in the same instant waits for the next change)
+                    self._revision = revision
+                    self._checked_at = time.monotonic()
+                else:
+                    # Nothing loaded yet, or a reload during the send read the sheet from before
+                    # this write: the next read downloads it again instead of trusting the snapshot
+                    self._revision = None
+                    self._checked_at = float("-inf")
+                ms = int((time.monotonic() - started) * 1000)
+                lag = int((time.monotonic() - staged_at) * 1000) if staged_at is not None else 0
+                self._stats["flushes"] += 1
+                self._stats["cells_written"] += len(data)
+                self._stats["rows_appended"] += len(rows)
+                self._stats["rows_unmatched"] += unmatched
+                self._stats["last_flush_ms"] = ms
+                self._stats["max_flush_ms"] = max(self._stats["max_flush_ms"], ms)
+                self._stats["max_write_lag_ms"] = max(self._stats["max_write_lag_ms"], lag)
+            return {"cells": len(data), "rows": len(rows), "ms": ms}
+
+    def invalidate(self, reopen: bool = False) -> None:
+        with self._lock:
+            self._revision = None
+            self._checked_at = float("-inf")
+            if reopen:
+                self._spreadsheet = self._ws = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._stats, "rows": len(self._records), "revision": self._revision, "ttl": self._ttl,
+                "pending": len(self._pending_updates) + len(self._pending_appends),
+                "flush_interval": self._flush_interval, "api": call_stats(),
+            }
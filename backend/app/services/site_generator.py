@@ -0,0 +1,405 @@
+"""Static brand sites rendered from published articles.
+
+Each enabled brand gets a directory under SITES_ROOT that nginx can serve as
+the brand domain's document root:
+
+    index.html                   newest PAGE_SIZE articles
+    page/<n>/index.html          archive pages, numbered from the oldest article
+    articles/<slug>/index.html   one page per article
+    rss.xml  atom.xml  feed.json newest FEED_SIZE articles
+    sitemap.xml                  sitemap index over sitemap-<n>.xml chunks
+
+Archive pages and sitemap chunks are numbered oldest-first, so publishing a
+new article only rewrites the last page and chunk, the index and the feeds;
+editing one rewrites its own page, archive page and chunk.
+"""
+from __future__ import annotations
+
+import html
+import json
+import logging
+import os
+import shutil
+import time
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from itertools import groupby
+from pathlib import Path
+
+from .article_fields import excerpt as _excerpt, row_dict
+from .articles import count_articles, count_older, query_articles, query_articles_after
+from .brand_registry import BRANDS, get_brand
+from .kit_store import PUBLISHED_ROOT
+from .pagination import encode_cursor
+
+log = logging.getLogger(__name__)
+
+SITES_ROOT    = Path(os.environ.get("SITES_ROOT", str(PUBLISHED_ROOT / "sites")))
+SITES_ENABLED = os.environ.get("STATIC_SITES_ENABLED", "false").lower() == "true"
+
+PAGE_SIZE     = 20
+FEED_SIZE     = 20
+SITEMAP_CHUNK = 50_000
+_BATCH        = 500
+
+# Sitemaps never need article bodies; id/created_at keep the keyset walk going.
+_SITEMAP_FIELDS = ("id", "slug", "created_at", "updated_at")
+
+
+# ── Public interface ──────────────────────────────────────────────────────────
+
+def build_all() -> list[dict]:
+    return [build_brand(b["slug"]) for b in BRANDS if b["enabled"]]
+
+
+def build_brand(slug: str) -> dict:
+    """Render a brand's whole site into a staging dir, then swap it into place."""
+    brand = get_brand(slug)
+    if brand is None:
+        raise KeyError(f"Brand {slug} not found")
+
+    start = time.monotonic()
+    total = count_articles(slug)
+    pages = _chunk_count(total, PAGE_SIZE)
+    staging = SITES_ROOT / f".{slug}.building"
+    shutil.rmtree(staging, ignore_errors=True)
+
+    ranked = ((total - 1 - i, a) for i, a in enumerate(_iter_published(slug, 0, total)))
+    for page_idx, group in groupby(ranked, key=lambda ra: ra[0] // PAGE_SIZE):
+        items = [a for _, a in group]
+        for article in items:
+            _write(_article_path(staging, article["slug"]), _render_article(brand, article))
+        _write(_page_path(staging, page_idx + 1), _render_listing(brand, items, page_idx + 1, pages))
+
+    sitemaps = _chunk_count(total, SITEMAP_CHUNK)
+    for n in range(1, sitemaps + 1):
+        _write_sitemap_chunk(staging, brand, n, total)
+    _write_sitemap_index(staging, brand, sitemaps)
+    _write_front(staging, brand, total, pages)
+
+    target = _brand_dir(slug)
+    retired = SITES_ROOT / f".{slug}.retired"
+    shutil.rmtree(retired, ignore_errors=True)
+    if target.exists():
+        os.replace(target, retired)
+    os.replace(staging, target)
+    shutil.rmtree(retired, ignore_errors=True)
+
+    return {
+        "brand": slug,
+        "articles": total,
+        "pages": pages,
+        "sitemaps": sitemaps,
+        "ms": int((time.monotonic() - start) * 1000),
+    }
+
+
+def article_changed(article: dict, was_published: bool, old_slug: str | None = None) -> None:
+    """Regenerate only the files a create/update of `article` can have changed."""
+    if not SITES_ENABLED:
+        return
+    brand = get_brand(article["brand"])
+    if brand is None or not brand["enabled"]:
+        return
+    try:
+        _refresh(brand, article, was_published, old_slug)
+    except OSError:
+        log.exception("static site refresh failed for %s", article["brand"])
+
+
+def brand_changed(slug: str) -> None:
+    """Full rebuild after a bulk change too broad to track per article."""
+    if not SITES_ENABLED:
+        return
+    brand = get_brand(slug)
+    if brand is None or not brand["enabled"]:
+        return
+    try:
+        build_brand(slug)
+    except OSError:
+        log.exception("static site rebuild failed for %s", slug)
+
+
+# ── Incremental refresh ───────────────────────────────────────────────────────
+
+def _refresh(brand: dict, article: dict, was_published: bool, old_slug: str | None) -> None:
+    now_published = article["status"] == "published"
+    if not (was_published or now_published):
+        return
+
+    slug = brand["slug"]
+    root = _brand_dir(slug)
+    if not root.exists():
+        build_brand(slug)
+        return
+
+    total = count_articles(slug)
+    before = total + int(was_published) - int(now_published)
+    rank = count_older(slug, _parse_dt(article["created_at"]).replace(tzinfo=None), article["id"])
+    shifted = was_published != now_published
+
+    # Archive pages: an edit touches one page, a publish/unpublish shifts the tail.
+    pages, old_pages = _chunk_count(total, PAGE_SIZE), _chunk_count(before, PAGE_SIZE)
+    first = rank // PAGE_SIZE + 1
+    touched = set(range(first, pages + 1)) if shifted else {first}
+    if pages != old_pages:
+        touched.add(min(pages, old_pages))  # its "newer" link changed
+    for page in sorted(p for p in touched if 1 <= p <= pages):
+        _write_page(root, brand, page, total, pages)
+    for page in range(pages + 1, old_pages + 1):
+        shutil.rmtree(_page_path(root, page).parent, ignore_errors=True)
+
+    # The article's own page
+    if old_slug and (old_slug != article["slug"] or not now_published):
+        shutil.rmtree(_article_path(root, old_slug).parent, ignore_errors=True)
+    if now_published:
+        _write(_article_path(root, article["slug"]), _render_article(brand, article))
+
+    # Front page and feeds only show the newest articles
+    newest_rank = total - rank - int(now_published)
+    if newest_rank < max(PAGE_SIZE, FEED_SIZE) or pages != old_pages:
+        _write_front(root, brand, total, pages)
+
+    # Sitemap chunks follow the same oldest-first numbering as archive pages
+    chunks, old_chunks = _chunk_count(total, SITEMAP_CHUNK), _chunk_count(before, SITEMAP_CHUNK)
+    first = rank // SITEMAP_CHUNK + 1
+    for n in (range(first, chunks + 1) if shifted else [first]):
+        if n <= chunks:
+            _write_sitemap_chunk(root, brand, n, total)
+    for n in range(chunks + 1, old_chunks + 1):
+        (root / f"sitemap-{n}.xml").unlink(missing_ok=True)
+    if chunks != old_chunks:
+        _write_sitemap_index(root, brand, chunks)
+
+
+# ── Reading ───────────────────────────────────────────────────────────────────
+
+def _iter_published(brand: str, offset: int, count: int, fields: tuple[str, ...] | None = None):
+    """Yield up to `count` published articles newest-first, `offset` rows in.
+
+    One OFFSET query seeks to the start, then keyset batches keep memory flat.
+    """
+    if count <= 0:
+        return
+    batch, _ = query_articles(brand=brand, limit=min(count, _BATCH), offset=offset, fields=fields)
+    while batch:
+        yield from (row_dict(row, fields) for row in batch)
+        count -= len(batch)
+        if count <= 0:
+            return
+        cursor = encode_cursor(batch[-1].created_at, batch[-1].id)
+        batch, _ = query_articles_after(brand=brand, limit=min(count, _BATCH), cursor=cursor, fields=fields)
+
+
+def _window(brand: str, n: int, size: int, total: int, fields: tuple[str, ...] | None = None):
+    """Articles in oldest-first chunk `n` (1-based) of `size`, newest-first."""
+    stop = min(n * size, total)
+    return _iter_published(brand, total - stop, stop - (n - 1) * size, fields)
+
+
+# ── Writing ───────────────────────────────────────────────────────────────────
+
+def _brand_dir(slug: str) -> Path:
+    return SITES_ROOT / slug
+
+
+def _page_path(root: Path, page: int) -> Path:
+    return root / "page" / str(page) / "index.html"
+
+
+def _article_path(root: Path, slug: str) -> Path:
+    return root / "articles" / slug / "index.html"
+
+
+def _chunk_count(total: int, size: int) -> int:
+    return -(-total // size)
+
+
+def _write(path: Path, text: str) -> None:
+    """Write via a temp file + rename so nginx never serves a half-written file."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(text, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def _write_page(root: Path, brand: dict, page: int, total: int, pages: int) -> None:
+    items = list(_window(brand["slug"], page, PAGE_SIZE, total))
+    _write(_page_path(root, page), _render_listing(brand, items, page, pages))
+
+
+def _write_front(root: Path, brand: dict, total: int, pages: int) -> None:
+    newest = list(_iter_published(brand["slug"], 0, max(PAGE_SIZE, FEED_SIZE)))
+    _write(root / "index.html", _render_listing(brand, newest[:PAGE_SIZE], None, pages))
+    feed = newest[:FEED_SIZE]
+    _write(root / "rss.xml", _render_rss(brand, feed))
+    _write(root / "atom.xml", _render_atom(brand, feed))
+    _write(root / "feed.json", _render_json_feed(brand, feed))
+
+
+def _write_sitemap_chunk(root: Path, brand: dict, n: int, total: int) -> None:
+    path = root / f"sitemap-{n}.xml"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(path.name + ".tmp")
+    with tmp.open("w", encoding="utf-8") as fh:
+        fh.write('<?xml version="1.0" encoding="UTF-8"?>\n'
+                 '<urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n')
+        for article in _window(brand["slug"], n, SITEMAP_CHUNK, total, _SITEMAP_FIELDS):
+            fh.write(f"  <url><loc>{_esc(_article_url(brand, article))}</loc>"
+                     f"<lastmod>{_parse_dt(article['updated_at']).date().isoformat()}</lastmod></url>\n")
+        fh.write("</urlset>\n")
+    os.replace(tmp, path)
+
+
+def _write_sitemap_index(root: Path, brand: dict, chunks: int) -> None:
+    base = _base_url(brand)
+    entries = "".join(
+        f"  <sitemap><loc>{_esc(base)}/sitemap-{n}.xml</loc></sitemap>\n"
+        for n in range(1, chunks + 1)
+    )
+    _write(root / "sitemap.xml",
+           '<?xml version="1.0" encoding="UTF-8"?>\n'
+           '<sitemapindex xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">\n'
+           f"{entries}</sitemapindex>\n")
+
+
+# ── Render helpers ────────────────────────────────────────────────────────────
+
+def _esc(value) -> str:
+    return html.escape(str(value or ""))
+
+
+def _parse_dt(value: str) -> datetime:
+    dt = datetime.fromisoformat(value)
+    return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+
+
+def _base_url(brand: dict) -> str:
+    return f"https://{brand['site_domain']}"
+
+
+def _article_url(brand: dict, article: dict) -> str:
+    return f"{_base_url(brand)}/articles/{article['slug']}/"
+
+
+def _layout(brand: dict, title: str, content: str) -> str:
+    color = brand.get("primary_color", "#1a1a1a")
+    return f"""<!DOCTYPE html>
+<html lang="en"><head>
+<meta charset="UTF-8"/>
+<meta name="viewport" content="width=device-width,initial-scale=1"/>
+<title>{_esc(title)}</title>
+<link rel="alternate" type="application/rss+xml" href="/rss.xml"/>
+<link rel="alternate" type="application/atom+xml" href="/atom.xml"/>
+<link rel="alternate" type="application/feed+json" href="/feed.json"/>
+<style>
+  body{{max-width:800px;margin:40px auto;padding:0 20px;
+        font-family:Georgia,serif;color:#1a1a1a;line-height:1.7;}}
+  header{{border-top:5px solid {color};padding-top:12px;margin-bottom:24px;}}
+  header a{{color:{color};text-decoration:none;}}
+  a{{color:{color};}} .meta{{color:#666;font-size:0.85rem;}}
+  nav.pager{{display:flex;justify-content:space-between;margin-top:32px;}}
+</style>
+</head><body>
+<header><h1><a href="/">{_esc(brand.get("logo_text") or brand["name"])}</a></h1>
+<p class="meta">{_esc(brand.get("tagline"))}</p></header>
+{content}
+</body></html>
+"""
+
+
+def _render_listing(brand: dict, items: list[dict], page: int | None, pages: int) -> str:
+    entries = "".join(
+        f'<article><h2><a href="/articles/{_esc(a["slug"])}/">{_esc(a["title"])}</a></h2>\n'
+        f'<p class="meta">{_esc(a["author"])} · {_parse_dt(a["created_at"]).date().isoformat()}</p>\n'
+        f"<p>{_esc(_excerpt(a['body']))}</p></article>\n"
+        for a in items
+    ) or "<p>No articles yet.</p>\n"
+
+    if page is None:
+        older = f'<a href="/page/{pages}/">Archive →</a>' if pages else ""
+        newer = ""
+        title = brand["name"]
+    else:
+        older = f'<a href="/page/{page - 1}/">← Older</a>' if page > 1 else ""
+        newer = f'<a href="/page/{page + 1}/">Newer →</a>' if page < pages else '<a href="/">Latest →</a>'
+        title = f"{brand['name']} — page {page}"
+    return _layout(brand, title, f'{entries}<nav class="pager"><span>{older}</span><span>{newer}</span></nav>')
+
+
+def _render_article(brand: dict, article: dict) -> str:
+    paragraphs = "".join(
+        f"<p>{_esc(p.strip())}</p>\n" for p in (article.get("body") or "").split("\n\n") if p.strip()
+    )
+    content = (
+        f"<h2>{_esc(article['title'])}</h2>\n"
+        f'<p class="meta">{_esc(article["author"])} · {_parse_dt(article["created_at"]).date().isoformat()}</p>\n'
+        f"{paragraphs}"
+    )
+    return _layout(brand, f"{article['title']} — {brand['name']}", content)
+
+
+def _render_rss(brand: dict, items: list[dict]) -> str:
+    entries = "".join(
+        f"<item><title>{_esc(a['title'])}</title>"
+        f"<link>{_esc(_article_url(brand, a))}</link>"
+        f'<guid isPermaLink="false">{_esc(a["id"])}</guid>'
+        f"<pubDate>{format_datetime(_parse_dt(a['created_at']))}</pubDate>"
+        f"<description>{_esc(_excerpt(a['body']))}</description></item>\n"
+        for a in items
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<rss version="2.0"><channel>\n'
+        f"<title>{_esc(brand['name'])}</title><link>{_esc(_base_url(brand))}/</link>"
+        f"<description>{_esc(brand.get('tagline'))}</description>\n"
+        f"{entries}</channel></rss>\n"
+    )
+
+
+def _render_atom(brand: dict, items: list[dict]) -> str:
+    base = _base_url(brand)
+    updated = max((_parse_dt(a["updated_at"]) for a in items),
+                  default=datetime.now(timezone.utc)).isoformat()
+    entries = "".join(
+        f"<entry><id>urn:uuid:{_esc(a['id'])}</id><title>{_esc(a['title'])}</title>"
+        f'<link href="{_esc(_article_url(brand, a))}"/>'
+        f"<published>{_parse_dt(a['created_at']).isoformat()}</published>"
+        f"<updated>{_parse_dt(a['updated_at']).isoformat()}</updated>"
+        f"<author><name>{_esc(a['author'] or brand['name'])}</name></author>"
+        f"<summary>{_esc(_excerpt(a['body']))}</summary></entry>\n"
+        for a in items
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<feed xmlns="http://www.w3.org/2005/Atom">\n'
+        f"<id>{_esc(base)}/</id><title>{_esc(brand['name'])}</title>"
+        f'<link href="{_esc(base)}/"/><link rel="self" href="{_esc(base)}/atom.xml"/>'
+        f"<updated>{updated}</updated>\n"
+        f"{entries}</feed>\n"
+    )
+
+
+def _render_json_feed(brand: dict, items: list[dict]) -> str:
+    base = _base_url(brand)
+    feed = {
+        "version": "https://jsonfeed.org/version/1.1",
+        "title": brand["name"],
+        "home_page_url": f"{base}/",
+        "feed_url": f"{base}/feed.json",
+        "description": brand.get("tagline", ""),
+        "items": [
+            {
+                "id": a["id"],
+                "url": _article_url(brand, a),
+                "title": a["title"],
+                "content_text": a["body"],
+                "summary": _excerpt(a["body"]),
+                "date_published": _parse_dt(a["created_at"]).isoformat(),
+                "date_modified": _parse_dt(a["updated_at"]).isoformat(),
+                **({"authors": [{"name": a["author"]}]} if a["author"] else {}),
+            }
+            for a in items
+        ],
+    }
+    return json.dumps(feed, indent=2)
@@ -0,0 +1,197 @@
+"""SQLite connection profile: pragmas applied on connect, plus pool sizing.
+
+A bare file-backed SQLite database runs in rollback-journal mode with
+synchronous=FULL, a 2 MB page cache and no mmap: a writer blocks every
+reader, and whoever waits past the driver's lock timeout gets `database is
+locked`. The "production" profile switches to WAL (readers never wait on the
+writer), synchronous=NORMAL (safe under WAL; only the last commits before a
+power loss can roll back), a larger page cache and mmap window, in-memory
+temp tables and an explicit busy timeout for writers queueing on the lock.
+
+SQLITE_PROFILE picks the baseline ("production" or "default", which leaves
+SQLite's own settings alone); SQLITE_<PRAGMA> variables override single
+values. Boot reads the settings back from a live connection and keeps them
+in app.extensions["sqlite"]; `flask --app run db-profile` prints them and
+`flask --app run db-bench` measures one profile against another.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.exc import OperationalError
+
+log = logging.getLogger(__name__)
+
+PROFILES: dict[str, dict[str, object]] = {
+    "default": {},
+    "production": {
+        "journal_mode": "wal",
+        "synchronous": "normal",
+        "busy_timeout": 5000,      # ms a writer waits for the lock before failing
+        "cache_size": -65536,      # negative is KiB: 64 MiB per connection
+        "mmap_size": 268435456,    # 256 MiB of the file read through the page cache
+        "temp_store": "memory",
+    },
+}
+PRAGMAS = ("journal_mode", "synchronous", "busy_timeout", "cache_size", "mmap_size", "temp_store")
+
+# PRAGMA reads return integers for these
+_READBACK = {"synchronous": {0: "off", 1: "normal", 2: "full", 3: "extra"},
+             "temp_store": {0: "default", 1: "file", 2: "memory"}}
+
+
+def is_file_uri(uri: str) -> bool:
+    return uri.startswith("sqlite:///") and ":memory:" not in uri and uri != "sqlite://"
+
+
+def resolve(name: str | None = None, env=os.environ) -> dict[str, object]:
+    """The pragma set for profile `name`, with SQLITE_<PRAGMA> env overrides applied."""
+    name = name or env.get("SQLITE_PROFILE", "production")
+    if name not in PROFILES:
+        raise ValueError(f"Unknown SQLITE_PROFILE {name!r}. Must be one of: {', '.join(sorted(PROFILES))}")
+    pragmas = dict(PROFILES[name])
+    for pragma in PRAGMAS:
+        value = env.get(f"SQLITE_{pragma.upper()}")
+        if value:
+            pragmas[pragma] = int(value) if value.lstrip("-").isdigit() else value.lower()
+    return pragmas
+
+
+def engine_options(config: dict, env=os.environ) -> dict:
+    """Pool settings for a file database; in-memory ones keep Flask-SQLAlchemy's StaticPool."""
+    if not is_file_uri(config.get("SQLALCHEMY_DATABASE_URI", "")):
+        return {}
+    return {
+        "pool_size": int(env.get("SQLITE_POOL_SIZE", "8")),
+        "max_overflow": int(env.get("SQLITE_POOL_OVERFLOW", "8")),
+        "pool_timeout": float(env.get("SQLITE_POOL_TIMEOUT", "10")),
+        "pool_pre_ping": False,  # local file: a connection never goes away under us
+    }
+
+
+def apply(dbapi_conn, pragmas: dict[str, object]) -> None:
+    cursor = dbapi_conn.cursor()
+    try:
+        for pragma, value in pragmas.items():
+            cursor.execute(f"PRAGMA {pragma} = {value}")
+    finally:
+        cursor.close()
+
+
+def install(engine, pragmas: dict[str, object]) -> None:
+    """Run `pragmas` on every new DBAPI connection the engine opens."""
+    if not pragmas:
+        return
+
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_conn, _record):
+        apply(dbapi_conn, pragmas)
+
+
+def report(engine, profile: str | None = None) -> dict:
+    """Effective settings as read back from a pooled connection."""
+    effective = {}
+    with engine.connect() as conn:
+        for pragma in PRAGMAS:
+            value = conn.exec_driver_sql(f"PRAGMA {pragma}").scalar()
+            effective[pragma] = _READBACK.get(pragma, {}).get(value, value)
+        effective["sqlite_version"] = conn.exec_driver_sql("SELECT sqlite_version()").scalar()
+    pool = engine.pool
+    return {
+        "profile": profile or os.environ.get("SQLITE_PROFILE", "production"),
+        "pragmas": effective,
+        "pool": {"class": type(pool).__name__, "size": getattr(pool, "size", lambda: None)(),
+                 "max_overflow": getattr(pool, "_max_overflow", None)},
+    }
+
+
+# ── Benchmark ─────────────────────────────────────────────────────────────────
+
+_READ_SQL = (
+    "SELECT id, brand, title, slug, created_at FROM articles WHERE status = 'published' "
+    "ORDER BY created_at DESC, id DESC LIMIT 20"
+)
+_WRITE_SQL = (
+    "INSERT INTO articles (id, brand, title, slug, body, author, status, created_at, updated_at) "
+    "VALUES (?, 'bench', 'Bench', 'bench', 'x', '', 'draft', ?, ?)"
+)
+
+
+def _worker(engine, kind: str, deadline: float, counts: dict, lock: threading.Lock) -> None:
+    ops = errors = 0
+    latencies = []
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            with engine.begin() as conn:
+                if kind == "read":
+                    conn.exec_driver_sql(_READ_SQL).all()
+                else:
+                    now = datetime.now(timezone.utc).isoformat(sep=" ")
+                    conn.exec_driver_sql(_WRITE_SQL, (str(uuid.uuid4()), now, now))
+            ops += 1
+            latencies.append(time.perf_counter() - started)
+        except OperationalError:  # "database is locked"
+            errors += 1
+    with lock:
+        counts[kind]["ops"] += ops
+        counts[kind]["errors"] += errors
+        counts[kind]["latencies"].extend(latencies)
+
+
+def _run(path: str, profile: str, readers: int, writers: int, seconds: float) -> dict:
+    pragmas = resolve(profile)
+    engine = create_engine(f"sqlite:///{path}", pool_size=readers + writers, max_overflow=0)
+    install(engine, pragmas)
+    if pragmas.get("journal_mode") != "wal":
+        with engine.begin() as conn:  # WAL persists in the file; undo it for the baseline
+            conn.exec_driver_sql("PRAGMA journal_mode = delete")
+
+    counts = {k: {"ops": 0, "errors": 0, "latencies": []} for k in ("read", "write")}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + seconds
+    threads = [threading.Thread(target=_worker, args=(engine, "read", deadline, counts, lock)) for _ in range(readers)]
+    threads += [threading.Thread(target=_worker, args=(engine, "write", deadline, counts, lock)) for _ in range(writers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    engine.dispose()
+
+    result = {"profile": profile}
+    for kind, c in counts.items():
+        lat = sorted(c["latencies"])
+        result[kind] = {
+            "ops_per_s": round(c["ops"] / seconds, 1),
+            "errors": c["errors"],
+            "p50_ms": round(lat[len(lat) // 2] * 1000, 2) if lat else None,
+            "p99_ms": round(lat[int(len(lat) * 0.99)] * 1000, 2) if lat else None,
+        }
+    return result
+
+
+def bench(source: str, profiles=("default", "production"), readers: int = 8, writers: int = 2,
+          seconds: float = 5.0) -> list[dict]:
+    """Mixed read/write throughput per profile, each on a fresh copy of the `source` database file."""
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for profile in profiles:
+            path = os.path.join(tmp, f"{profile}.db")
+            # sqlite3's backup API copies a consistent snapshot even if the app is writing
+            with sqlite3.connect(source) as src, sqlite3.connect(path) as dst:
+                src.backup(dst)
+            src.close()
+            dst.close()
+            results.append(_run(path, profile, readers, writers, seconds))
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(path + suffix):
+                    os.remove(path + suffix)
+    return results
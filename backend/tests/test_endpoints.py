@@ -1,11 +1,17 @@
+import csv
+import io
+import json
 import os
+import socketserver
+import threading
+import zipfile
+from unittest.mock import ANY
 
 # Force in-memory SQLite for tests
 os.environ["DATABASE_URL"] = "sqlite:///:memory:"
 
-import app.services.articles as articles_mod
-import app.services.ops_domain_store as ops_store
-from app import create_app
+import app.services.feed_cache as feed_cache
+from app import create_app, migrations
 from app.db import db
 
 
@@ -15,9 +21,8 @@ def _client():
     with application.app_context():
         db.drop_all()
         db.create_all()
-        articles_mod._seeded = False
-        ops_store._seeded = False
-        ops_store.seed_ops_domains()
+        feed_cache.clear()
+        migrations.seed()
     return application.test_client()
 
 
@@ -27,6 +32,27 @@ def test_health_endpoint():
     assert res.get_json()["status"] == "ok"
 
 
+def test_sqlite_profile_applied_to_file_database(monkeypatch, tmp_path):
+    from app.config import Config
+
+    class FileConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'app.db'}"
+
+    monkeypatch.setenv("SQLITE_BUSY_TIMEOUT", "1234")
+    report = create_app(FileConfig).extensions["sqlite"]
+    assert report["pragmas"]["journal_mode"] == "wal"
+    assert report["pragmas"]["synchronous"] == "normal"
+    assert report["pragmas"]["busy_timeout"] == 1234
+    assert (report["pool"]["class"], report["pool"]["size"]) == ("QueuePool", 8)
+
+    class PlainConfig(FileConfig):
+        SQLITE_PROFILE = "default"
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'plain.db'}"
+
+    monkeypatch.delenv("SQLITE_BUSY_TIMEOUT")
+    assert create_app(PlainConfig).extensions["sqlite"]["pragmas"]["journal_mode"] == "delete"
+
+
 # --- Brands ---
 
 def test_brands_endpoint():
@@ -65,6 +91,37 @@ def test_brand_detail_not_found():
     assert res.status_code == 404
 
 
+def test_brand_counts_follow_every_write_path():
+    from datetime import datetime, timedelta, timezone
+
+    from app.services import brand_counts, scheduler
+
+    c = _client()
+    def counts():
+        return c.get("/api/v1/brands/villager").get_json()["counts"]
+
+    assert counts() == {"published": 3, "draft": 0, "scheduled": 0, "total": 3}
+    draft = c.post("/api/v1/admin/articles", json={"brand": "villager", "title": "Count Me"}).get_json()
+    assert counts() == {"published": 3, "draft": 1, "scheduled": 0, "total": 4}
+    c.patch(f"/api/v1/admin/articles/{draft['id']}", json={"status": "published"})
+    assert counts() == {"published": 4, "draft": 0, "scheduled": 0, "total": 4}
+
+    c.post("/api/v1/admin/articles/bulk", data=json.dumps({"brand": "villager", "title": "Bulk"}) + "\n")
+    due = (datetime.now(timezone.utc) - timedelta(minutes=1)).isoformat()
+    sched = c.post("/api/v1/admin/articles", json={"brand": "villager", "title": "Later"}).get_json()
+    c.patch(f"/api/v1/admin/articles/{sched['id']}", json={"status": "scheduled", "scheduled_at": due})
+    assert counts() == {"published": 4, "draft": 1, "scheduled": 1, "total": 6}
+    with c.application.app_context():
+        scheduler.publish_due()
+        assert brand_counts.verify()["ok"]
+        db.session.execute(db.text("UPDATE brand_article_counts SET n = 99"))
+        db.session.commit()
+        assert not brand_counts.verify()["ok"]
+        brand_counts.rebuild()
+        assert brand_counts.verify()["ok"]
+    assert counts() == {"published": 5, "draft": 1, "scheduled": 0, "total": 6}
+
+
 # --- Feed: basics ---
 
 def test_feed_endpoint():
@@ -101,6 +158,53 @@ def test_feed_unknown_brand():
     assert payload["articles"] == []
 
 
+def test_feed_article_by_brand_and_slug():
+    c = _client()
+    res = c.get("/api/v1/feed/articles/villager/denver-zoning-shift-approved")
+    assert res.status_code == 200
+    article = res.get_json()
+    assert (article["brand"], article["title"]) == ("villager", "Denver Zoning Shift Approved")
+    assert set(article) == {"id", "brand", "title", "slug", "body", "author", "status",
+                            "scheduled_at", "created_at", "updated_at"}
+    assert c.get(res.request.path, headers={"If-None-Match": res.headers["ETag"]}).status_code == 304
+    assert c.get(f"{res.request.path}?fields=title").get_json() == {"title": "Denver Zoning Shift Approved"}
+
+    draft = c.post("/api/v1/admin/articles", json={"brand": "villager", "title": "Hidden Draft"}).get_json()
+    assert c.get(f"/api/v1/feed/articles/villager/{draft['slug']}").status_code == 404
+    assert c.get("/api/v1/feed/articles/empire-courier/denver-zoning-shift-approved").status_code == 404
+
+
+def test_slugs_are_suffixed_within_a_brand():
+    c = _client()
+    post = lambda brand, title: c.post("/api/v1/admin/articles", json={"brand": brand, "title": title}).get_json()
+    assert post("villager", "Same Title")["slug"] == "same-title"
+    assert post("villager", "Same Title!")["slug"] == "same-title-2"
+    assert post("empire-courier", "Same Title")["slug"] == "same-title"
+    third = post("villager", "Other")
+    renamed = c.patch(f"/api/v1/admin/articles/{third['id']}", json={"title": "Same  title"}).get_json()
+    assert renamed["slug"] == "same-title-3"
+    # Re-saving under its own slug keeps it
+    again = c.patch(f"/api/v1/admin/articles/{third['id']}", json={"title": "Same Title"}).get_json()
+    assert again["slug"] == "same-title-3"
+
+
+def test_unique_slug_migration_suffixes_existing_duplicates():
+    c = _client()
+    with c.application.app_context():
+        with db.engine.begin() as conn:
+            conn.exec_driver_sql("DROP INDEX ux_articles_brand_slug")
+            conn.exec_driver_sql("DELETE FROM schema_version WHERE version >= 6")
+            conn.exec_driver_sql(
+                "UPDATE articles SET slug = 'dup' WHERE brand = 'villager'"
+            )
+        report = migrations.migrate(db.engine, target=6)
+        assert [a["name"] for a in report["applied"]] == ["articles_brand_slug_unique"]
+        migrations.migrate(db.engine)
+        with db.engine.connect() as conn:
+            slugs = conn.exec_driver_sql("SELECT slug FROM articles WHERE brand = 'villager' ORDER BY slug").scalars().all()
+    assert slugs == ["dup", "dup-2", "dup-3"]
+
+
 # --- Feed: pagination ---
 
 def test_feed_pagination_limit():
@@ -146,6 +250,366 @@ def test_feed_limit_clamped():
     assert payload["limit"] == 100
 
 
+def test_feed_cursor_walk_covers_every_article():
+    c = _client()
+    seen, cursor = [], ""
+    while True:
+        payload = c.get(f"/api/v1/feed/articles?limit=4&cursor={cursor}").get_json()
+        assert "total" not in payload
+        seen.extend(a["id"] for a in payload["articles"])
+        if not payload["has_more"]:
+            assert "next_cursor" not in payload
+            break
+        cursor = payload["next_cursor"]
+    assert len(seen) == len(set(seen)) == 6
+
+
+def test_feed_cursor_matches_offset_order():
+    c = _client()
+    by_offset = [a["id"] for a in c.get("/api/v1/feed/articles?limit=100").get_json()["articles"]]
+    first = c.get("/api/v1/feed/articles?limit=3&cursor=").get_json()
+    second = c.get(f"/api/v1/feed/articles?limit=3&cursor={first['next_cursor']}").get_json()
+    assert [a["id"] for a in first["articles"] + second["articles"]] == by_offset
+
+
+def test_feed_cursor_totals():
+    c = _client()
+    exact = c.get("/api/v1/feed/articles?cursor=&total=exact&brand=villager").get_json()
+    assert exact["total"] == 3
+    estimate = c.get("/api/v1/feed/articles?cursor=&total=estimate&brand=villager").get_json()
+    assert estimate["total_estimate"] == 3
+    assert c.get("/api/v1/feed/articles?cursor=&total=bogus").status_code == 400
+
+
+def test_estimate_cache_is_bounded(monkeypatch):
+    import app.services.pagination as pagination
+    c = _client()
+    monkeypatch.setattr(pagination, "MAX_ESTIMATES", 2)
+    for brand in ("a", "b", "c", "villager"):
+        c.get(f"/api/v1/feed/articles?cursor=&total=estimate&brand={brand}")
+    assert len(pagination._estimates) == 2
+    assert ("feed", "villager") in pagination._estimates
+
+
+def test_feed_cursor_invalid():
+    c = _client()
+    assert c.get("/api/v1/feed/articles?cursor=not-a-cursor").status_code == 400
+    assert c.get("/api/v1/feed/articles?cursor=&offset=2").status_code == 400
+
+
+# --- Feed: sparse fieldsets ---
+
+def test_feed_summary_view_drops_body():
+    c = _client()
+    c.get("/api/v1/feed/articles")  # seed first
+    c.post("/api/v1/admin/articles", json={
+        "brand": "villager", "title": "Long Read", "body": "word " * 200, "status": "published"
+    })
+    payload = c.get("/api/v1/feed/articles?brand=villager&view=summary").get_json()
+    article = next(a for a in payload["articles"] if a["title"] == "Long Read")
+    assert "body" not in article
+    assert article["excerpt"].endswith("…")
+    assert len(article["excerpt"]) <= 281
+    short = next(a for a in payload["articles"] if a["title"] != "Long Read")
+    assert not short["excerpt"].endswith("…")
+
+
+def test_feed_fields_param():
+    c = _client()
+    payload = c.get("/api/v1/feed/articles?fields=title,slug&limit=2&cursor=").get_json()
+    assert [sorted(a) for a in payload["articles"]] == [["slug", "title"], ["slug", "title"]]
+    assert payload["next_cursor"]
+
+
+def test_feed_fields_invalid():
+    c = _client()
+    assert c.get("/api/v1/feed/articles?fields=title,password").status_code == 400
+    assert c.get("/api/v1/feed/articles?view=tiny").status_code == 400
+
+
+def test_admin_list_summary_view():
+    c = _client()
+    c.post("/api/v1/admin/articles", json={"brand": "villager", "title": "Draft", "body": "Short body"})
+    payload = c.get("/api/v1/admin/articles?status=draft&view=summary").get_json()
+    assert payload["articles"][0]["excerpt"] == "Short body"
+    assert "body" not in payload["articles"][0]
+
+
+# --- Search ---
+
+def test_feed_search_ranks_and_highlights():
+    c = _client()
+    c.get("/api/v1/feed/articles")
+    c.post("/api/v1/admin/articles", json={
+        "brand": "villager", "title": "Avalanche season opens",
+        "body": "Crews <b>staged</b> near the pass.", "status": "published",
+    })
+    payload = c.get("/api/v1/feed/search?q=avalanche").get_json()
+    assert payload["count"] == 2
+    assert payload["articles"][0]["title"] == "Avalanche season opens"  # title hits outrank body hits
+    assert "<mark>" in payload["articles"][0]["snippet"] or "<mark>" in payload["articles"][1]["snippet"]
+    assert "body" not in payload["articles"][0]
+
+
+def test_feed_search_excludes_drafts_and_filters_brand():
+    c = _client()
+    c.get("/api/v1/feed/articles")
+    c.post("/api/v1/admin/articles", json={"brand": "villager", "title": "Zoning draft", "body": "x"})
+    assert c.get("/api/v1/feed/search?q=zoning").get_json()["count"] == 1
+    assert c.get("/api/v1/feed/search?q=zoning&brand=empire-courier").get_json()["count"] == 0
+    assert c.get("/api/v1/admin/articles/search?q=zoning").get_json()["count"] == 2
+    assert c.get("/api/v1/admin/articles/search?q=zoning&status=draft").get_json()["count"] == 1
+
+
+def test_search_tracks_updates_and_paginates():
+    c = _client()
+    ids = [c.post("/api/v1/admin/articles", json={"brand": "villager", "title": f"Rodeo {i}", "body": "b"})
+           .get_json()["id"] for i in range(3)]
+    c.patch(f"/api/v1/admin/articles/{ids[0]}", json={"title": "Parade"})
+    assert c.get("/api/v1/admin/articles/search?q=parade").get_json()["count"] == 1
+    first = c.get("/api/v1/admin/articles/search?q=rodeo&limit=1").get_json()
+    assert first["has_more"] is True
+    second = c.get(f"/api/v1/admin/articles/search?q=rodeo&limit=1&cursor={first['next_cursor']}").get_json()
+    assert second["has_more"] is False
+    assert {first["articles"][0]["id"], second["articles"][0]["id"]} == set(ids[1:])
+
+
+def test_filtered_search_refills_short_shortlists(monkeypatch):
+    import app.services.search as search
+    monkeypatch.setattr(search, "OVERFETCH", 0)  # every pass shortlists just limit + 1 candidates
+    c = _client()
+    for i in range(6):
+        c.post("/api/v1/admin/articles", json={"brand": "empire-courier" if i % 3 else "villager",
+                                               "title": f"Mesa {i}", "body": "b", "status": "published"})
+    seen, cursor = [], ""
+    while True:
+        page = c.get(f"/api/v1/feed/search?q=mesa&brand=villager&limit=1&cursor={cursor}").get_json()
+        seen += [a["title"] for a in page["articles"]]
+        if not page["has_more"]:
+            break
+        cursor = page["next_cursor"]
+    assert sorted(seen) == ["Mesa 0", "Mesa 3"]
+    assert all("<mark>" in a["snippet"] for a in c.get("/api/v1/feed/search?q=mesa").get_json()["articles"])
+
+
+def test_search_requires_query():
+    c = _client()
+    assert c.get("/api/v1/feed/search").status_code == 400
+    assert c.get("/api/v1/feed/search?q=%22%29%28").status_code == 400
+    assert c.get("/api/v1/feed/search?q=x&cursor=bogus").status_code == 400
+
+
+# --- Feed: home ---
+
+def test_feed_home_matches_per_brand_feeds():
+    c = _client()
+    for i in range(3):
+        c.post("/api/v1/admin/articles", json={"brand": "villager", "title": f"Home {i}", "status": "published"})
+    c.post("/api/v1/admin/articles", json={"brand": "villager", "title": "Hidden Draft"})
+
+    res = c.get("/api/v1/feed/home?limit=2&view=summary")
+    payload = res.get_json()
+    assert res.status_code == 200
+    assert [b["slug"] for b in payload["items"]] == ["empire-courier", "villager"]
+    assert payload["total"] == 9
+    for brand in payload["items"]:
+        expected = c.get(f"/api/v1/feed/articles?brand={brand['slug']}&limit=2&view=summary").get_json()
+        assert brand["articles"] == expected["articles"]
+        assert brand["counts"]["published"] == expected["total"]
+    assert payload["items"][1]["counts"]["draft"] == 1
+
+    etag = res.headers["ETag"]
+    assert c.get("/api/v1/feed/home?limit=2&view=summary", headers={"If-None-Match": etag}).status_code == 304
+    c.post("/api/v1/admin/articles", json={"brand": "villager", "title": "Fresh", "status": "published"})
+    fresh = c.get("/api/v1/feed/home?limit=2&view=summary", headers={"If-None-Match": etag})
+    assert fresh.status_code == 200
+    assert fresh.get_json()["items"][1]["articles"][0]["title"] == "Fresh"
+
+    # Drafts don't invalidate cached feed pages, but the counts still follow them
+    c.post("/api/v1/admin/articles", json={"brand": "villager", "title": "Second Draft"})
+    again = c.get("/api/v1/feed/home?limit=2&view=summary").get_json()
+    assert again["items"][1]["counts"]["draft"] == 2
+    assert again["items"][1]["articles"][0]["title"] == "Fresh"
+    assert c.get("/api/v1/feed/home?limit=x").status_code == 400
+
+
+# --- Feed: cache ---
+
+def test_feed_cache_hits_on_repeat():
+    c = _client()
+    c.get("/api/v1/feed/articles?brand=villager")
+    c.get("/api/v1/feed/articles?brand=villager")
+    stats = c.get("/api/v1/admin/cache/feed").get_json()
+    assert stats["misses"] == 1
+    assert stats["hits"] == 1
+    assert stats["entries"] == 1
+
+
+def test_feed_cache_draft_write_keeps_entries():
+    c = _client()
+    c.get("/api/v1/feed/articles?brand=villager")
+    c.post("/api/v1/admin/articles", json={"brand": "villager", "title": "Quiet Draft", "body": "B"})
+    assert c.get("/api/v1/admin/cache/feed").get_json()["entries"] == 1
+
+
+def test_feed_cache_publish_invalidates_only_that_brand():
+    c = _client()
+    c.get("/api/v1/feed/articles?brand=villager")
+    c.get("/api/v1/feed/articles?brand=empire-courier")
+    c.get("/api/v1/feed/articles")
+    c.post("/api/v1/admin/articles", json={
+        "brand": "villager", "title": "Fresh Story", "body": "B", "status": "published"
+    })
+    assert c.get("/api/v1/admin/cache/feed").get_json()["entries"] == 1
+    titles = [a["title"] for a in c.get("/api/v1/feed/articles?brand=villager").get_json()["articles"]]
+    assert "Fresh Story" in titles
+
+
+# --- Conditional GET ---
+
+def test_brands_etag_revalidates_with_304():
+    c = _client()
+    first = c.get("/api/v1/brands")
+    etag = first.headers["ETag"]
+    assert first.headers["Last-Modified"]
+    again = c.get("/api/v1/brands", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.data == b""
+    assert again.headers["ETag"] == etag
+
+
+def test_feed_etag_changes_after_publish():
+    c = _client()
+    url = "/api/v1/feed/articles?brand=villager"
+    etag = c.get(url).headers["ETag"]
+    assert c.get(url, headers={"If-None-Match": etag}).status_code == 304
+    assert c.get("/api/v1/feed/articles?brand=empire-courier").headers["ETag"] != etag
+    c.post("/api/v1/admin/articles", json={
+        "brand": "villager", "title": "Breaking", "body": "B", "status": "published"
+    })
+    res = c.get(url, headers={"If-None-Match": etag})
+    assert res.status_code == 200
+    assert res.headers["ETag"] != etag
+
+
+def test_feed_etag_sees_writes_from_other_workers():
+    c = _client()
+    url = "/api/v1/feed/articles?brand=villager"
+    first = c.get(url)
+    with c.application.app_context():
+        # Another worker deletes the oldest article: no in-process hook runs and max(updated_at) holds
+        db.session.execute(db.text(
+            "DELETE FROM articles WHERE id = (SELECT id FROM articles WHERE brand = 'villager' ORDER BY updated_at LIMIT 1)"
+        ))
+        db.session.commit()
+    res = c.get(url, headers={"If-None-Match": first.headers["ETag"]})
+    assert res.status_code == 200
+    assert res.headers["Last-Modified"] == first.headers["Last-Modified"]
+    assert res.headers["ETag"] != first.headers["ETag"]
+
+
+def test_feed_if_modified_since():
+    c = _client()
+    url = "/api/v1/feed/articles"
+    last_modified = c.get(url).headers["Last-Modified"]
+    assert c.get(url, headers={"If-Modified-Since": last_modified}).status_code == 304
+    assert c.get(url, headers={"If-Modified-Since": "Thu, 01 Jan 2015 00:00:00 GMT"}).status_code == 200
+
+
+def test_kits_etag():
+    c = _client()
+    etag = c.get("/api/v1/kits").headers["ETag"]
+    assert c.get("/api/v1/kits", headers={"If-None-Match": etag}).status_code == 304
+
+
+# --- Column-tuple list serialization ---
+
+def test_list_responses_match_orm_to_dict_bytes():
+    from app.models import Article, Invoice
+    from app.services.article_fields import query_options, serialize
+
+    c = _client()
+    c.post("/api/v1/admin/articles", json={
+        "brand": "villager", "title": "Caf\u00e9 \"quotes\" & <tags>", "body": "line\nbreak \u2014 \U0001F600 " * 40,
+        "author": "J\u00fcrgen", "status": "published",
+    })
+    c.post("/api/v1/billing/invoices", json={"client": "Caf\u00e9", "lineCount": 3, "runs": 2, "firstLineRate": 0.1})
+    c.post("/api/v1/billing/invoices", json={"client": "Plain", "isArapahoeCounty": True, "notes": "x"})
+
+    def expected(obj):
+        return (json.dumps(obj, sort_keys=True, separators=(",", ":")) + "\n").encode()
+
+    with c.application.app_context():
+        ordered = Article.query.filter_by(status="published").order_by(Article.created_at.desc(), Article.id.desc())
+        invoices = [i.to_dict() for i in Invoice.query.order_by(Invoice.created_at.desc())]
+        for query, fields in (("", None), ("&view=summary", ("id", "brand", "title", "slug", "excerpt", "author",
+                              "status", "scheduled_at", "created_at", "updated_at")), ("&fields=excerpt,title", ("excerpt", "title"))):
+            articles = [serialize(a, fields) for a in ordered.options(*query_options(fields))]
+            body = {"total": len(articles), "count": len(articles), "limit": 20, "offset": 0,
+                    "has_more": False, "articles": articles}
+            assert c.get(f"/api/v1/feed/articles?limit=20{query}").data == expected(body)
+
+    assert c.get("/api/v1/billing/invoices").data == expected({"invoices": invoices, "total": 2})
+
+
+def test_row_bench_reports_both_paths():
+    c = _client()
+    out = c.application.test_cli_runner().invoke(args=["row-bench", "--rounds", "2"])
+    assert out.exit_code == 0, out.output
+    results = [json.loads(line) for line in out.output.splitlines()]
+    assert [r["view"] for r in results] == ["full", "summary"]
+    assert all(r["rows"] and r["orm_rows_per_s"] > 0 and r["row_json_rows_per_s"] > 0 for r in results)
+
+
+# --- Markdown rendering ---
+
+def test_body_html_is_opt_in_and_sanitized():
+    c = _client()
+    body = "# Heading\n\n<script>alert(1)</script> **bold** [bad](javascript:alert(1)) [ok](https://x.test)"
+    created = c.post("/api/v1/admin/articles", json={
+        "brand": "villager", "title": "Rendered", "body": body, "status": "published",
+    }).get_json()
+    assert "body_html" not in created
+
+    html = c.get(f"/api/v1/admin/articles/{created['id']}?fields=title,body_html").get_json()["body_html"]
+    assert "<h1>Heading</h1>" in html and "<strong>bold</strong>" in html
+    assert "<script>" not in html and "&lt;script&gt;" in html
+    assert "javascript:" not in html and 'href="https://x.test"' in html
+
+    feed = c.get("/api/v1/feed/articles?brand=villager&fields=id,body_html").get_json()["articles"]
+    assert next(a for a in feed if a["id"] == created["id"])["body_html"] == html
+    assert "body_html" not in c.get("/api/v1/feed/articles?brand=villager").get_json()["articles"][0]
+    assert c.get("/api/v1/admin/articles/missing").status_code == 404
+
+
+def test_render_cache_persists_and_sweeps_on_renderer_change(monkeypatch):
+    import app.services.article_render as article_render
+    from app.models import ArticleRender
+
+    c = _client()
+    article_render.clear()
+    created = c.post("/api/v1/admin/articles", json={"brand": "villager", "title": "Cached", "body": "*one*"}).get_json()
+    c.get(f"/api/v1/admin/articles/{created['id']}?fields=body_html")
+    stats = c.get("/api/v1/admin/cache/render").get_json()
+    assert (stats["rendered"], stats["hits"]) == (1, 1)
+
+    with c.application.app_context():
+        article_render.clear()  # a fresh worker finds the stored render instead of re-rendering
+        assert article_render.render("*one*") == "<p><em>one</em></p>"
+        assert (article_render.stats()["stored"], article_render.stats()["rendered"]) == (1, 0)
+        # Reads render what is missing in memory only: no write on a GET
+        before = ArticleRender.query.count()
+        assert article_render.render("*two*") == "<p><em>two</em></p>"
+        assert ArticleRender.query.count() == before
+
+        monkeypatch.setattr(article_render, "RENDERER", "next-renderer")
+        assert article_render.is_stale()
+        report = article_render.sweep()
+        assert report["dropped_stale"] == 1 and report["rendered"] == report["bodies"]
+        assert not article_render.is_stale()
+        assert ArticleRender.query.count() == report["bodies"]
+
+
 # --- Admin: CRUD ---
 
 def test_admin_create_article():
@@ -197,6 +661,18 @@ def test_admin_list_filter_brand():
     assert all(a["brand"] == "villager" for a in payload["articles"])
 
 
+def test_admin_list_cursor_with_status_filter():
+    c = _client()
+    for i in range(3):
+        c.post("/api/v1/admin/articles", json={"brand": "villager", "title": f"Draft {i}", "body": "B"})
+    first = c.get("/api/v1/admin/articles?status=draft&limit=2&cursor=").get_json()
+    assert first["count"] == 2 and first["has_more"] is True
+    rest = c.get(f"/api/v1/admin/articles?status=draft&limit=2&cursor={first['next_cursor']}").get_json()
+    assert rest["count"] == 1 and rest["has_more"] is False
+    titles = {a["title"] for a in first["articles"] + rest["articles"]}
+    assert titles == {"Draft 0", "Draft 1", "Draft 2"}
+
+
 def test_admin_patch_status():
     c = _client()
     create_res = c.post("/api/v1/admin/articles", json={
@@ -249,6 +725,621 @@ def test_draft_to_published_appears_in_feed():
     assert "Integration Test Article" in feed_titles
 
 
+# --- Static brand sites ---
+
+def _static_sites(monkeypatch, tmp_path):
+    import app.services.site_generator as site_generator
+    monkeypatch.setattr(site_generator, "SITES_ROOT", tmp_path)
+    monkeypatch.setattr(site_generator, "SITES_ENABLED", True)
+    monkeypatch.setattr(site_generator, "PAGE_SIZE", 2)
+    return site_generator
+
+
+def test_static_site_full_build(monkeypatch, tmp_path):
+    site_generator = _static_sites(monkeypatch, tmp_path)
+    application = _client().application
+    with application.app_context():
+        report = site_generator.build_brand("villager")
+    assert report["articles"] == 3
+    assert report["pages"] == 2
+    root = tmp_path / "villager"
+    for name in ("index.html", "rss.xml", "atom.xml", "feed.json", "sitemap.xml", "sitemap-1.xml",
+                 "page/1/index.html", "page/2/index.html",
+                 "articles/cherry-creek-schools-bond/index.html"):
+        assert (root / name).is_file(), name
+    assert "Cherry Creek Schools Bond Measure" in (root / "rss.xml").read_text()
+    assert (root / "sitemap-1.xml").read_text().count("<url>") == 3
+
+
+def test_static_site_publish_touches_only_tail(monkeypatch, tmp_path):
+    site_generator = _static_sites(monkeypatch, tmp_path)
+    c = _client()
+    with c.application.app_context():
+        site_generator.build_brand("villager")
+    root = tmp_path / "villager"
+    first_page = (root / "page/1/index.html").stat().st_mtime_ns
+
+    res = c.post("/api/v1/admin/articles", json={
+        "brand": "villager", "title": "Static Scoop", "body": "Fresh.", "status": "published"
+    })
+    assert res.status_code == 201
+    assert (root / "page/1/index.html").stat().st_mtime_ns == first_page
+    assert "Static Scoop" in (root / "page/2/index.html").read_text()
+    assert "Static Scoop" in (root / "index.html").read_text()
+    assert json.loads((root / "feed.json").read_text())["items"][0]["title"] == "Static Scoop"
+    assert (root / "articles/static-scoop/index.html").is_file()
+
+    c.patch(f"/api/v1/admin/articles/{res.get_json()['id']}", json={"status": "draft"})
+    assert not (root / "articles/static-scoop").exists()
+    assert "Static Scoop" not in (root / "index.html").read_text()
+
+
+# --- Bulk ingest ---
+
+def test_bulk_ingest_upserts_and_reports_lines(monkeypatch):
+    import app.services.article_ingest as article_ingest
+    monkeypatch.setattr(article_ingest, "CHUNK_SIZE", 2)
+    c = _client()
+    existing = c.post("/api/v1/admin/articles", json={"brand": "villager", "title": "Old Story", "body": "v1"}).get_json()
+    lines = [
+        {"brand": "villager", "title": "Old Story", "body": "v2", "status": "published"},
+        {"brand": "villager", "title": "Archive One", "created_at": "2001-05-01T12:00:00Z"},
+        "not json",
+        {"brand": "villager"},
+        {"brand": "empire-courier", "title": "Archive Two", "status": "bogus"},
+        {"brand": "empire-courier", "title": "Archive Three", "slug": "custom-slug"},
+    ]
+    body = "\n".join(l if isinstance(l, str) else json.dumps(l) for l in lines) + "\n\n"
+    res = c.post("/api/v1/admin/articles/bulk", data=body, content_type="application/x-ndjson")
+    summary = res.get_json()
+    assert res.status_code == 200
+    assert (summary["lines"], summary["created"], summary["updated"], summary["failed"]) == (6, 2, 1, 3)
+    assert [e["line"] for e in summary["errors"]] == [3, 4, 5]
+    assert summary["errors"][1]["error"] == "brand and title are required"
+
+    updated = c.get("/api/v1/admin/articles?brand=villager&limit=100").get_json()["articles"]
+    old = next(a for a in updated if a["id"] == existing["id"])
+    assert (old["body"], old["status"]) == ("v2", "published")
+    archived = next(a for a in updated if a["title"] == "Archive One")
+    assert archived["created_at"].startswith("2001-05-01T12:00:00")
+    assert c.get("/api/v1/admin/articles/search?q=custom").get_json()["count"] == 0
+    assert c.get("/api/v1/admin/articles/search?q=archive").get_json()["count"] == 2
+
+
+def test_bulk_ingest_updates_only_supplied_keys():
+    c = _client()
+
+    def ingest(*lines):
+        body = "\n".join(json.dumps(l) for l in lines)
+        return c.post("/api/v1/admin/articles/bulk", data=body, content_type="application/x-ndjson").get_json()
+
+    ingest({"brand": "villager", "title": "Hello X", "body": "a", "author": "Ann", "status": "published"})
+    summary = ingest({"brand": "villager", "title": "Hello X", "body": "b"},
+                     {"brand": "villager", "title": "Hello X", "author": "Bo"})
+    assert (summary["lines"], summary["created"], summary["updated"], summary["superseded"], summary["failed"]) == (2, 0, 1, 1, 0)
+
+    article = next(a for a in c.get("/api/v1/feed/articles?brand=villager&limit=100").get_json()["articles"]
+                   if a["title"] == "Hello X")
+    assert (article["status"], article["body"], article["author"]) == ("published", "b", "Bo")
+
+
+# --- Streaming export ---
+
+def test_export_articles_ndjson_and_csv():
+    c = _client()
+    c.get("/api/v1/feed/articles")
+    c.post("/api/v1/admin/articles", json={"brand": "villager", "title": "Quote, \"Comma\"", "body": "x"})
+    listed = c.get("/api/v1/admin/articles?brand=villager&limit=100").get_json()["articles"]
+
+    res = c.get("/api/v1/admin/articles/export?brand=villager")
+    assert res.mimetype == "application/x-ndjson"
+    assert 'filename="articles.ndjson"' in res.headers["Content-Disposition"]
+    assert [json.loads(line) for line in res.get_data(as_text=True).splitlines()] == listed
+
+    res = c.get("/api/v1/admin/articles/export?brand=villager&format=csv&fields=id,title,status")
+    assert res.mimetype == "text/csv"
+    rows = list(csv.reader(io.StringIO(res.get_data(as_text=True))))
+    assert rows[0] == ["id", "title", "status"]
+    assert rows[1:] == [[a["id"], a["title"], a["status"]] for a in listed]
+
+    assert c.get("/api/v1/admin/articles/export?format=xml").status_code == 400
+    assert c.get("/api/v1/admin/articles/export?status=bogus").status_code == 400
+
+
+def test_export_invoices_matches_list_filters():
+    c = _client()
+    c.post("/api/v1/billing/invoices", json={"client": "Acme 100% Co", "email": "a@acme.test"})
+    c.post("/api/v1/billing/invoices", json={"client": "Other", "description": "ACME reprint"})
+    c.post("/api/v1/billing/invoices", json={"client": "Unrelated"})
+
+    listed = c.get("/api/v1/billing/invoices?q=acme").get_json()["invoices"]
+    assert len(listed) == 2
+    assert c.get("/api/v1/billing/invoices?q=100%25").get_json()["total"] == 1
+
+    res = c.get("/api/v1/billing/invoices/export?q=acme")
+    assert [json.loads(line) for line in res.get_data(as_text=True).splitlines()] == listed
+
+    rows = list(csv.DictReader(io.StringIO(
+        c.get("/api/v1/billing/invoices/export?format=csv&status=draft").get_data(as_text=True)
+    )))
+    assert len(rows) == 3
+    assert rows[0]["isArapahoeCounty"] == "False"
+
+
+def test_invoice_search_date_filters_and_cursor_pages():
+    c = _client()
+    for i in range(5):
+        c.post("/api/v1/billing/invoices", json={"client": f"Client {i}", "date": f"2026-03-0{i + 1}",
+                                                 "lineCount": i + 1, "notes": "Rush order" if i % 2 else ""})
+    created = c.post("/api/v1/billing/invoices", json={"client": "Zed", "date": "2026-04-01"}).get_json()
+    c.patch(f"/api/v1/billing/invoices/{created['id']}", json={"notes": "rushed reprint"})
+
+    assert [i["client"] for i in c.get("/api/v1/billing/invoices?q=rus").get_json()["invoices"]] == \
+        ["Zed", "Client 3", "Client 1"]
+
+    seen, cursor = [], ""
+    while True:
+        page = c.get(f"/api/v1/billing/invoices?sort=amount&limit=2&from=2026-03-02&cursor={cursor}").get_json()
+        assert page["count"] <= 2 and page["sort"] == "amount"
+        seen += [i["client"] for i in page["invoices"]]
+        if not page["has_more"]:
+            break
+        cursor = page["next_cursor"]
+    assert seen == ["Zed", "Client 1", "Client 2", "Client 3", "Client 4"]
+
+    page = c.get("/api/v1/billing/invoices?to=2026-03-03&limit=1&total=exact").get_json()
+    assert page["total"] == 3 and page["invoices"][0]["client"] == "Client 2"
+    assert c.get("/api/v1/billing/invoices?sort=-date&cursor=" + page["next_cursor"]).status_code == 400
+    assert c.get("/api/v1/billing/invoices?sort=bogus").status_code == 400
+    assert c.get("/api/v1/billing/invoices?from=March").status_code == 400
+
+
+def test_quote_prices_a_batch_from_rate_cards(monkeypatch):
+    from app.services import pricing
+
+    monkeypatch.setitem(pricing.RATE_CARDS, "Legal Weekly", {
+        "firstLineRate": 0.5, "additionalLineRate": 0.4, "originationFee": 20.0, "columnWidth": 10,
+        "arapahoe": {"originationFee": 15.0},
+    })
+    assert pricing.count_lines("Garage sale Saturday\nEverything must go", 10) == 5
+    assert pricing.count_lines("x" * 25, 10) == 3
+
+    c = _client()
+    ads = [
+        {"lineCount": 4, "runDates": ["2026-05-01", "2026-05-08"]},
+        {"publication": "Legal Weekly", "text": "Notice of hearing on petition", "runs": 3},
+        {"publication": "Legal Weekly", "isArapahoeCounty": True, "lineCount": 1},
+        {"publication": "Nowhere Gazette"},
+        {"lineCount": 0},
+    ]
+    res = c.post("/api/v1/billing/quote", json={"ads": ads}).get_json()
+    quotes = res["quotes"]
+    created = c.post("/api/v1/billing/invoices", json={"client": "Same", **ads[0]}).get_json()
+    assert quotes[0]["amount"] == created["amount"] == round(25.0 + 2 * 0.43 + 2 * 3 * 0.38, 2)
+    assert (quotes[1]["lineCount"], quotes[1]["lineCountDerived"]) == (3, True)
+    assert quotes[1]["amount"] == round(20.0 + 3 * 0.5 + 3 * 2 * 0.4, 2)
+    assert quotes[2]["amount"] == 15.5
+    assert [q.get("error") for q in quotes[3:]] == ["no rate card for publication 'Nowhere Gazette'",
+                                                     "lineCount must be at least 1"]
+    assert (res["failed"], res["total"]) == (2, round(sum(q["amount"] for q in quotes[:3]), 2))
+    assert c.post("/api/v1/billing/quote", json={"ads": "x"}).status_code == 400
+
+
+def test_invoice_import_prices_like_create_and_reports_bad_rows(monkeypatch):
+    c = _client()
+    single = c.post("/api/v1/billing/invoices", json={
+        "client": "Ref", "lineCount": 4, "runDates": ["2026-05-01", "2026-05-08"], "originationFee": 10,
+    }).get_json()
+    body = (
+        "client,email,lineCount,runDates,originationFee,isArapahoeCounty,date\n"
+        "Notice 1,n1@x.test,4,2026-05-01;2026-05-08,10,yes,2026-05-01\n"
+        ",missing@x.test,1,,,,\n"
+        "Notice 2,,two,,,,\n"
+        "Notice 3,,1,,,maybe,\n"
+        "Notice 4,,1,,,,2026-13-01\n"
+        "Notice 5,,2,,,,\n"
+    )
+    dry = c.post("/api/v1/billing/invoices/import?dry_run=1", data=body, content_type="text/csv").get_json()
+    assert (dry["valid"], dry["created"], c.get("/api/v1/billing/invoices").get_json()["total"]) == (2, 0, 1)
+
+    report = c.post("/api/v1/billing/invoices/import", data=body, content_type="text/csv").get_json()
+    assert (report["rows"], report["created"], report["failed"]) == (6, 2, 4)
+    assert [(e["line"], e["error"]) for e in report["errors"]] == [
+        (3, "client is required"), (4, "lineCount must be an integer"),
+        (5, "isArapahoeCounty must be true or false"), (6, "date must be YYYY-MM-DD dates"),
+    ]
+    imported = c.get("/api/v1/billing/invoices?q=notice&sort=client").get_json()["invoices"]
+    assert imported[0]["amount"] == single["amount"] and imported[0]["isArapahoeCounty"] is True
+    assert report["amount_total"] == round(single["amount"] + imported[1]["amount"], 2)
+    assert c.post("/api/v1/billing/invoices/import?format=xml", data="").status_code == 400
+
+    c, fake, sheet, _ = _sheets_client(monkeypatch)
+    ndjson = "".join(json.dumps({"client": f"Ad {i}", "lineCount": 3}) + "\n" for i in range(300))
+    assert c.post("/api/v1/billing/invoices/import", data=ndjson).get_json()["created"] == 300
+    assert (fake.calls["append_rows"], len(fake.values), sheet.pending()) == (1, 304, 0)
+
+    def refuse():
+        raise _QuotaError("rate limited")
+
+    fake.before_append = refuse
+    report = c.post("/api/v1/billing/invoices/import", data="".join(ndjson.splitlines(keepends=True)[:5])).get_json()
+    assert (report["created"], report["queued"], report["failed"]) == (0, 5, 0)
+    fake.before_append = None
+    sheet.flush()  # what the background flusher does next
+    assert (len(fake.values), sheet.pending()) == (309, 0)
+
+
+# --- Billing: Google Sheets backend ---
+
+def test_invoice_documents_are_cached_by_version_and_zipped():
+    import app.services.invoice_render as invoice_render
+    c = _client()
+    invoice_render.clear()
+    ids = [c.post("/api/v1/billing/invoices", json={"client": f"Clerk {d}", "date": d}).get_json()["id"]
+           for d in ("2026-03-02", "2026-03-20", "2026-04-01")]
+
+    res = c.get(f"/api/v1/billing/pdf/{ids[0]}")
+    assert res.status_code == 200 and "Clerk 2026-03-02" in res.get_data(as_text=True)
+    etag, versioned = res.headers["ETag"], res.headers["Content-Location"]
+    assert "no-cache" in res.headers["Cache-Control"]
+    assert c.get(f"/api/v1/billing/pdf/{ids[0]}", headers={"If-None-Match": etag}).status_code == 304
+    res = c.get(versioned)
+    assert res.status_code == 200 and "immutable" in res.headers["Cache-Control"]
+    assert invoice_render.stats()["rendered"] == 1 and invoice_render.stats()["hits"] == 1
+
+    # An edit moves the document to a new version; the old URL redirects to it
+    c.patch(f"/api/v1/billing/invoices/{ids[0]}", json={"client": "Renamed"})
+    assert c.get(versioned).status_code == 302
+    assert "Renamed" in c.get(f"/api/v1/billing/pdf/{ids[0]}").get_data(as_text=True)
+    assert invoice_render.stats()["rendered"] == 2
+
+    res = c.get("/api/v1/billing/invoices/export.zip?from=2026-03-01&to=2026-03-31")
+    assert res.mimetype == "application/zip"
+    assert 'filename="invoices-2026-03-01-2026-03-31.zip"' in res.headers["Content-Disposition"]
+    with zipfile.ZipFile(io.BytesIO(res.data)) as archive:
+        names = archive.namelist()
+        assert names == [f"2026-03-02/invoice-{ids[0]}.html", f"2026-03-20/invoice-{ids[1]}.html"]
+        assert "Renamed" in archive.read(names[0]).decode()
+    assert c.get("/api/v1/billing/invoices/export.zip?from=March").status_code == 400
+
+
+def test_billing_reports_roll_up_revenue_and_aging(monkeypatch):
+    from app.services import invoice_reports
+    c = _client()
+    specs = [("2026-01-10", "Register-Call", "Legal Notice", 2), ("2026-01-25", "The Villager", "Classified Ad", 1),
+             ("2026-03-01", "Register-Call", "Classified Ad", 4), ("2026-04-20", "Register-Call", "Legal Notice", 1)]
+    ids = [c.post("/api/v1/billing/invoices", json={"client": "R", "date": d, "publication": p, "type": t,
+                                                   "lineCount": n}).get_json()["id"] for d, p, t, n in specs]
+    c.patch(f"/api/v1/billing/invoices/{ids[0]}", json={"status": "paid", "paidDate": "2026-02-09"})
+    c.patch(f"/api/v1/billing/invoices/{ids[1]}", json={"status": "sent"})
+    c.patch(f"/api/v1/billing/invoices/{ids[2]}", json={"status": "sent", "amount": 100.0})
+
+    report = c.get("/api/v1/billing/reports?as_of=2026-04-30").get_json()
+    listed = c.get("/api/v1/billing/invoices").get_json()["invoices"]
+    assert report["totals"]["count"] == 4
+    assert report["totals"]["amount"] == round(sum(i["amount"] for i in listed), 2)
+    assert [(m["month"], m["count"]) for m in report["by_month"]] == [("2026-01", 2), ("2026-03", 1), ("2026-04", 1)]
+    assert {r["status"]: r["count"] for r in report["by_status"]} == {"draft": 1, "paid": 1, "sent": 2}
+    assert {r["publication"]: r["count"] for r in report["by_publication"]} == {"Register-Call": 3, "The Villager": 1}
+    # Outstanding = sent invoices, aged from their date: 2026-03-01 is 60 days old, 2026-01-25 is 95
+    assert report["aging"] == [{"bucket": "0-30", "count": 0, "amount": 0}, {"bucket": "31-60", "count": 1, "amount": 100.0},
+                               {"bucket": "61-90", "count": 0, "amount": 0}, {"bucket": "90+", "count": 1, "amount": 25.43}]
+    assert report["totals"]["outstanding"] == 125.43
+    assert report["days_to_pay"] == {"paid": 1, "average": 30.0}
+
+    ranged = c.get("/api/v1/billing/reports?from=2026-03-01&to=2026-03-31").get_json()
+    assert ranged["totals"] == {"count": 1, "amount": 100.0, "paid": 0, "outstanding": 100.0}
+    assert c.get("/api/v1/billing/reports?from=soon").status_code == 400
+    with c.application.app_context():
+        assert invoice_reports.verify()["ok"]
+
+    c, *_ = _sheets_client(monkeypatch)
+    assert c.get("/api/v1/billing/reports").get_json()["totals"] == {"count": 3, "amount": 37.5, "paid": 0, "outstanding": 37.5}
+
+
+class _QuotaError(Exception):
+    code = 429
+
+
+class _FakeSheet:
+    """Spreadsheet + worksheet stand-in that counts API calls."""
+
+    def __init__(self, rows):
+        self.values = [list(r) for r in rows]
+        self.revision = 1
+        self.fail_next = 0
+        self.before_append = None
+        self.calls = {"get_all_values": 0, "get_lastUpdateTime": 0, "batch_update": 0, "append_rows": 0}
+
+    def get_lastUpdateTime(self):
+        self.calls["get_lastUpdateTime"] += 1
+        return str(self.revision)
+
+    def get_all_values(self):
+        self.calls["get_all_values"] += 1
+        return [list(r) for r in self.values]
+
+    def append_rows(self, rows):
+        self.calls["append_rows"] += 1
+        if self.before_append:
+            self.before_append()
+        self.values.extend([str(v) for v in row] for row in rows)
+        self.revision += 1
+
+    def batch_update(self, data, raw=True):
+        self.calls["batch_update"] += 1
+        if self.fail_next:
+            self.fail_next -= 1
+            raise _QuotaError("rate limited")
+        from gspread.utils import a1_to_rowcol
+        for item in data:
+            row, col = a1_to_rowcol(item["range"])
+            self.values[row - 1][col - 1] = str(item["values"][0][0])
+        self.revision += 1
+
+
+def _sheets_client(monkeypatch, mode="primary"):
+    import app.services.billing_store as billing_store
+    import app.services.sheets_client as sheets_client
+
+    typed = {"amount": "12.5", "lineCount": "2", "runs": "1", "firstLineRate": "0.43", "additionalLineRate": "0.38",
+             "originationFee": "25.0", "isArapahoeCounty": "False", "runDates": "[]",
+             "created_at": "2026-01-01T00:00:00+00:00", "updated_at": "2026-01-01T00:00:00+00:00"}
+    rows = [billing_store.COLUMNS] + [
+        [f"inv-{i}" if c == "id" else typed.get(c, f"{c}{i}") for c in billing_store.COLUMNS]
+        for i in range(3)
+    ]
+    fake = _FakeSheet(rows)
+    sleeps = []
+    monkeypatch.setattr(sheets_client, "_sleep", sleeps.append)
+    monkeypatch.setattr(sheets_client, "_bucket", sheets_client.TokenBucket(0, 1))  # unmetered
+    monkeypatch.setattr(billing_store, "MODE", mode)
+    monkeypatch.setattr(billing_store, "_sheets_configured", lambda: True)
+    # A flush interval no test will reach: writes stay staged until flush() is called
+    sheet = sheets_client.SheetCache(lambda: (fake, fake), ttl=60, flush_interval=3600, raw=mode == "mirror")
+    monkeypatch.setattr(sheets_client.SheetCache, "_flush_loop", lambda self: None)
+    monkeypatch.setattr(billing_store, "_sheet", sheet)
+    return _client(), fake, sheet, sleeps
+
+
+def test_sheets_reads_come_from_an_indexed_snapshot(monkeypatch):
+    c, fake, sheet, _ = _sheets_client(monkeypatch)
+    listed = c.get("/api/v1/billing/invoices").get_json()
+    assert listed["total"] == 3 and listed["invoices"][0]["amount"] == 12.5
+    assert c.get("/api/v1/billing/pdf/inv-2").status_code == 200
+    assert c.get("/api/v1/billing/pdf/missing").status_code == 404
+    assert fake.calls["get_all_values"] == 1  # one download serves the list and every lookup
+    assert sheet.stats()["opens"] == 1
+
+    # A cell edited by hand leaves updated_at alone but still changes the document and its version
+    import app.services.billing_store as billing_store
+    before = c.get("/api/v1/billing/pdf/inv-2")
+    fake.values[3][billing_store.COLUMNS.index("amount")] = "99.5"
+    fake.revision += 1
+    sheet.refresh()
+    after = c.get("/api/v1/billing/pdf/inv-2")
+    assert after.headers["ETag"] != before.headers["ETag"] and "$99.5" in after.get_data(as_text=True)
+
+
+def test_sheets_writes_are_coalesced_and_retried(monkeypatch):
+    import app.services.billing_store as billing_store
+
+    c, fake, sheet, sleeps = _sheets_client(monkeypatch)
+    created = c.post("/api/v1/billing/invoices", json={"client": "New"}).get_json()
+    c.patch("/api/v1/billing/invoices/inv-1", json={"status": "sent", "emailSent": "2026-01-01"})
+    c.patch("/api/v1/billing/invoices/inv-1", json={"stripeLink": "https://pay.test/x"})
+    c.patch(f"/api/v1/billing/invoices/{created['id']}", json={"notes": "rush"})
+    # Reads see staged writes before anything is sent
+    assert billing_store.get_invoice("inv-1")["stripeLink"] == "https://pay.test/x"
+    assert (fake.calls["batch_update"], fake.calls["append_rows"], sheet.pending()) == (0, 0, 2)
+
+    fake.fail_next = 1
+    assert sheet.flush()["cells"] == 4  # status, emailSent, stripeLink, updated_at
+    assert (fake.calls["batch_update"], fake.calls["append_rows"]) == (2, 1)
+    assert len(sleeps) == 1 and sleeps[0] <= 1.0
+
+    col = billing_store.COLUMNS.index
+    assert [fake.values[2][col(k)] for k in ("status", "emailSent", "stripeLink")] == \
+        ["sent", "2026-01-01", "https://pay.test/x"]
+    assert (fake.values[-1][col("client")], fake.values[-1][col("notes")]) == ("New", "rush")
+    # The flush adopted the revision it produced, so the snapshot is not reloaded for it
+    assert sheet.stats()["revision"] == str(fake.revision)
+
+
+def test_sheets_flush_keeps_the_snapshot_whole(monkeypatch):
+    import app.services.billing_store as billing_store
+
+    _, fake, sheet, _ = _sheets_client(monkeypatch)
+    # Cold start: a create is the process's first Sheets operation
+    sheet.stage_append(billing_store.new_record({"client": "First"}))
+    sheet.flush()
+    assert len(sheet.records()) == 4 and sheet.find("inv-0") is not None
+
+    # A reader reloading while the append is on the wire still sees the new row
+    created = billing_store.new_record({"client": "Mid-flight"})
+    sheet.stage_append(created)
+    fake.before_append = sheet.refresh
+    sheet.flush()
+    fake.before_append = None
+    assert sheet.find(created["id"]) is not None
+    assert len(sheet.records()) == 5 and sheet.find(created["id"])[0] == 6
+
+
+def test_sheets_mirror_replicates_local_writes(monkeypatch):
+    import app.services.billing_replication as replication
+    import app.services.billing_store as billing_store
+
+    c, fake, sheet, _ = _sheets_client(monkeypatch, mode="mirror")
+    with c.application.app_context():
+        assert replication.import_sheet()["imported"] == 3
+    reads = fake.calls["get_all_values"]
+    created = c.post("/api/v1/billing/invoices", json={"client": "Local"}).get_json()
+    c.patch(f"/api/v1/billing/invoices/{created['id']}", json={"notes": "first"})
+    c.patch("/api/v1/billing/invoices/inv-1", json={"status": "paid"})
+    assert c.get("/api/v1/billing/invoices?q=local").get_json()["total"] == 1
+    assert fake.calls["get_all_values"] == reads  # reads and writes never touched the sheet
+    assert c.get("/api/v1/billing/replication").get_json()["queued"] == 2
+
+    with c.application.app_context():
+        pushed = replication.drain()
+        assert [(p["claimed"], p["rows"]) for p in pushed] == [(2, 1)]
+        assert pushed[0]["cells"] == 2  # inv-1: status and updated_at only
+        col = billing_store.COLUMNS.index
+        assert (fake.values[-1][col("client")], fake.values[-1][col("notes")]) == ("Local", "first")
+        assert fake.values[2][col("status")] == "paid"
+        assert replication.stats()["queued"] == 0
+
+        fake.values[1][col("notes")] = "edited by hand"
+        fake.revision += 1
+        fake.values.append(["inv-9"] + [""] * (len(billing_store.COLUMNS) - 1))
+        report = replication.reconcile(fix=True)
+        assert (report["drifted"], report["missing_in_db"], report["missing_in_sheet"]) == (1, 1, 0)
+        replication.drain()
+        assert fake.values[1][col("notes")] == "notes0"  # the database wins
+        assert billing_store.get_invoice("inv-9") is not None
+
+
+def test_sheets_mirror_push_reports_full_batches(monkeypatch):
+    import app.services.billing_replication as replication
+    import app.services.sheets_client as sheets_client
+
+    c, fake, sheet, _ = _sheets_client(monkeypatch, mode="mirror")
+    monkeypatch.setattr(sheets_client, "MAX_PENDING", 2)
+    with c.application.app_context():
+        replication.import_sheet()
+    for i in range(3):
+        c.post("/api/v1/billing/invoices", json={"client": f"Batch {i}"})
+    c.patch("/api/v1/billing/invoices/inv-1", json={"status": "paid"})
+
+    with c.application.app_context():
+        before = sheet.stats()["flushes"], replication.stats()
+        pushed = replication.drain()
+        assert [(p["claimed"], p["rows"], p["cells"]) for p in pushed] == [(4, 3, 2)]
+        after = sheet.stats()["flushes"], replication.stats()
+        assert after[0] == before[0] + 1
+        assert after[1]["rows_appended"] - before[1]["rows_appended"] == 3
+        assert after[1]["cells_written"] - before[1]["cells_written"] == 2
+
+
+# --- Billing: email outbox ---
+
+class _SmtpStandIn(socketserver.ThreadingTCPServer):
+    """Just enough SMTP for smtplib: AUTH PLAIN, and RCPT replies chosen by the address."""
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        self.connections, self.logins, self.messages = 0, 0, []
+        super().__init__(("127.0.0.1", 0), _SmtpSession)
+
+
+class _SmtpSession(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        self.reply("220 stand-in")
+        while line := self.rfile.readline().decode().strip():
+            verb = line.split(" ")[0].upper()
+            if verb == "EHLO":
+                self.reply("250-stand-in\r\n250 AUTH PLAIN")
+            elif verb == "AUTH":
+                server.logins += 1
+                self.reply("235 ok")
+            elif verb == "RCPT":
+                self.reply("550 no such user" if "bounce@" in line else "451 try later" if "later@" in line else "250 ok")
+            elif verb == "DATA":
+                self.reply("354 go on")
+                body = []
+                while (data := self.rfile.readline().decode()) != ".\r\n":
+                    body.append(data)
+                server.messages.append("".join(body))
+                self.reply("250 queued")
+            elif verb == "QUIT":
+                self.reply("221 bye")
+                return
+            else:  # MAIL, RSET, NOOP
+                self.reply("250 ok")
+
+
+def test_email_outbox_delivers_over_one_pooled_connection(monkeypatch):
+    from app.services import email_outbox
+
+    c = _client()  # before SMTP_USER is set, so no background sender starts
+    server = _SmtpStandIn()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(email_outbox, "SMTP_HOST", "127.0.0.1")
+    monkeypatch.setattr(email_outbox, "SMTP_PORT", server.server_address[1])
+    monkeypatch.setattr(email_outbox, "SMTP_USER", "billing@test")
+    monkeypatch.setattr(email_outbox, "SMTP_STARTTLS", False)
+    monkeypatch.setattr(email_outbox, "_pool", email_outbox.SmtpPool(1))
+    try:
+        ids = {}
+        for name, email in [("A", "a@x.test"), ("B", "b@x.test"), ("C", "c@x.test"),
+                            ("Bounce", "bounce@x.test"), ("Later", "later@x.test"), ("None", "")]:
+            ids[name] = c.post("/api/v1/billing/invoices", json={"client": name, "email": email}).get_json()["id"]
+
+        res = c.post("/api/v1/billing/email/send-batch", json={"invoice_ids": list(ids.values()) + ["missing"]})
+        assert res.status_code == 202
+        body = res.get_json()
+        assert len(body["queued"]) == 5
+        assert sorted(s["reason"] for s in body["skipped"]) == ["invoice has no client email", "not found"]
+        again = c.post("/api/v1/billing/email/send", json={"invoice_id": ids["A"]}).get_json()
+        assert again["queued"] and again["message_id"] == body["queued"][0]["message_id"]
+
+        with c.application.app_context():
+            assert email_outbox.drain() == [{"claimed": 5, "sent": 3, "retry": 1, "failed": 1, "ms": ANY}]
+            stats = email_outbox.stats()
+        # One handshake for every message; refused primaries still went to the accepted Cc
+        assert (server.connections, server.logins, len(server.messages)) == (1, 1, 5)
+        assert stats["outbox"] == {"queued": 1, "sending": 0, "sent": 3, "failed": 1}
+
+        invoice = c.get("/api/v1/billing/invoices?q=A").get_json()["invoices"][0]
+        assert invoice["status"] == "sent" and invoice["emailSent"]
+        later = [i for i in c.get("/api/v1/billing/invoices").get_json()["invoices"] if i["client"] == "Later"][0]
+        assert later["status"] == "draft"
+        assert c.post("/api/v1/billing/email/send-batch", json={"invoice_ids": "x"}).status_code == 400
+    finally:
+        email_outbox._pool.close_all()
+        server.shutdown()
+        server.server_close()
+
+
+# --- Scheduled publishing ---
+
+def test_scheduler_publishes_due_articles_only():
+    from app.services import scheduler
+    c = _client()
+    c.get("/api/v1/feed/articles?brand=villager")  # warm the cache
+    due = c.post("/api/v1/admin/articles", json={"brand": "villager", "title": "Due Now", "body": "b"}).get_json()
+    later = c.post("/api/v1/admin/articles", json={"brand": "villager", "title": "Not Yet", "body": "b"}).get_json()
+    c.patch(f"/api/v1/admin/articles/{due['id']}",
+            json={"status": "scheduled", "scheduled_at": "2020-01-01T09:00:00-07:00"})
+    res = c.patch(f"/api/v1/admin/articles/{later['id']}",
+                  json={"status": "scheduled", "scheduled_at": "2999-01-01T00:00:00Z"})
+    assert res.get_json()["scheduled_at"].startswith("2999-01-01T00:00:00")
+
+    with c.application.app_context():
+        report = scheduler.publish_due()
+        assert scheduler.publish_due()["promoted"] == 0  # a second sweep finds nothing
+    assert report["promoted"] == 1
+    assert report["brands"] == ["villager"]
+    assert report["max_latency_ms"] > 0
+
+    titles = [a["title"] for a in c.get("/api/v1/feed/articles?brand=villager").get_json()["articles"]]
+    assert "Due Now" in titles and "Not Yet" not in titles
+    assert c.get("/api/v1/admin/scheduler").get_json()["last_batch"] == 0
+
+
+def test_patch_rejects_bad_scheduled_at():
+    c = _client()
+    article = c.post("/api/v1/admin/articles", json={"brand": "villager", "title": "X", "body": "Y"}).get_json()
+    res = c.patch(f"/api/v1/admin/articles/{article['id']}", json={"scheduled_at": "next tuesday"})
+    assert res.status_code == 400
+
+
 # --- Mock AI ---
 
 def test_mock_ai_endpoint():
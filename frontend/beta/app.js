@@ -83,10 +83,11 @@ async function loadHealth() {
 
 let brandData = [];
 
-async function loadBrands() {
+// One request for first paint: brands, counts and each brand's newest page
+async function loadHome() {
   const container = document.getElementById("brandButtons");
   try {
-    const data = await fetchJson("/brands");
+    const data = await fetchJson(`/feed/home?limit=${PAGE_SIZE}`);
     brandData = data.items;
     container.innerHTML = "";
 
@@ -107,12 +108,27 @@ async function loadBrands() {
 
     // Populate admin brand selects
     populateAdminBrands(data.items);
+    return data;
   } catch (error) {
     container.textContent = error.message;
+    return null;
   }
 }
 
-function selectBrand(slug) {
+// Shape a /feed/home payload like the first /feed/articles page for `slug` ("" = all)
+function homePage(home, slug) {
+  const brands = slug ? home.items.filter((b) => b.slug === slug) : home.items;
+  const articles = brands
+    .flatMap((b) => b.articles)
+    .sort((a, b) => b.created_at.localeCompare(a.created_at) || b.id.localeCompare(a.id))
+    .slice(0, PAGE_SIZE);
+  const total = slug ? brands[0].counts.published : home.total;
+  const page = { brand: slug || undefined, total, articles, has_more: total > PAGE_SIZE };
+  if (page.has_more) page.next_offset = PAGE_SIZE;
+  return page;
+}
+
+function selectBrand(slug, page = null) {
   activeBrand = slug;
   currentOffset = 0;
 
@@ -135,7 +151,11 @@ function selectBrand(slug) {
     hero.style.background = "";
   }
 
-  loadFeed(false);
+  if (page) {
+    renderFeed(page, false);
+  } else {
+    loadFeed(false);
+  }
 }
 
 function lighten(hex) {
@@ -145,11 +165,37 @@ function lighten(hex) {
   return `rgb(${r}, ${g}, ${b})`;
 }
 
-async function loadFeed(append) {
+function renderFeed(data, append) {
   const list = document.getElementById("feed");
   const heading = document.getElementById("feedHeading");
   const loadMore = document.getElementById("loadMore");
 
+  heading.textContent = activeBrand
+    ? `${data.brand} — ${data.total} Articles`
+    : `All Brands — ${data.total} Articles`;
+
+  if (!append) {
+    list.innerHTML = "";
+  }
+
+  data.articles.forEach((item) => {
+    const li = document.createElement("li");
+    li.innerHTML = `<strong>${item.brand}</strong>: ${item.title}<br><small>${item.body || ""}</small>`;
+    list.appendChild(li);
+  });
+
+  if (data.has_more) {
+    currentOffset = data.next_offset;
+    loadMore.style.display = "inline-block";
+  } else {
+    loadMore.style.display = "none";
+  }
+}
+
+async function loadFeed(append) {
+  const list = document.getElementById("feed");
+  const loadMore = document.getElementById("loadMore");
+
   const params = new URLSearchParams();
   if (activeBrand) params.set("brand", activeBrand);
   params.set("limit", PAGE_SIZE);
@@ -157,27 +203,7 @@ async function loadFeed(append) {
   const query = `?${params.toString()}`;
 
   try {
-    const data = await fetchJson(`/feed/articles${query}`);
-    heading.textContent = activeBrand
-      ? `${data.brand} — ${data.total} Articles`
-      : `All Brands — ${data.total} Articles`;
-
-    if (!append) {
-      list.innerHTML = "";
-    }
-
-    data.articles.forEach((item) => {
-      const li = document.createElement("li");
-      li.innerHTML = `<strong>${item.brand}</strong>: ${item.title}<br><small>${item.body || ""}</small>`;
-      list.appendChild(li);
-    });
-
-    if (data.has_more) {
-      currentOffset = data.next_offset;
-      loadMore.style.display = "inline-block";
-    } else {
-      loadMore.style.display = "none";
-    }
+    renderFeed(await fetchJson(`/feed/articles${query}`), append);
   } catch (error) {
     list.innerHTML = `<li>${error.message}</li>`;
     loadMore.style.display = "none";
@@ -329,13 +355,16 @@ async function adminRefresh() {
   const params = new URLSearchParams();
   if (brandFilter) params.set("brand", brandFilter);
 
+  const draftParams = new URLSearchParams(params);
+  draftParams.set("status", "draft");
+  params.set("status", "published");
+
   try {
-    params.set("status", "draft");
-    const drafts = await fetchJson(`/admin/articles?${params.toString()}`);
+    const [drafts, published] = await Promise.all([
+      fetchJson(`/admin/articles?${draftParams.toString()}`),
+      fetchJson(`/admin/articles?${params.toString()}`),
+    ]);
     renderAdminList(document.getElementById("adminDrafts"), drafts.articles, true);
-
-    params.set("status", "published");
-    const published = await fetchJson(`/admin/articles?${params.toString()}`);
     renderAdminList(document.getElementById("adminPublished"), published.articles, false);
   } catch (error) {
     adminLog({ error: error.message });
@@ -346,12 +375,13 @@ async function adminRefresh() {
 
 async function init() {
   await resolveApiBase();
-  await loadHealth();
-  await loadBrands();
+  const [, home] = await Promise.all([loadHealth(), loadHome()]);
 
   const subdomainSlug = detectSubdomainBrand();
   if (subdomainSlug && brandData.find((b) => b.slug === subdomainSlug)) {
-    selectBrand(subdomainSlug);
+    selectBrand(subdomainSlug, home && homePage(home, subdomainSlug));
+  } else if (home && (!activeBrand || brandData.find((b) => b.slug === activeBrand))) {
+    renderFeed(homePage(home, activeBrand), false);
   } else {
     await loadFeed(false);
   }